@@ -10,7 +10,6 @@ import useAuthStore, { useAuthStoreWithInit } from '@/stores/authStore';
 import axios from 'axios';
 
 const TabLayout = () => {
-  const [notifications, setNotifications] = useState([]);
   const { user } = useAuthStoreWithInit();
   const { notificationsSeen, resetNotificationsSeen } = useAuthStore((state) => ({
     notificationsSeen: state.notificationsSeen,
@@ -24,12 +23,13 @@ const TabLayout = () => {
     if (!user) return; // Avoid fetching if user is not available
 
     try {
-      const response = await axios.get(`http://192.168.11.101:8000/api/notifications/`, {
+      // The badge only needs the cached unread counter, not the notification list
+      const response = await axios.get(`http://192.168.11.101:8000/api/notifications/unread-count/`, {
         headers: {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setNotifications(response.data);
+      setUnseenNotifications(response.data.unread_count);
       resetNotificationsSeen(); // Call this to reset unseen count
     } catch (error) {
       console.error("Error fetching notifications:", error);
@@ -40,12 +40,6 @@ const TabLayout = () => {
     fetchNotifications();
   }, [user, notificationsSeen]); // Fetch whenever user or notificationsSeen changes
 
-  useEffect(() => {
-    // Filter unseen notifications
-    const unseenCount = notifications.filter(notification => !notification.seen).length;
-    setUnseenNotifications(unseenCount);
-  }, [notifications]); // Update unseen count whenever notifications change
-
   return (
     <Tabs
       screenOptions={{
@@ -13,6 +13,8 @@ const Friend = () => {
   const [viewableIndex, setViewableIndex] = useState(0);
   const [posts, setPosts] = useState([]);
   const [isRefreshing, setIsRefreshing] = useState(false);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const flatListRef = useRef(null);
 
   const onViewableItemsChanged = ({ viewableItems }) => {
@@ -31,12 +33,12 @@ const Friend = () => {
 
   const fetchVideos = async (isRefresh = false) => {
     try {
-      const response = await axios.get(`http://192.168.11.101:8000/api/videos/following/`, {
+      const response = await axios.get(`http://192.168.11.101:8000/api/videos/following/?include=viewer_state`, {
         headers: {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      const newPosts = response.data.results || response.data; // Adjust according to the structure
+      const newPosts = response.data.results;
 
       if (isRefresh) {
         setPosts(newPosts);
@@ -45,6 +47,7 @@ const Friend = () => {
           setPosts(prevPosts => [...prevPosts, ...newPosts]);
         }
       }
+      setNextPage(response.data.next);
       setIsRefreshing(false);
     } catch (error) {
       console.error("Error fetching videos:", error);
@@ -52,6 +55,25 @@ const Friend = () => {
     }
   };
 
+  const fetchMoreVideos = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Older videos follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setPosts(prevPosts => [...prevPosts, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Error fetching more videos:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleScroll = (event) => {
     const offsetY = event.nativeEvent.contentOffset.y;
     if (offsetY <= 0 && !isRefreshing) {
@@ -128,6 +150,8 @@ const Friend = () => {
         viewabilityConfig={viewabilityConfig}
         keyExtractor={(item) => item.id.toString()} // Use id as a key 
         onScroll={handleScroll}
+        onEndReached={fetchMoreVideos}
+        onEndReachedThreshold={0.5}
       />
       {isRefreshing && (
         <View style={{ position: 'absolute', top: 0, left: 0, right: 0, bottom: 0, justifyContent: 'center', alignItems: 'center' }}>
@@ -12,7 +12,8 @@ const Home = () => {
   const [viewableIndex, setViewableIndex] = useState(0);
   const [posts, setPosts] = useState([]);
   const [isRefreshing, setIsRefreshing] = useState(false);
-  const [page, setPage] = useState(1);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const flatListRef = useRef(null);
 
   const onViewableItemsChanged = ({ viewableItems }) => {
@@ -36,19 +37,23 @@ const Home = () => {
 
   const fetchVideos = async (isRefresh = false) => {
     try {
-      const response = await axios.get(`http://192.168.11.101:8000/api/videos/?page=${page}`, {
+      // The feed is cursor paginated: a refresh starts over from the newest videos
+      const response = await axios.get('http://192.168.11.101:8000/api/videos/?include=viewer_state', {
         headers: {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
 
+      const newPosts = response.data.results;
+
       if (isRefresh) {
-        setPosts(response.data);
+        setPosts(newPosts);
       } else {
-        if (!hasDuplicate(response.data, posts)) {
-          setPosts(prevPosts => [...response.data, ...prevPosts]);
+        if (!hasDuplicate(newPosts, posts)) {
+          setPosts(prevPosts => [...newPosts, ...prevPosts]);
         }
       }
+      setNextPage(response.data.next);
       setIsRefreshing(false);
     } catch (error) {
       console.error("Error fetching videos:", error);
@@ -56,11 +61,29 @@ const Home = () => {
     }
   };
 
+  const fetchMoreVideos = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Older videos follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setPosts(prevPosts => [...prevPosts, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Error fetching more videos:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleScroll = (event) => {
     const offsetY = event.nativeEvent.contentOffset.y;
     if (offsetY <= 0 && !isRefreshing) {
       setIsRefreshing(true);
-      setPage(prevPage => prevPage + 1);
       fetchVideos(true);
     }
   };
@@ -136,6 +159,8 @@ const Home = () => {
         viewabilityConfig={viewabilityConfig}
         keyExtractor={(item, index) => index.toString()}
         onScroll={handleScroll}
+        onEndReached={fetchMoreVideos}
+        onEndReachedThreshold={0.5}
       />
       {isRefreshing && (
         <View style={{ position: 'absolute', top: 0, left: 0, right: 0, bottom: 0, justifyContent: 'center', alignItems: 'center' }}>
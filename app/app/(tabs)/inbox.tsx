@@ -9,6 +9,8 @@ import { useFocusEffect } from '@react-navigation/native'; // Import useFocusEff
 const Inbox = () => {
   const [notifications, setNotifications] = useState([]);
   const [isLoading, setIsLoading] = useState(false); // Separate local loading state
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { user, loading: authLoading, markNotificationsAsSeen } = useAuthStoreWithInit();
 
   // Fetch notifications when the user is on the inbox screen
@@ -22,7 +24,8 @@ const Inbox = () => {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setNotifications(response.data);
+      setNotifications(response.data.results);
+      setNextPage(response.data.next);
       await markAllNotificationsAsSeen(); // Mark them as seen after fetching
     } catch (error) {
       console.error("Error fetching notifications:", error);
@@ -31,6 +34,25 @@ const Inbox = () => {
     }
   };
 
+  // Older notifications follow the opaque cursor link returned by the previous page
+  const fetchMoreNotifications = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setNotifications(prevNotifications => [...prevNotifications, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Error fetching more notifications:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Mark all notifications as seen
   const markAllNotificationsAsSeen = async () => {
     try {
@@ -87,6 +109,8 @@ const Inbox = () => {
         data={notifications}
         keyExtractor={(item) => item.id.toString()}
         renderItem={renderNotification}
+        onEndReached={fetchMoreNotifications}
+        onEndReachedThreshold={0.5}
         ListEmptyComponent={<Text style={styles.emptyText}>No new notifications</Text>}
       />
     </SafeAreaView>
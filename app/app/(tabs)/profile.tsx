@@ -66,6 +66,8 @@ const Profile = () => {
   const [videos, setVideos] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [userInfo, setUserInfo] = useState(null);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchUserVideos = async () => {
     try {
@@ -74,7 +76,8 @@ const Profile = () => {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setVideos(response.data);
+      setVideos(response.data.results);
+      setNextPage(response.data.next);
       setUserInfo(response.data.userInfo);
     } catch (error) {
       console.error("Error fetching user videos:", error);
@@ -83,6 +86,25 @@ const Profile = () => {
     }
   };
 
+  const fetchMoreVideos = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setVideos(prevVideos => [...prevVideos, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Error fetching more videos:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useFocusEffect(
     React.useCallback(() => {
       if (user) {
@@ -184,6 +206,8 @@ const Profile = () => {
           data={videos}
           keyExtractor={(item) => item.id.toString()}
           ListHeaderComponent={renderProfileHeader}
+          onEndReached={fetchMoreVideos}
+          onEndReachedThreshold={0.5}
           renderItem={({ item }) => (
             <TouchableOpacity
               onPress={() => router.push({
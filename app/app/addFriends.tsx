@@ -8,6 +8,8 @@ const AddFriends = () => {
   const [friends, setFriends] = useState([]);
   const [suggestedFriends, setSuggestedFriends] = useState([]);
   const [selectedTab, setSelectedTab] = useState('Friends');
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const user = useAuthStore((state) => state.user);
 
@@ -31,12 +33,32 @@ const AddFriends = () => {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setFriends(response.data);
+      setFriends(response.data.results); // Paginated response
+      setNextPage(response.data.next);
     } catch (error) {
       console.error('Error fetching friends:', error);
     }
   };
 
+  const fetchMoreFriends = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setFriends((prevFriends) => [...prevFriends, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Error fetching more friends:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleToggleFollow = async (id) => {
     const isFollowing = friends.some((friend) => friend.id === id);
 
@@ -88,7 +110,7 @@ const AddFriends = () => {
 
     return (
       <View style={styles.friendContainer}>
-        <Image source={item && item.profile_picture ? {uri : item.profile_picture} : require('../assets/images/cropped_image.png')} style={styles.avatar} />
+        <Image source={item && item.profile_picture ? {uri : item.profile_picture_variants?.['128'] || item.profile_picture} : require('../assets/images/cropped_image.png')} style={styles.avatar} />
         <View style={{ display: 'flex', flexDirection: 'column', flex: 1 }}>
           <Text style={styles.friendName}>{item.username}</Text>
           <View style={{ flexDirection: 'row', paddingVertical: 10 }}>
@@ -122,6 +144,8 @@ const AddFriends = () => {
         keyExtractor={(item) => item.id}
         renderItem={renderItem}
         showsVerticalScrollIndicator={false}
+        onEndReached={selectedTab === 'Friends' ? fetchMoreFriends : undefined}
+        onEndReachedThreshold={0.5}
       />
     );
   };
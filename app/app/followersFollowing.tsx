@@ -11,6 +11,8 @@ const FollowersFollowing = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [selectedTab, setSelectedTab] = useState(type || 'Followers'); // Use type to set the initial tab
   const [followingList, setFollowingList] = useState([]); // To track users currently being followed
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const user = useAuthStore(state => state.user);
   const router = useRouter();
@@ -29,29 +31,50 @@ const FollowersFollowing = () => {
     }
   };
 
-  const fetchData = async (type) => {
-    setIsLoading(true); // Start loading when switching tabs
+  const fetchData = async (type, pageUrl = null) => {
+    if (pageUrl) {
+      setLoadingMore(true);
+    } else {
+      setIsLoading(true); // Start loading when switching tabs
+    }
     try {
-      const response = await axios.get(`http://192.168.11.101:8000/api/users/${userId}/${type.toLowerCase()}/`, {
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = await axios.get(pageUrl || `http://192.168.11.101:8000/api/users/${userId}/${type.toLowerCase()}/`, {
         headers: {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
 
+      const users = response.data.results; // Paginated response
+      // On our own followers list the API already says whether we follow each one back
+      const isOwnList = String(userId) === String(user.user.id);
       // Fetch follow status for each user
-      const updatedData = await Promise.all(response.data.map(async (user) => {
-        const isFollowing = type === 'Followers' ? await fetchFollowStatus(user.id) : true;
-        return { ...user, isFollowing };
+      const updatedData = await Promise.all(users.map(async (follower) => {
+        if (type === 'Followers' && isOwnList) {
+          return follower;
+        }
+        const isFollowing = type === 'Followers' ? await fetchFollowStatus(follower.id) : true;
+        return { ...follower, isFollowing };
       }));
 
-      setData(updatedData); // Set followers or following data based on the tab
+      // Set followers or following data based on the tab, appending the later pages
+      setData(prevData => pageUrl ? [...prevData, ...updatedData] : updatedData);
+      setNextPage(response.data.next);
       if (type === 'Following') {
-        setFollowingList(response.data.map(user => user.id)); // Store list of IDs of users being followed
+        // Store list of IDs of users being followed
+        setFollowingList(prevList => [...(pageUrl ? prevList : []), ...users.map(user => user.id)]);
       }
     } catch (error) {
       console.error(`Error fetching ${type}:`, error);
     } finally {
       setIsLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  const handleEndReached = () => {
+    if (nextPage && !loadingMore) {
+      fetchData(selectedTab, nextPage);
     }
   };
 
@@ -130,10 +153,12 @@ const FollowersFollowing = () => {
         <FlatList
           data={data}
           keyExtractor={(item) => item.id.toString()}
+          onEndReached={handleEndReached}
+          onEndReachedThreshold={0.5}
           renderItem={({ item }) => (
             <View style={styles.userItem}>
               <TouchableOpacity style={{ flexDirection: 'row' }} onPress={() => router.push(`/profile/${item.id}`)}>
-                <Image source={item && item.profile_picture ? {uri : item.profile_picture} : require('../assets/images/cropped_image.png')} style={styles.avatar} />
+                <Image source={item && item.profile_picture ? {uri : item.profile_picture_variants?.['128'] || item.profile_picture} : require('../assets/images/cropped_image.png')} style={styles.avatar} />
                 <Text style={styles.username}>{item.username}</Text>
                 {selectedTab === 'Following' ? (
                 <TouchableOpacity
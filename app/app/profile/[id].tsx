@@ -81,6 +81,8 @@ const ProfileScreen = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [userInfo, setUserInfo] = useState(null); // Add state for user info
   const [isFollowing, setIsFollowing] = useState(false); // Track follow status
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const user = useAuthStore(state => state.user);
 
@@ -98,7 +100,8 @@ const ProfileScreen = () => {
           Authorization: `Bearer ${user.tokens.access}`,
         }
       });
-      setVideos(response.data); // Adjust according to response structure
+      setVideos(response.data.results);
+      setNextPage(response.data.next);
 
       // Check if the current user is following this profile
       const followStatus = await axios.get(`http://192.168.11.101:8000/api/follow/status/${id}/`, {
@@ -115,6 +118,25 @@ const ProfileScreen = () => {
     }
   };
 
+  const fetchMoreVideos = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setVideos(prevVideos => [...prevVideos, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Error fetching more videos:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleToggleFollow = async (userId) => {
     try {
       if (isFollowing) {
@@ -208,6 +230,8 @@ const ProfileScreen = () => {
           data={videos}
           keyExtractor={(item) => item.id.toString()}
           ListHeaderComponent={renderProfileHeader} // Profile info as the header
+          onEndReached={fetchMoreVideos}
+          onEndReachedThreshold={0.5}
           renderItem={({ item }) => (
             <TouchableOpacity
               onPress={() => router.push({
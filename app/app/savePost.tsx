@@ -4,6 +4,8 @@ import { useLocalSearchParams, useNavigation } from 'expo-router';
 import { Feather } from '@expo/vector-icons';
 import useAuthStore from '@/stores/authStore';
 import axios from 'axios';
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import * as FileSystem from 'expo-file-system';
 
 const styles = StyleSheet.create({
     container: {
@@ -88,31 +90,94 @@ const SavePost = () => {
         navigation.goBack();
     };
 
+    const API = 'http://192.168.11.101:8000/api';
+
+    // Sends one part: the slice is staged in a cache file and PUT straight to S3
+    const uploadPart = async (url, partNumber, partSize) => {
+        const chunk = await FileSystem.readAsStringAsync(source, {
+            encoding: FileSystem.EncodingType.Base64,
+            position: (partNumber - 1) * partSize,
+            length: partSize,
+        });
+        const chunkUri = `${FileSystem.cacheDirectory}upload-part-${partNumber}`;
+        await FileSystem.writeAsStringAsync(chunkUri, chunk, { encoding: FileSystem.EncodingType.Base64 });
+        try {
+            const result = await FileSystem.uploadAsync(url, chunkUri, {
+                httpMethod: 'PUT',
+                uploadType: FileSystem.FileSystemUploadType.BINARY_CONTENT,
+            });
+            if (result.status !== 200) {
+                throw new Error(`Part ${partNumber} failed with status ${result.status}`);
+            }
+        } finally {
+            await FileSystem.deleteAsync(chunkUri, { idempotent: true });
+        }
+    };
+
+    // The upload session of this draft is kept with it, so a retry after an interruption
+    // resumes that session instead of starting a new one
+    const draftKey = `upload:${source}`;
+
+    // The saved session if it can still be resumed, with the parts S3 already has
+    const resumeUpload = async (headers) => {
+        const saved = JSON.parse(await AsyncStorage.getItem(draftKey));
+        if (!saved) return null;
+        try {
+            const { data: status } = await axios.get(`${API}/uploads/${saved.id}/`, { headers });
+            if (status.status === 'uploading' && status.key === saved.key) {
+                return { upload: { ...status, part_urls: {} }, done: status.uploaded_parts };
+            }
+        } catch (error) {
+            if (error.response?.status !== 404) throw error;
+        }
+        await AsyncStorage.removeItem(draftKey);
+        return null;
+    };
+
+    const startUpload = async (headers, size) => {
+        // The API hands out presigned part URLs, the video never goes through our servers
+        const { data: upload } = await axios.post(`${API}/uploads/`, {
+            filename: 'video.mp4',
+            size,
+            content_type: 'video/mp4',
+            title: 'My First Video',
+            description,
+            thumbnail_filename: thumbnail ? 'thumbnail.jpg' : undefined,
+        }, { headers });
+        await AsyncStorage.setItem(draftKey, JSON.stringify({ id: upload.id, key: upload.key }));
+
+        if (upload.thumbnail_url) {
+            await FileSystem.uploadAsync(upload.thumbnail_url, thumbnail, {
+                httpMethod: 'PUT',
+                uploadType: FileSystem.FileSystemUploadType.BINARY_CONTENT,
+                headers: { 'Content-Type': 'image/jpeg' },
+            });
+        }
+        return { upload, done: [] };
+    };
+
     const submit = async () => {
+        const headers = { Authorization: `Bearer ${user.tokens.access}` };
         try {
-                
-          const formData = new FormData();
-          formData.append('title', 'My First Video');
-          formData.append('description', description);
-          formData.append('video_file', {
-            uri: source,
-            type: 'video/mp4', // Adjust the type based on your video format
-            name: 'video.mp4'   // The filename
-          });
-          formData.append('thumbnail',{
-            uri: thumbnail,
-            type: 'image/jpeg', // Adjust type based on your thumbnail format
-            name: 'thumbnail.jpg' // Adjust file name
-          })
-    
-          const response = await axios.post('http://192.168.11.101:8000/api/videos/', formData, {
-            headers: {
-              Authorization: `Bearer ${user.tokens.access}`,
-              'Content-Type': 'multipart/form-data' // Important for file uploads
-            },
-            timeout: 50000
-          });
-    
+          const info = await FileSystem.getInfoAsync(source);
+          const resumed = await resumeUpload(headers);
+          const { upload, done: uploaded } = resumed || await startUpload(headers, info.size);
+
+          // Parts S3 already has (from an interrupted attempt) are skipped
+          const done = new Set(uploaded.map((part) => part.PartNumber));
+          let urls = upload.part_urls;
+          for (let partNumber = 1; partNumber <= upload.part_count; partNumber++) {
+            if (done.has(partNumber)) continue;
+            if (!urls[partNumber]) {
+              const numbers = [];
+              for (let n = partNumber; n <= upload.part_count && numbers.length < 100; n++) numbers.push(n);
+              ({ data: { part_urls: urls } } = await axios.post(`${API}/uploads/${upload.id}/parts/`, { part_numbers: numbers }, { headers }));
+            }
+            await uploadPart(urls[partNumber], partNumber, upload.part_size);
+          }
+
+          const response = await axios.post(`${API}/uploads/${upload.id}/complete/`, {}, { headers });
+          await AsyncStorage.removeItem(draftKey);
           console.log('Video uploaded successfully:', response.data);
           // Navigate to a different screen or show a success message
         } catch (error) {
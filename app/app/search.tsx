@@ -27,9 +27,10 @@ const Search = () => {
     setLoading(true);
 
     try {
-      const response = await axios.get('http://192.168.11.101:8000/api/users/search/', {
-        params: { search: textInput, page: currentPage }
-      });
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = reset || !nextPage
+        ? await axios.get('http://192.168.11.101:8000/api/users/search/', { params: { search: textInput } })
+        : await axios.get(nextPage);
 
       const data = response.data;
       if (reset) {
@@ -82,7 +83,7 @@ const Search = () => {
         data={searchUsers}
         renderItem={({ item }) => (
           <TouchableOpacity style={styles.userContainer} onPress={() => router.push(`/profile/${item.id}`)}>
-            <Image style={styles.image} source={item && item.profile_picture ? {uri : item.profile_picture} : require('../assets/images/cropped_image.png')} />
+            <Image style={styles.image} source={item && item.profile_picture ? {uri : item.profile_picture_variants?.['128'] || item.profile_picture} : require('../assets/images/cropped_image.png')} />
             <Text style={styles.text}>{item.username}</Text>
           </TouchableOpacity>
         )}
@@ -16,6 +16,8 @@ const VideoScreen = ({post,isVisible}) => {
   const [likeCount, setLikeCount] = useState(post.likes_count);
   const [userInfo, setUserInfo] = useState(null);
   const [comments, setComments] = useState([]);
+  const [nextComments, setNextComments] = useState(null);
+  const [loadingComments, setLoadingComments] = useState(false);
   const [followStatus, setFollowStatus] = useState(false)
   const [newComment, setNewComment] = useState('');
   const [video, setVideo] = useState(null);
@@ -92,13 +94,34 @@ const VideoScreen = ({post,isVisible}) => {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setComments(response.data);
+      setComments(response.data.results);
+      setNextComments(response.data.next);
     } catch (error) {
       console.error('Error fetching comments:', error);
       handleError(error);
     }
   };
 
+  const fetchMoreComments = async () => {
+    if (!nextComments || loadingComments) return;
+    setLoadingComments(true);
+    try {
+      // Later pages follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextComments, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setComments(prevComments => [...prevComments, ...response.data.results]);
+      setNextComments(response.data.next);
+    } catch (error) {
+      console.error('Error fetching more comments:', error);
+      handleError(error);
+    } finally {
+      setLoadingComments(false);
+    }
+  };
+
   const postComment = async () => {
     try {
       await axios.post(`http://192.168.11.101:8000/api/comment/${post.id}/`, 
@@ -228,7 +251,7 @@ const VideoScreen = ({post,isVisible}) => {
         <View style={styles.videoContainer}>
           <Video
             ref={videoRef} // Assign the ref
-            source={{ uri: post.video_file }}
+            source={{ uri: post.stream_url || post.video_file }}
             style={styles.video}
             resizeMode="cover"
             isLooping
@@ -309,6 +332,8 @@ const VideoScreen = ({post,isVisible}) => {
                 data={comments}
                 keyExtractor={(item) => item.id.toString()}
                 style={{flex:1}}
+                onEndReached={fetchMoreComments}
+                onEndReachedThreshold={0.5}
                 renderItem={({ item }) => (
                   <View style={styles.commentItem}>
                     <Image style={{width:40,height:40,borderRadius:20}} source={item && item.profile_picture ? {uri : item.profile_picture} : require('../../assets/images/cropped_image.png')} />
@@ -461,7 +486,8 @@ const VideoProfile = () => {
   const [viewableIndex, setViewableIndex] = useState(0);
   const [posts, setPosts] = useState([]);
   const [isRefreshing, setIsRefreshing] = useState(false);
-  const [page, setPage] = useState(1);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const user = useAuthStore(state => state.user);
   const flatListRef = useRef(null);
 
@@ -488,24 +514,25 @@ const VideoProfile = () => {
 
   const fetchVideos = async (isRefresh = false) => {
     try {
-      const response = await axios.get(
-        `http://192.168.11.101:8000/api/videos/user/${userId}`,
-        {
-          headers: {
-            Authorization: `Bearer ${user.tokens.access}`,
-          },
-        }
-      );
+      const headers = { Authorization: `Bearer ${user.tokens.access}` };
+      let response = await axios.get(`http://192.168.11.101:8000/api/videos/user/${userId}/`, { headers });
+      let newPosts = response.data.results;
+      // Follow the cursor links until the page holding the opened video is loaded
+      while (response.data.next && !newPosts.some(post => post.id.toString() === id.toString())) {
+        response = await axios.get(response.data.next, { headers });
+        newPosts = [...newPosts, ...response.data.results];
+      }
 
       if (isRefresh) {
-        setPosts(response.data);
+        setPosts(newPosts);
       } else {
-        if (!hasDuplicate(response.data, posts)) {
-          setPosts(prevPosts => [...prevPosts, ...response.data]);
+        if (!hasDuplicate(newPosts, posts)) {
+          setPosts(prevPosts => [...prevPosts, ...newPosts]);
         }
       }
+      setNextPage(response.data.next);
 
-      scrollToItemById(id, response.data);
+      scrollToItemById(id, newPosts);
       setIsRefreshing(false);
     } catch (error) {
       console.error('Error fetching videos:', error);
@@ -513,12 +540,30 @@ const VideoProfile = () => {
     }
   };
 
+  const fetchMoreVideos = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      // Older videos follow the opaque cursor link returned by the previous page
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+      setPosts(prevPosts => [...prevPosts, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Error fetching more videos:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleScroll = (event) => {
     const offsetY = event.nativeEvent.contentOffset.y;
     const refreshThreshold = -100; // Adjust as needed 
     if (offsetY <= refreshThreshold && !isRefreshing) {
       setIsRefreshing(true);
-      setPage(prevPage => prevPage + 1);
       fetchVideos(true);
     }
   };
@@ -580,6 +625,8 @@ const VideoProfile = () => {
         viewabilityConfig={viewabilityConfig}
         keyExtractor={(item) => item.id.toString()} // Use item.id for keyExtractor
         onScroll={handleScroll}
+        onEndReached={fetchMoreVideos}
+        onEndReachedThreshold={0.5}
         getItemLayout={getItemLayout} // Specify item layout
         onScrollToIndexFailed={onScrollToIndexFailed} // Handle scroll failure
       />
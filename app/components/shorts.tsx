@@ -36,12 +36,36 @@ const Shorts = ({ post, isVisible, shareVideo }) => {
   );
 
   useEffect(() => {
-    fetchLikedStatus();
+    // Feeds requested with include=viewer_state already carry the like/follow state
+    if (post.viewer_state) {
+      setLiked(post.viewer_state.liked);
+      setFollowStatus(post.viewer_state.following_author);
+    } else {
+      fetchLikedStatus();
+      fetchFollowStatus()
+    }
     fetchUserInfo();
     fetchComments();
-    fetchFollowStatus()
   }, []);
 
+  useEffect(() => {
+    if (isVisible && isFocused) {
+      recordView();
+    }
+  }, [isVisible, isFocused]);
+
+  const recordView = async () => {
+    try {
+      await axios.post(`http://192.168.11.101:8000/api/videos/views/`, { video_id: post.id }, {
+        headers: {
+          Authorization: `Bearer ${user.tokens.access}`,
+        },
+      });
+    } catch (error) {
+      console.error('Error recording view:', error);
+    }
+  };
+
   const fetchLikedStatus = async () => {
     try {
       const response = await axios.get(`http://192.168.11.101:8000/api/like/${post.id}/status/`, {
@@ -77,7 +101,7 @@ const Shorts = ({ post, isVisible, shareVideo }) => {
           Authorization: `Bearer ${user.tokens.access}`,
         },
       });
-      setComments(response.data);
+      setComments((response.data.results || response.data));
     } catch (error) {
       console.error('Error fetching comments:', error);
       handleError(error);
@@ -176,7 +200,7 @@ const Shorts = ({ post, isVisible, shareVideo }) => {
       <TouchableWithoutFeedback onPress={onPlayPausePress}>
         <View style={styles.videoContainer}>
           <Video
-            source={{ uri: post.video_file }}
+            source={{ uri: post.stream_url || post.video_file }}
             style={styles.video}
             resizeMode="cover"
             isLooping
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Video, Like, Comment, Follower, Notification, Favorite
+from .models import User, Video, Like, Comment, Follower, Notification, Favorite, UserStats, SlowQuery
 
 admin.site.register(User)
 admin.site.register(Video)
@@ -8,5 +8,7 @@ admin.site.register(Comment)
 admin.site.register(Follower)
 admin.site.register(Notification)
 admin.site.register(Favorite)
+admin.site.register(UserStats)
+admin.site.register(SlowQuery)
 
 # Register your models here.
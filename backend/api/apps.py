@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import checks  # noqa: F401 (registers the system checks)
+        from .metrics import install_query_counter, instrument_serialization
+        from .slow_queries import install_recorder
+        instrument_serialization()
+        connection_created.connect(install_recorder)
+        connection_created.connect(install_query_counter)
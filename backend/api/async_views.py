@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+
+class DatabaseThreadPool:
+    # Runs the blocking part of async views on at most `size` threads. Django keeps a connection
+    # per thread, so these threads are the connection pool: at most `size` connections to each
+    # database, reused across requests for CONN_MAX_AGE seconds and pinged before reuse when
+    # CONN_HEALTH_CHECKS is on. Requests beyond the pool size wait for a free thread instead of
+    # opening more connections.
+
+    def __init__(self, size):
+        self.size = size
+        self._executor = None
+        self._lock = threading.Lock()
+
+    async def run(self, function, *args, **kwargs):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='db')
+        # The caller's context variables (metrics sample, slow query request) follow the call
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, self._call, function, args, kwargs)
+
+    @staticmethod
+    def _call(function, args, kwargs):
+        # Each call is a request as far as this thread's connections are concerned: drop the ones
+        # past CONN_MAX_AGE or left unusable, and re-arm their health check
+        close_old_connections()
+        try:
+            response = function(*args, **kwargs)
+            # Render here rather than on the handler's thread, DRF responses are rendered lazily
+            if callable(getattr(response, 'render', None)):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+
+db_pool = DatabaseThreadPool(settings.DB_POOL_SIZE)
+
+
+def pooled(view):
+    # Async version of a sync view. Under ASGI it runs on db_pool, so concurrent requests share
+    # the pool's persistent connections instead of Django's new thread (and new connection) per
+    # request. Under WSGI and the test client it runs on the calling thread as before.
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            return await db_pool.run(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+    return async_view
+
+
+def read_view(view_class, **initkwargs):
+    # as_view() for the hot read endpoints, served by pooled() while ASYNC_READ_VIEWS is on
+    view = view_class.as_view(**initkwargs)
+    return pooled(view) if settings.ASYNC_READ_VIEWS else view
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Backends whose entries only live in the process that wrote them
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_is_process_local(alias):
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    # Version bumps, trending pages and suggestions written by one process must be visible to the others
+    if not cache_is_process_local(settings.DETAIL_CACHE_ALIAS):
+        return []
+    return [Warning(
+        f"The '{settings.DETAIL_CACHE_ALIAS}' cache is local to each process.",
+        hint='Set CACHE_URL to Redis, Memcached or dbcache:// when running several workers or the refresh commands.',
+        id='api.W001',
+    )]
+
+
+@register()
+def replica_pin_check(app_configs, **kwargs):
+    # Read-your-writes pins and recent version bumps are kept in the cache, a process-local one
+    # would send users to a lagging replica right after their write from another worker
+    if not settings.DATABASE_REPLICAS or not cache_is_process_local(settings.DETAIL_CACHE_ALIAS):
+        return []
+    return [Error(
+        'DATABASE_REPLICAS is set but the cache the reads are pinned in is local to each process.',
+        hint='Set CACHE_URL to Redis, Memcached or dbcache://.',
+        id='api.E001',
+    )]
@@ -0,0 +1,50 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from .payload_cache import track_versions
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin:
+    # ETag / If-None-Match for GET endpoints. The ETag is derived from the version counters the
+    # view names in get_etag_versions() (see payload_cache), plus the query string, so a matching
+    # If-None-Match is answered with a bare 304 right after authentication, before the view runs
+    # a query or serializes anything. Views return None to opt a request out (e.g. per-viewer
+    # payloads).
+
+    def get_etag_versions(self):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        self.etag_keys = []
+        if request.method not in ('GET', 'HEAD'):
+            return
+        with track_versions() as self.etag_keys:
+            versions = self.get_etag_versions()
+        if versions is None:
+            return
+        parts = [type(self).__name__, request.get_full_path(), *map(str, versions)]
+        self.etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+        if self.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+            # Responses depend on the caller's credentials, only the client may reuse them
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
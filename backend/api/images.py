@@ -0,0 +1,144 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+from .payload_cache import invalidate_collections, user_cache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_worker = None
+_executor_lock = threading.Lock()
+
+
+def render_variants(data, sizes, quality):
+    # Runs in a worker process: decode once, then a square center crop per size encoded as WebP.
+    # Returns {size: webp bytes}.
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        variants = {}
+        for size in sorted(sizes):
+            # No upscaling, but always at least the smallest size
+            if variants and size > min(image.size):
+                break
+            resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=quality, method=4)
+            variants[size] = buffer.getvalue()
+        return variants
+
+
+def get_executor():
+    # Image decoding and resizing are CPU bound, a process pool keeps them off the GIL. Its
+    # processes are spawned rather than forked from the (multi-threaded) web worker.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.AVATAR_VARIANT_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def get_worker():
+    # The thread that waits on the process pool and stores the variants, off the request
+    global _worker
+    with _executor_lock:
+        if _worker is None:
+            _worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatars')
+        return _worker
+
+
+def schedule_avatar_variants(user, data):
+    # Render the variants of the picture just saved on user from its uploaded bytes, once the
+    # update commits. AVATAR_VARIANT_MODE is 'pool' (on a background thread, the request does not
+    # wait for the renderer) or 'sync' (inline after commit). Until then avatar_key falls back
+    # to the original picture.
+    user_id, name = user.pk, user.profile_picture.name or ''
+
+    def schedule():
+        if settings.AVATAR_VARIANT_MODE == 'sync':
+            store_avatar_variants(user_id, name, data)
+        else:
+            get_worker().submit(_store_in_background, user_id, name, data)
+    transaction.on_commit(schedule)
+
+
+def _store_in_background(user_id, name, data):
+    try:
+        store_avatar_variants(user_id, name, data)
+    except Exception:
+        logger.exception('Could not render the avatar variants of user %s', user_id)
+    finally:
+        close_old_connections()
+
+
+def generate_avatar_variants(user):
+    # Re-render the variants of the user's current picture from storage (see the
+    # generate_avatar_variants command). Returns the {size: key} map.
+    data = None
+    if user.profile_picture:
+        with user.profile_picture.open('rb') as f:
+            data = f.read()
+    variants = store_avatar_variants(user.pk, user.profile_picture.name or '', data)
+    if variants is not None:
+        user.profile_picture_variants = variants
+    return variants
+
+
+def store_avatar_variants(user_id, name, data):
+    # Render and store the variants of the picture `name` from its bytes and record them on the
+    # user, unless the picture was replaced meanwhile (the newer upload records its own).
+    # Returns the {size: key} map, None when the picture was replaced.
+    User = get_user_model()
+    storage = User._meta.get_field('profile_picture').storage
+    variants = {}
+    if name:
+        rendered = get_executor().submit(render_variants, data, settings.AVATAR_SIZES, settings.AVATAR_WEBP_QUALITY).result()
+        stem = os.path.splitext(os.path.basename(name))[0]
+        for size, content in rendered.items():
+            variants[str(size)] = storage.save(f'profile_pictures/variants/{stem}_{size}.webp', ContentFile(content))
+
+    # A cleared picture may be stored as '' or NULL
+    current = Q(profile_picture=name) if name else Q(profile_picture='') | Q(profile_picture__isnull=True)
+    with transaction.atomic():
+        old_variants = (
+            User.objects.select_for_update().filter(current, pk=user_id)
+            .values_list('profile_picture_variants', flat=True).first()
+        )
+        if old_variants is None:
+            _delete_variants(storage, variants.values())
+            return None
+        User.objects.filter(pk=user_id).update(profile_picture_variants=variants)
+    _delete_variants(storage, set(old_variants.values()) - set(variants.values()))
+    user_cache.invalidate(user_id)
+    invalidate_collections('profiles')  # Comment lists show the author's picture
+    return variants
+
+
+def _delete_variants(storage, keys):
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception:
+            logger.warning('Could not delete old avatar variant %s', key, exc_info=True)
+
+
+def avatar_key(user, size):
+    # Key of the smallest variant at least size pixels wide (the largest one when none is), or
+    # the original picture when no variants were generated
+    variants = user.profile_picture_variants or {}
+    if variants:
+        sizes = sorted(int(width) for width in variants)
+        fitting = [width for width in sizes if width >= size]
+        return variants[str(fitting[0] if fitting else sizes[-1])]
+    return user.profile_picture.name if user.profile_picture else None
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.urls import Resolver404, resolve
+
+
+class ASGITransport:
+    # Sends requests straight into an ASGI application, no server or sockets in between
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, path, headers, body=b''):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # The client never disconnects, Django cancels this wait once the response is sent
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        return response['status'], b''.join(response['body'])
+
+
+class HTTPTransport:
+    # Minimal HTTP/1.1 client over one keep-alive connection, for measuring a running server
+    # (runserver, gunicorn, uvicorn). Each virtual user gets its own transport.
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self._reader = self._writer = None
+
+    async def request(self, method, path, headers, body=b''):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        try:
+            await self._writer.drain()
+            return await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            raise
+
+    async def _read_response(self):
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while (line := await self._reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while size := int((await self._reader.readline()).strip(), 16):
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            await self._reader.readline()
+            body = b''.join(chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Session:
+    # One virtual user: its token, a transport and the samples it records
+    def __init__(self, transport, token, dataset, rng, results):
+        self.transport = transport
+        self.headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        self.dataset = dataset
+        self.rng = rng
+        self.results = results
+
+    def pick_video(self):
+        return self.rng.choice(self.dataset['video_ids'])
+
+    async def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else b''
+        started = time.perf_counter()
+        try:
+            status, _ = await self.transport.request(method, path, self.headers, body)
+        except Exception:
+            status = None
+        self.results.record(method, path, (time.perf_counter() - started) * 1000, status)
+        return status
+
+    async def get(self, path):
+        return await self.request('GET', path)
+
+    async def post(self, path, data=None):
+        return await self.request('POST', path, data)
+
+
+# Scenarios replay what the app does on one user action
+
+async def swipe(session):
+    # A new short comes into view: its payload, whether the viewer liked it and its comments
+    video_id = session.pick_video()
+    await session.get(f'/api/video/{video_id}/')
+    await session.get(f'/api/like/{video_id}/status/')
+    await session.get(f'/api/videos/{video_id}/comments/')
+
+
+async def feed(session):
+    await session.get('/api/videos/trending/?include=viewer_state')
+
+
+async def search_typing(session):
+    # One lookup per keystroke of a username prefix
+    username = session.rng.choice(session.dataset['usernames'])
+    for end in range(1, min(len(username), 6) + 1):
+        await session.get(f'/api/users/search/?search={username[:end]}')
+
+
+async def like_toggle(session):
+    video_id = session.pick_video()
+    await session.post(f'/api/like/{video_id}/')
+    await session.get(f'/api/like/{video_id}/status/')
+    await session.post(f'/api/like/{video_id}/')
+
+
+SCENARIOS = {
+    'swipe': swipe,
+    'feed': feed,
+    'search': search_typing,
+    'like': like_toggle,
+}
+DEFAULT_MIX = {'swipe': 6, 'feed': 1, 'search': 2, 'like': 2}
+
+
+def parse_mix(value):
+    # "swipe=6,search=2,like=2" -> {'swipe': 6, 'search': 2, 'like': 2}
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}, choose from {", ".join(SCENARIOS)}.')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def route_of(method, path):
+    # Group samples by URL pattern, e.g. "GET api/video/<int:id>/"
+    try:
+        route = resolve(path.partition('?')[0]).route
+    except Resolver404:
+        route = path
+    return f'{method} {route}'
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.requests = 0
+
+    def record(self, method, path, elapsed_ms, status):
+        route = route_of(method, path)
+        self.latencies[route].append(elapsed_ms)
+        self.requests += 1
+        if status is None or status >= 400:
+            self.errors[route] += 1
+
+    def report(self, elapsed):
+        # One row per route plus the total: requests, errors, throughput and latency percentiles
+        rows = []
+        everything = []
+        for route in sorted(self.latencies):
+            timings = sorted(self.latencies[route])
+            everything += timings
+            rows.append(self._row(route, timings, self.errors[route], elapsed))
+        rows.append(self._row('total', sorted(everything), sum(self.errors.values()), elapsed))
+        return rows
+
+    @staticmethod
+    def _row(route, timings, errors, elapsed):
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+        return {
+            'route': route,
+            'requests': len(timings),
+            'errors': errors,
+            'rps': len(timings) / elapsed if elapsed else 0,
+            'p50': percentile(50),
+            'p90': percentile(90),
+            'p99': percentile(99),
+            'max': timings[-1],
+        }
+
+
+async def run_load(make_transport, dataset, mix=None, concurrency=20, duration=30, max_requests=None, seed=0):
+    # Closed-loop load: `concurrency` virtual users each run scenarios picked by weight from mix,
+    # back to back, until duration seconds passed or max_requests were sent.
+    # dataset holds 'tokens', 'video_ids' and 'usernames'. Returns (Results, elapsed seconds).
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    results = Results()
+    deadline = time.monotonic() + duration
+
+    def done():
+        return time.monotonic() >= deadline or (max_requests and results.requests >= max_requests)
+
+    async def virtual_user(n):
+        rng = random.Random(seed * 100003 + n)
+        transport = make_transport()
+        session = Session(transport, dataset['tokens'][n % len(dataset['tokens'])], dataset, rng, results)
+        try:
+            while not done():
+                await SCENARIOS[rng.choices(names, weights)[0]](session)
+        finally:
+            if hasattr(transport, 'close'):
+                transport.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user(n) for n in range(concurrency)))
+    return results, time.monotonic() - started
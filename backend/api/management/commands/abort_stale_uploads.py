@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.uploads import abort_stale_sessions
+
+
+class Command(BaseCommand):
+    help = 'Abort multipart video uploads that were never completed, so S3 drops their parts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.VIDEO_UPLOAD_STALE_HOURS, help='Age after which an upload is stale')
+
+    def handle(self, *args, **options):
+        aborted = abort_stale_sessions(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'Aborted {aborted} stale uploads.'))
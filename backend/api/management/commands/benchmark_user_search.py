@@ -0,0 +1,59 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import User, UserSearchPrefix, UserStats
+from api.search import rebuild_index, search_queryset
+
+
+class Command(BaseCommand):
+    help = 'Time ranked user search lookups against the prefix index, optionally seeding synthetic users first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Create this many synthetic users (bench_*) before measuring')
+        parser.add_argument('--queries', type=int, default=500, help='Number of lookups to time')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'])
+
+        usernames = list(User.objects.order_by('?').values_list('username', flat=True)[:1000])
+        if not usernames:
+            self.stderr.write('No users to search for, use --seed.')
+            return
+
+        timings = []
+        for _ in range(options['queries']):
+            username = random.choice(usernames)
+            query = username[:random.randint(1, min(len(username), 6))]
+            start = time.perf_counter()
+            list(search_queryset(query).order_by('-popularity', 'user_id').values_list('user_id', flat=True)[:options['page_size']])
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+        self.stdout.write(
+            f'{len(timings)} lookups over {UserSearchPrefix.objects.count()} index rows: '
+            f'p50 {percentile(50):.2f} ms, p95 {percentile(95):.2f} ms, p99 {percentile(99):.2f} ms, max {timings[-1]:.2f} ms'
+        )
+
+    def seed(self, count, batch_size):
+        start = User.objects.filter(username__startswith='bench_').count()
+        for offset in range(start, start + count, batch_size):
+            names = [
+                'bench_' + ''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 10))) + f'_{n}'
+                for n in range(offset, min(offset + batch_size, start + count))
+            ]
+            with transaction.atomic():
+                users = User.objects.bulk_create([User(username=name, password='!') for name in names])
+                if users and users[0].pk is None:
+                    # MySQL does not return primary keys from bulk inserts
+                    users = list(User.objects.filter(username__in=names))
+                UserStats.objects.bulk_create([UserStats(user=user, follower_count=random.randint(0, 10000)) for user in users])
+        self.stdout.write(f'Seeded {count} users, rebuilding the index...')
+        rebuild_index(batch_size=batch_size)
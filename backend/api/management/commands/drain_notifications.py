@@ -0,0 +1,36 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.notifications import drain_outbox
+
+
+def _drain(batch_size):
+    try:
+        return drain_outbox(batch_size)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox into (aggregated) notifications, for NOTIFICATION_OUTBOX_MODE=external'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # Workers lock disjoint batches (SKIP LOCKED), so they can drain side by side
+                futures = [pool.submit(_drain, options['batch_size']) for _ in range(options['workers'])]
+                processed = sum(future.result() for future in futures)
+                if processed or not options['loop']:
+                    self.stdout.write(f'Processed {processed} outbox events.')
+                if not options['loop']:
+                    break
+                if not processed:
+                    time.sleep(options['interval'])
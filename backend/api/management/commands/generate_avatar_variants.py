@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from api.images import generate_avatar_variants
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Render the WebP profile picture variants for users that have a picture but no variants (or everyone with --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also re-render users that already have variants (e.g. after changing AVATAR_SIZES)')
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        if not options['all']:
+            users = users.filter(profile_picture_variants={})
+        processed = failed = 0
+        for user in users.order_by('id').iterator():
+            try:
+                generate_avatar_variants(user)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'User {user.pk}: {exc}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered variants for {processed} users ({failed} failed).'))
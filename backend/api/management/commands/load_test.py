@@ -0,0 +1,73 @@
+import asyncio
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from rest_framework_simplejwt.tokens import RefreshToken
+from api.loadtest import ASGITransport, DEFAULT_MIX, HTTPTransport, parse_mix, run_load
+from api.models import User, Video
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a mix of app actions (swipe, feed, search typing, like toggling) against the API and report '
+        'throughput and latency percentiles per route. Runs the ASGI app in-process unless --url is given. '
+        'Seed data first with seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000 (default: in-process ASGI)')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of virtual users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests')
+        parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()), help='Scenario weights')
+        parser.add_argument('--users', type=int, default=500, help='Number of existing users to act as')
+        parser.add_argument('--videos', type=int, default=5000, help='Swipe through this many of the top trending videos')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        dataset = self.dataset(options['users'], options['videos'], options['seed'])
+        if options['url']:
+            make_transport = lambda: HTTPTransport(options['url'])  # noqa: E731
+            target = options['url']
+        else:
+            from tiktok_clone.asgi import application
+            transport = ASGITransport(application)
+            make_transport = lambda: transport  # noqa: E731
+            target = 'in-process ASGI app'
+
+        self.stdout.write(f"{options['concurrency']} virtual users against {target} for {options['duration']:g}s...")
+        results, elapsed = asyncio.run(run_load(
+            make_transport, dataset, mix=mix, concurrency=options['concurrency'],
+            duration=options['duration'], max_requests=options['requests'], seed=options['seed'],
+        ))
+        if not results.requests:
+            raise CommandError('No requests were sent.')
+
+        self.stdout.write(f"{'route':<48} {'reqs':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for row in results.report(elapsed):
+            self.stdout.write(
+                f"{row['route']:<48} {row['requests']:>7} {row['errors']:>6} {row['rps']:>8.1f} "
+                f"{row['p50']:>8.1f} {row['p90']:>8.1f} {row['p99']:>8.1f} {row['max']:>8.1f}"
+            )
+
+    def dataset(self, user_count, video_count, seed):
+        # Tokens are minted directly, so the run measures the app and not the password hasher
+        bounds = User.objects.filter(is_active=True).aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            raise CommandError('No users, run seed_data first.')
+        start = random.Random(seed).randint(bounds['low'], max(bounds['low'], bounds['high'] - user_count))
+        users = list(User.objects.filter(is_active=True, id__gte=start).order_by('id')[:user_count])
+        video_ids = list(Video.objects.filter(status='ready').order_by('-trending_score', '-id').values_list('id', flat=True)[:video_count])
+        if not video_ids:
+            raise CommandError('No videos, run seed_data first.')
+        return {
+            'tokens': [str(RefreshToken.for_user(user).access_token) for user in users],
+            'usernames': [user.username for user in users],
+            'video_ids': video_ids,
+        }
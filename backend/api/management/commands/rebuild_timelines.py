@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.models import User
+from api.timeline import rebuild_timeline, trim_timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized Following timelines from the follow graph, or only trim them to TIMELINE_MAX_LENGTH (run rebuild_user_stats first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only process this user id (repeatable)')
+        parser.add_argument('--trim-only', action='store_true', help='Only cut timelines down to TIMELINE_MAX_LENGTH')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or User.objects.order_by('id').values_list('id', flat=True).iterator()
+        users = entries = 0
+        for user_id in user_ids:
+            if options['trim_only']:
+                entries += trim_timeline(user_id)
+            else:
+                entries += rebuild_timeline(user_id)
+            users += 1
+        action = 'Trimmed' if options['trim_only'] else 'Wrote'
+        self.stdout.write(self.style.SUCCESS(f'{action} {entries} timeline entries for {users} users.'))
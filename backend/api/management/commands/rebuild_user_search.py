@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.search import rebuild_index, refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the user search prefix index, or only refresh the popularity ranking it stores (run rebuild_user_stats first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--popularity-only', action='store_true', help='Only copy the current follower counts into the index')
+        parser.add_argument('--loop', action='store_true', help='With --popularity-only, keep refreshing every SEARCH_POPULARITY_REFRESH_INTERVAL seconds')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['popularity_only']:
+            users = rebuild_index(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed {users} users.'))
+            return
+        while True:
+            started = time.monotonic()
+            rows = refresh_popularity(batch_size=options['batch_size'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Refreshed popularity on {rows} index rows in {elapsed:.2f}s.')
+            if not options['loop']:
+                break
+            time.sleep(max(settings.SEARCH_POPULARITY_REFRESH_INTERVAL - elapsed, 0))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized per-user counters (followers, following, videos, hearts) from the base tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only rebuild this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = rebuild_user_stats(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {processed} users.'))
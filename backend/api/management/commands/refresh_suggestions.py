@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.checks import cache_is_process_local
+from api.suggestions import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached suggested users from the follow graph (use --loop to keep refreshing every SUGGESTIONS_REFRESH_INTERVAL seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true')
+
+    def handle(self, *args, **options):
+        if cache_is_process_local('default'):
+            raise CommandError('The default cache is local to this process, the web workers would never see the results. Set CACHE_URL.')
+        while True:
+            started = time.monotonic()
+            refreshed = refresh_suggestions()
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Cached suggestions for {refreshed} users in {elapsed:.2f}s.')
+            if not options['loop']:
+                break
+            time.sleep(max(settings.SUGGESTIONS_REFRESH_INTERVAL - elapsed, 0))
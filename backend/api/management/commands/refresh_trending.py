@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.checks import cache_is_process_local
+from api.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed trending scores (use --loop to keep refreshing every TRENDING_REFRESH_INTERVAL seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true')
+
+    def handle(self, *args, **options):
+        # One-off runs (from cron) read the previous run's time from the cache to decay the
+        # scores by the real gap, a process-local cache would start empty every time
+        if not options['loop'] and cache_is_process_local('default'):
+            raise CommandError('The default cache is local to this process, scores would decay by the wrong interval. Set CACHE_URL or use --loop.')
+        while True:
+            started = time.monotonic()
+            rescored = refresh_trending()
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Rescored {rescored} videos in {elapsed:.2f}s.')
+            if not options['loop']:
+                break
+            time.sleep(max(settings.TRENDING_REFRESH_INTERVAL - elapsed, 0))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api.seed import SEED_PASSWORD, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Bulk insert a synthetic dataset (users, follows, videos, likes, comments, notifications) for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--follows-per-user', type=int, default=20, help='Mean number of follows per user')
+        parser.add_argument('--videos-per-user', type=int, default=3, help='Mean number of videos per user')
+        parser.add_argument('--likes-per-video', type=int, default=10, help='Mean number of likes per video')
+        parser.add_argument('--comments-per-video', type=int, default=3, help='Mean number of comments per video')
+        parser.add_argument('--prefix', default='seed', help='Username prefix')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same dataset')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-timelines', action='store_true', help='Do not rebuild the Following timelines (run rebuild_timelines later)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def log(message):
+            self.stdout.write(f'[{time.monotonic() - started:7.1f}s] {message}')
+
+        data = seed_dataset(
+            users=options['users'],
+            follows_per_user=options['follows_per_user'],
+            videos_per_user=options['videos_per_user'],
+            likes_per_video=options['likes_per_video'],
+            comments_per_video=options['comments_per_video'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            timelines=not options['skip_timelines'],
+            log=log,
+        )
+        rows = len(data['user_ids']) + len(data['video_ids']) + data['follows'] + data['likes'] + data['comments'] + data['notifications']
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s). '
+            f"Users are {options['prefix']}_<n> with password '{SEED_PASSWORD}'."
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from api.models import SlowQuery
+from api.slow_queries import recorder
+
+ORDERINGS = {
+    'total': '-total_time',
+    'count': '-count',
+    'max': '-max_time',
+}
+
+
+class Command(BaseCommand):
+    help = 'List the recorded slow query shapes, worst first, with their call site and EXPLAIN plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=ORDERINGS, default='total', help='Rank by total time, number of runs or slowest run')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--view', help='Only queries recorded under this URL name')
+        parser.add_argument('--no-explain', action='store_true', help='Leave out the plans')
+        parser.add_argument('--reset', action='store_true', help='Delete all recorded queries')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} slow queries.'))
+            return
+
+        recorder.flush()
+        queries = SlowQuery.objects.order_by(ORDERINGS[options['order']], 'id')
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+        queries = list(queries[:options['limit']])
+        if not queries:
+            self.stdout.write('No slow queries recorded.')
+            return
+
+        for rank, query in enumerate(queries, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank}  {query.total_time:.0f} ms total, {query.count} runs, '
+                f'avg {query.total_time / query.count:.1f} ms, max {query.max_time:.1f} ms'
+            ))
+            self.stdout.write(f'  view:      {query.view or "-"}')
+            self.stdout.write(f'  call site: {query.call_site or "-"}')
+            self.stdout.write(f'  last seen: {query.last_seen:%Y-%m-%d %H:%M:%S}')
+            self.stdout.write(f'  query:     {query.normalized_sql}')
+            if query.explain and not options['no_explain']:
+                self.stdout.write('  plan:')
+                for line in query.explain.splitlines():
+                    self.stdout.write(f'    {line}')
+            self.stdout.write('')
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.models import Video
+from api.transcoding import process_pending
+
+
+def _process(limit):
+    try:
+        return process_pending(limit)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Transcode pending videos into HLS renditions, for TRANSCODE_MODE=external or to catch up after a restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many videos per worker')
+        parser.add_argument('--requeue', action='store_true', help='Put failed and all processing videos back in the queue first (stalled claims are requeued after TRANSCODE_CLAIM_TIMEOUT anyway)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for pending videos')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            requeued = Video.objects.filter(status__in=['processing', 'failed']).update(status='pending')
+            self.stdout.write(f'Requeued {requeued} videos.')
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # Each video is claimed with a conditional UPDATE, so workers never collide
+                futures = [pool.submit(_process, options['limit']) for _ in range(options['workers'])]
+                processed = sum(future.result() for future in futures)
+                if processed or not options['loop']:
+                    self.stdout.write(f'Transcoded {processed} videos.')
+                if not options['loop']:
+                    break
+                if not processed:
+                    time.sleep(options['interval'])
@@ -0,0 +1,240 @@
+import contextvars
+import hmac
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import renderers, serializers
+
+# Buckets of the query count histogram, the time histograms use METRICS_LATENCY_BUCKETS
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+
+# The sample being recorded for the current request, None when the request is not sampled
+_current = contextvars.ContextVar('metrics_sample', default=None)
+
+
+class RequestSample:
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.serialization_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum}'
+        yield f'{name}_count{_labels(labels)} {cumulative}'
+
+
+def _labels(labels, **extra):
+    items = {**labels, **{key: str(value) for key, value in extra.items()}}
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items.items()) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    # Per-process aggregates of the sampled requests, keyed by (route, method). Every worker
+    # process exposes its own, so scrape each worker (or sum them in Prometheus).
+
+    histograms = {
+        'api_request_duration_seconds': ('Time spent handling the request', None),
+        'api_request_sql_seconds': ('Time spent executing SQL per request', None),
+        'api_request_serialization_seconds': ('Time spent in serializers and renderers per request', None),
+        'api_request_queries': ('SQL queries per request', QUERY_COUNT_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._responses = {}
+
+    def observe(self, route, method, status, duration, sample):
+        values = {
+            'api_request_duration_seconds': duration,
+            'api_request_sql_seconds': sample.sql_seconds,
+            'api_request_serialization_seconds': sample.serialization_seconds,
+            'api_request_queries': sample.queries,
+        }
+        key = (route, method)
+        with self._lock:
+            histograms = self._histograms.get(key)
+            if histograms is None:
+                histograms = self._histograms[key] = {
+                    name: Histogram(buckets or settings.METRICS_LATENCY_BUCKETS)
+                    for name, (_, buckets) in self.histograms.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+            response_key = (route, method, str(status))
+            self._responses[response_key] = self._responses.get(response_key, 0) + 1
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        lines = [
+            '# HELP api_metrics_sample_rate Fraction of requests that are recorded',
+            '# TYPE api_metrics_sample_rate gauge',
+            f'api_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+            '# HELP api_responses_total Sampled responses by status code',
+            '# TYPE api_responses_total counter',
+        ]
+        with self._lock:
+            for (route, method, status), count in sorted(self._responses.items()):
+                lines.append(f'api_responses_total{_labels({"route": route, "method": method, "status": status})} {count}')
+            for name, (help_text, _) in self.histograms.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), histograms in sorted(self._histograms.items()):
+                    lines.extend(histograms[name].lines(name, {'route': route, 'method': method}))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def route_name(request):
+    # The URL name from api/urls.py, the route pattern for unnamed ones
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route
+
+
+def count_queries(execute, sql, params, many, context):
+    # Execute wrapper installed on every connection (see ApiConfig.ready): the query counts
+    # towards the sampled request whichever thread runs it, the context variable follows the
+    # request into sync_to_async and the database pool of api/async_views.py
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    return sample.execute_wrapper(execute, sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # connection_created receiver
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class MetricsMiddleware:
+    # Times METRICS_SAMPLE_RATE of the requests: total latency, SQL queries and time (through
+    # count_queries) and serialization time. Unsampled requests only cost a random() call.
+    # Async capable, so the async views of api/async_views.py are not adapted back to sync.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        sample = RequestSample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.observe(route_name(request), request.method, response.status_code, time.perf_counter() - started, sample)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        sample = RequestSample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.observe(route_name(request), request.method, response.status_code, time.perf_counter() - started, sample)
+        return response
+
+    @staticmethod
+    def sampled():
+        rate = settings.METRICS_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def _timed(function):
+    # Count the time spent in function towards the sampled request's serialization time, once
+    # for nested calls (a ListSerializer's .data calls the child serializers)
+    def wrapper(*args, **kwargs):
+        sample = _current.get()
+        if sample is None:
+            return function(*args, **kwargs)
+        sample.serialization_depth += 1
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sample.serialization_depth -= 1
+            if not sample.serialization_depth:
+                sample.serialization_seconds += time.perf_counter() - started
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def instrument_serialization():
+    # Wrap the DRF entry points that turn objects into response bytes, called from
+    # ApiConfig.ready(). SQL run lazily from a serializer counts as SQL and serialization time.
+    # This patches Serializer.data, ListSerializer.data and JSONRenderer.render process-wide, for
+    # every app, not only the API views: outside a sampled request the wrappers only read a
+    # context variable and call through. Nothing is patched when METRICS_SAMPLE_RATE is 0.
+    if not settings.METRICS_SAMPLE_RATE:
+        return
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        data = cls.__dict__['data']
+        if not hasattr(data.fget, '__wrapped__'):
+            setattr(cls, 'data', property(_timed(data.fget)))
+    render = renderers.JSONRenderer.render
+    if not hasattr(render, '__wrapped__'):
+        renderers.JSONRenderer.render = _timed(render)
+
+
+def metrics_view(request):
+    # Prometheus scrape endpoint, answered to `Authorization: Bearer <METRICS_TOKEN>` only (the
+    # client address says nothing behind a reverse proxy). Without a token it is never served.
+    token = settings.METRICS_TOKEN
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
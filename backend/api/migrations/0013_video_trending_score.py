@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='trending_engagement',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-trending_score', '-id'], name='video_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:16
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Racing get_or_create calls could store the same pair twice, keep the oldest row of each
+    liked_videos = set()
+    for model_name, fields in [('Like', ['user', 'video']), ('Favorite', ['user', 'video']), ('Follower', ['follower', 'following'])]:
+        model = apps.get_model('api', model_name)
+        duplicates = model.objects.values(*fields).annotate(keep=Min('id'), n=Count('id')).filter(n__gt=1)
+        for row in duplicates:
+            pair = {field: row[field] for field in fields}
+            model.objects.filter(**pair).exclude(id=row['keep']).delete()
+            if model_name == 'Like':
+                liked_videos.add(row['video'])
+
+    # Duplicated likes inflated the denormalized counter of those videos
+    Video = apps.get_model('api', 'Video')
+    Like = apps.get_model('api', 'Like')
+    for video_id in liked_videos:
+        Video.objects.filter(id=video_id).update(likes_count=Like.objects.filter(video_id=video_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='favorite_unique_user_video'),
+        ),
+        migrations.AddConstraint(
+            model_name='follower',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='follower_unique_edge'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='like_unique_user_video'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_unique_toggle_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchPrefix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=32)),
+                ('popularity', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['prefix', '-popularity', 'user'], name='usersearch_prefix_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('prefix', 'user'), name='usersearch_unique_prefix_user')],
+            },
+        ),
+    ]
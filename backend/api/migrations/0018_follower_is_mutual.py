@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_mutual_edges(apps, schema_editor):
+    # Flag every edge whose reverse edge exists. The ids are selected first because MySQL cannot
+    # UPDATE a table filtered by a subquery on that same table.
+    Follower = apps.get_model('api', 'Follower')
+    reverse = Follower.objects.filter(follower_id=OuterRef('following_id'), following_id=OuterRef('follower_id'))
+    mutual_ids = list(Follower.objects.filter(Exists(reverse)).values_list('id', flat=True))
+    for start in range(0, len(mutual_ids), 1000):
+        Follower.objects.filter(id__in=mutual_ids[start:start + 1000]).update(is_mutual=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_usersearchprefix'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follower',
+            name='is_mutual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='follower',
+            index=models.Index(fields=['follower', 'is_mutual', '-created_at', '-id'], name='follower_mutual_created_idx'),
+        ),
+        migrations.RunPython(mark_mutual_edges, migrations.RunPython.noop),
+    ]
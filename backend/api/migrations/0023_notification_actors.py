@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_latest_actors(apps, schema_editor):
+    # Unseen aggregates only know their latest actor, earlier ones stay counted in actor_count
+    Notification = apps.get_model('api', 'Notification')
+    NotificationActor = apps.get_model('api', 'NotificationActor')
+    rows = Notification.objects.filter(seen=False, triggering_user__isnull=False).values_list('id', 'triggering_user_id')
+    NotificationActor.objects.bulk_create(
+        (NotificationActor(notification_id=notification_id, actor_id=actor_id) for notification_id, actor_id in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_slow_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='api.notification')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='notification_actor_unique')],
+            },
+        ),
+        migrations.RunPython(record_latest_actors, migrations.RunPython.noop),
+    ]
@@ -21,12 +21,49 @@ def upload_to_profile_picture(instance, filename):
 
 class User(AbstractUser):
     profile_picture = models.ImageField(upload_to=upload_to_profile_picture, blank=True, null=True)
+    # Resized WebP copies of profile_picture keyed by width in pixels, see images.py
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
     bio = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.username
 
+class UserStats(models.Model):
+    # Denormalized counters kept in sync by the write paths in views.py
+    # (rebuild with `python manage.py rebuild_user_stats`)
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    follower_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    video_count = models.IntegerField(default=0)
+    heart_count = models.IntegerField(default=0)
+    # Badge counter: +1 per new notification, reset by the mark-seen endpoints
+    unread_notifications = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-follower_count', 'user'], name='userstats_followers_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
+
+class UserSearchPrefix(models.Model):
+    # Inverted prefix index for user search (see search.py): one row per distinct prefix of the
+    # lowercased username and of each word in it, ranked by a popularity snapshot so a lookup
+    # is a single ordered range read on (prefix, popularity)
+    prefix = models.CharField(max_length=32)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    popularity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'user'], name='usersearch_unique_prefix_user'),
+        ]
+        indexes = [
+            models.Index(fields=['prefix', '-popularity', 'user'], name='usersearch_prefix_rank_idx'),
+        ]
+
 def upload_to_video(instance, filename):
     # Extract the file extension
     ext = filename.split('.')[-1]
@@ -43,6 +80,13 @@ def upload_to_thumbnail(instance, filename):
     # Return the full path for the thumbnail file
     return os.path.join('thumbnails/', new_filename)
 
+VIDEO_STATUSES = [
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
 class Video(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='videos')
     title = models.CharField(max_length=255)
@@ -53,6 +97,24 @@ class Video(models.Model):
     view_count = models.IntegerField(default=0)
     likes_count = models.IntegerField(default=0)
     comment_count = models.IntegerField(default=0)
+    # Time-decayed score maintained by `python manage.py refresh_trending` (see trending.py)
+    trending_score = models.FloatField(default=0)
+    trending_engagement = models.FloatField(default=0)
+    # Set by the transcoding stage (see transcoding.py), feeds only show ready videos
+    status = models.CharField(max_length=20, choices=VIDEO_STATUSES, default='pending')
+    # When a worker claimed the video, stale claims are requeued (see transcoding.requeue_stalled)
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    hls_playlist = models.CharField(max_length=255, blank=True)
+    renditions = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        # Keyset pagination orders on (created_at, id), see pagination.KeysetPagination
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='video_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='video_user_created_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='video_trending_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -62,32 +124,158 @@ class Like(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='like_unique_user_video'),
+        ]
+
 class Comment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['video', '-created_at', '-id'], name='comment_video_created_idx'),
+        ]
+
 class Favorite(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='favorites')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='favorites')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='favorite_unique_user_video'),
+        ]
+
 class Follower(models.Model):
     follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='following')
     following = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='followers')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set on both edges of a pair that follow each other, maintained by the follow toggle
+    is_mutual = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='follower_unique_edge'),
+        ]
+        indexes = [
+            models.Index(fields=['follower', '-created_at', '-id'], name='follower_follower_created_idx'),
+            models.Index(fields=['follower', 'is_mutual', '-created_at', '-id'], name='follower_mutual_created_idx'),
+            models.Index(fields=['following', '-created_at', '-id'], name='follower_following_created_idx'),
+        ]
+
+class TimelineEntry(models.Model):
+    # Materialized "Following" feed: one row per (reader, video), written when the video is
+    # uploaded (fan-out on write). created_at is copied from the video so the feed can be read
+    # with a single range scan on (user, created_at).
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='timeline_unique_user_video'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-video'], name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+NOTIFICATION_TYPES = [
+    ('like', 'Like'),
+    ('comment', 'Comment'),
+    ('follow', 'Follow')
+]
+
+class NotificationOutbox(models.Model):
+    # Notification events written in the same transaction as the like/comment/follow and
+    # drained in batches by notifications.drain_outbox
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    notification_type = models.CharField(max_length=50, choices=NOTIFICATION_TYPES)
+    created_at = models.DateTimeField(auto_now_add=True)
 
 class Notification(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
-    notification_type = models.CharField(max_length=50, choices=[
-        ('like', 'Like'),
-        ('comment', 'Comment'),
-        ('follow', 'Follow')
-    ])
+    notification_type = models.CharField(max_length=50, choices=NOTIFICATION_TYPES)
     seen = models.BooleanField(default=False)
-    # Add a field to store the user who triggered the notification
-    triggering_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='triggered_notifications')
\ No newline at end of file
+    # Add a field to store the user who triggered the notification (the latest one for aggregates)
+    triggering_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='triggered_notifications')
+    # Number of users folded into this notification ("alice and 312 others liked your video")
+    actor_count = models.IntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+            models.Index(fields=['user', 'seen', 'created_at'], name='notification_user_seen_idx'),
+        ]
+
+class NotificationActor(models.Model):
+    # The distinct users folded into an aggregated notification, so that an actor who toggles
+    # a like or follow repeatedly is counted once and removed again by cancel_notification
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='notification_actor_unique'),
+        ]
+
+UPLOAD_STATUSES = [
+    ('uploading', 'Uploading'),
+    ('completed', 'Completed'),
+    ('aborted', 'Aborted'),
+]
+
+class UploadSession(models.Model):
+    # A direct-to-S3 multipart upload of a video (see uploads.py). The client PUTs the parts to
+    # presigned URLs and the Video row is only created by the completion call.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    key = models.CharField(max_length=255)
+    upload_id = models.CharField(max_length=1024)
+    thumbnail_key = models.CharField(max_length=255, blank=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    part_size = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=UPLOAD_STATUSES, default='uploading')
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='upload_status_created_idx'),
+        ]
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.part_size))
+
+class SlowQuery(models.Model):
+    # One row per query shape (literals stripped) that ran slower than SLOW_QUERY_THRESHOLD_MS,
+    # written by slow_queries.SlowQueryRecorder. The example, call site and view are the latest ones.
+    fingerprint = models.CharField(max_length=40, unique=True)
+    normalized_sql = models.TextField()
+    example_sql = models.TextField()
+    explain = models.TextField(blank=True)
+    view = models.CharField(max_length=255, blank=True)
+    call_site = models.CharField(max_length=500, blank=True)
+    count = models.IntegerField(default=0)
+    total_time = models.FloatField(default=0)
+    max_time = models.FloatField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_time'], name='slowquery_total_time_idx'),
+        ]
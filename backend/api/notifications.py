@@ -0,0 +1,216 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Notification, NotificationActor, NotificationOutbox
+from .realtime import publish_notifications
+from .stats import bump_user_stats
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_VERBS = {
+    'like': 'liked your video',
+    'comment': 'commented on your video',
+    'follow': 'started following you',
+}
+
+
+def notification_content(actor_username, notification_type, actor_count=1):
+    verb = NOTIFICATION_VERBS[notification_type]
+    if actor_count > 1:
+        others = actor_count - 1
+        return f"{actor_username} and {others} {'other' if others == 1 else 'others'} {verb}"
+    return f"{actor_username} {verb}"
+
+
+def enqueue_notification(recipient_id, actor, notification_type, video_id=None):
+    # Write the event to the outbox as part of the caller's transaction, a worker turns it
+    # into a (possibly aggregated) Notification once the transaction commits
+    NotificationOutbox.objects.create(
+        recipient_id=recipient_id,
+        actor=actor,
+        video_id=video_id,
+        notification_type=notification_type,
+    )
+    transaction.on_commit(schedule_drain)
+
+
+def cancel_notification(recipient_id, actor, notification_type, video_id=None):
+    # Undo an event: drop it while still pending, otherwise take the actor back out of the
+    # recipient's unseen aggregate, so like/unlike toggling never inflates the actor count
+    deleted, _ = NotificationOutbox.objects.filter(
+        recipient_id=recipient_id,
+        actor=actor,
+        video_id=video_id,
+        notification_type=notification_type,
+    ).delete()
+    if deleted:
+        return
+
+    notification = Notification.objects.select_for_update().filter(
+        user_id=recipient_id,
+        video_id=video_id,
+        notification_type=notification_type,
+        seen=False,
+        actors__actor=actor,
+    ).first()
+    if notification is None:
+        return
+    NotificationActor.objects.filter(notification=notification, actor=actor).delete()
+    notification.actor_count -= 1
+    latest = notification.actors.select_related('actor').order_by('-id').first()
+    if notification.actor_count <= 0 or latest is None:
+        notification.delete()
+        bump_user_stats(recipient_id, unread_notifications=-1)
+        return
+    notification.triggering_user = latest.actor
+    notification.content = notification_content(latest.actor.username, notification_type, notification.actor_count)
+    notification.save(update_fields=['actor_count', 'triggering_user', 'content'])
+    transaction.on_commit(lambda: publish_notifications([notification]))
+
+
+def drain_outbox(batch_size=None):
+    # Process pending events until the outbox is empty. Returns the number of events processed.
+    batch_size = batch_size or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    processed = 0
+    while True:
+        drained = _drain_batch(batch_size)
+        processed += drained
+        if drained < batch_size:
+            return processed
+
+
+def _drain_batch(batch_size):
+    with transaction.atomic():
+        events = NotificationOutbox.objects.select_related('actor').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Concurrent workers take disjoint batches
+            of = ('self',) if connection.features.has_select_for_update_of else ()
+            events = events.select_for_update(skip_locked=True, of=of)
+        events = list(events[:batch_size])
+        if not events:
+            return 0
+
+        # Collapse the batch per (recipient, video, type), keeping the distinct actors in order
+        groups = {}
+        for event in events:
+            actors = groups.setdefault((event.recipient_id, event.video_id, event.notification_type), {})
+            actors[event.actor_id] = event.actor
+
+        # Fold into the recipient's unseen notification for the same key when there is one. The
+        # rows are locked, so a concurrent mark-seen either lands first (and the key starts a
+        # new notification) or waits for this batch.
+        existing = {}
+        keys = reduce(or_, (
+            Q(user_id=recipient_id, video_id=video_id, notification_type=notification_type)
+            for recipient_id, video_id, notification_type in groups
+        ))
+        open_notifications = Notification.objects.select_for_update().filter(keys, seen=False).order_by('created_at', 'id')
+        for notification in open_notifications:
+            existing[(notification.user_id, notification.video_id, notification.notification_type)] = notification
+        folded = set(NotificationActor.objects.filter(notification__in=existing.values()).values_list('notification_id', 'actor_id'))
+
+        now = timezone.now()
+        created, updated = [], []
+        new_actors = []
+        for (recipient_id, video_id, notification_type), actors in groups.items():
+            notification = existing.get((recipient_id, video_id, notification_type))
+            if notification is not None:
+                # Actors already in the aggregate (toggling again) are not new actors
+                actors = {actor_id: actor for actor_id, actor in actors.items() if (notification.id, actor_id) not in folded}
+                if not actors:
+                    continue
+            latest = list(actors.values())[-1]
+            if notification is None:
+                count = len(actors)
+                notification = Notification(
+                    user_id=recipient_id,
+                    video_id=video_id,
+                    notification_type=notification_type,
+                    triggering_user=latest,
+                    actor_count=count,
+                    content=notification_content(latest.username, notification_type, count),
+                )
+                created.append(notification)
+            else:
+                notification.actor_count += len(actors)
+                notification.triggering_user = latest
+                notification.content = notification_content(latest.username, notification_type, notification.actor_count)
+                notification.created_at = now
+                updated.append(notification)
+            new_actors += [(notification, actor_id) for actor_id in actors]
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Notification.objects.bulk_create(created)
+        else:
+            # MySQL does not hand back the new ids, which the push channel needs
+            for notification in created:
+                notification.save(force_insert=True)
+        Notification.objects.bulk_update(updated, ['actor_count', 'triggering_user', 'content', 'created_at'])
+        NotificationActor.objects.bulk_create(
+            NotificationActor(notification_id=notification.id, actor_id=actor_id) for notification, actor_id in new_actors
+        )
+        # Only brand new rows add to the badge, folding into an unseen aggregate does not
+        new_per_recipient = Counter(notification.user_id for notification in created)
+        for recipient_id, count in new_per_recipient.items():
+            bump_user_stats(recipient_id, unread_notifications=count)
+        NotificationOutbox.objects.filter(id__in=[event.id for event in events]).delete()
+        transaction.on_commit(lambda: publish_notifications(created + updated))
+        return len(events)
+
+
+class OutboxWorkerPool:
+    # Runs drain_outbox on a small thread pool after commits. Triggers that arrive while
+    # every worker is busy are absorbed and make a running worker drain once more.
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rerun = False
+
+    def submit(self):
+        with self._lock:
+            if self._in_flight >= self.workers:
+                self._rerun = True
+                return
+            self._in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='notification-outbox')
+        self._executor.submit(self._run)
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    drain_outbox()
+                except Exception:
+                    logger.exception('Failed to drain the notification outbox')
+                with self._lock:
+                    if not self._rerun:
+                        self._in_flight -= 1
+                        return
+                    self._rerun = False
+        finally:
+            close_old_connections()
+
+
+worker_pool = OutboxWorkerPool(settings.NOTIFICATION_OUTBOX_WORKERS)
+
+
+def schedule_drain():
+    # NOTIFICATION_OUTBOX_MODE: 'pool' drains on the in-process worker pool, 'sync' drains
+    # inline after commit and 'external' leaves it to `python manage.py drain_notifications`
+    mode = settings.NOTIFICATION_OUTBOX_MODE
+    if mode == 'pool':
+        worker_pool.submit()
+    elif mode == 'sync':
+        drain_outbox()
@@ -0,0 +1,168 @@
+import base64
+import datetime
+import json
+import operator
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Cursor pagination over a unique composite ordering such as ('-created_at', '-id').
+    # Each page is a `WHERE (created_at, id) < (?, ?) ORDER BY ... LIMIT n+1` range read on a
+    # matching index, so deep pages cost the same as the first one and no COUNT(*) is issued.
+    # Views can override the ordering with a `keyset_ordering` attribute.
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        rows = self._range(queryset, self.ordering, position, reverse)
+        return self._finish_page(rows, position, reverse)
+
+    def paginate_merged(self, sources, request, view=None):
+        # Merge several keyset-ordered sources into one page. Each source is a
+        # (queryset, ordering, to_item) triple whose ordering yields the same position
+        # values as self.ordering does on the mapped items, e.g. timeline rows ordered on
+        # ('-created_at', '-video_id') next to videos ordered on ('-created_at', '-id').
+        # All ordering fields must share one direction.
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        items = {}
+        for queryset, ordering, to_item in sources:
+            for row in self._range(queryset, ordering, position, reverse):
+                item = to_item(row)
+                items.setdefault(item.pk, item)
+        descending = self.ordering[0].startswith('-') != reverse
+        rows = sorted(items.values(), key=self.position_for, reverse=descending)
+        return self._finish_page(rows, position, reverse)
+
+    def _range(self, queryset, ordering, position, reverse):
+        queryset = queryset.order_by(*(_reverse_ordering(ordering) if reverse else ordering))
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.keyset_filter(position, reverse, ordering))
+            except (TypeError, ValueError, ValidationError):
+                # Values of the wrong kind for their field, e.g. a string in place of an id
+                raise NotFound(self.invalid_cursor_message)
+        return list(queryset[:self.page_size + 1])
+
+    def _finish_page(self, rows, position, reverse):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        self.next_position = self.position_for(rows[-1]) if has_next and rows else None
+        self.previous_position = self.position_for(rows[0]) if has_previous and rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def keyset_filter(self, position, reverse=False, ordering=None):
+        # (a, b) < (x, y)  ==>  a < x OR (a = x AND b < y), per-field direction aware
+        ordering = ordering or self.ordering
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            equal = {f.lstrip('-'): value for f, value in zip(ordering[:i], position[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': position[i]}))
+        return reduce(operator.or_, clauses)
+
+    def position_for(self, obj):
+        position = []
+        for field in self.ordering:
+            value = obj
+            for attr in field.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': [_to_json(value) for value in position]}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if not all(isinstance(value, (str, int, float)) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
@@ -0,0 +1,191 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .replicas import primary_reads
+
+
+def shared_cache():
+    return caches[settings.DETAIL_CACHE_ALIAS]
+
+
+# Version keys read by get_version() inside track_versions()
+_read_keys = contextvars.ContextVar('payload_version_keys', default=None)
+
+
+@contextmanager
+def track_versions():
+    # Collects the keys of the versions read inside the block, e.g. the ones an ETag is made of
+    keys = []
+    token = _read_keys.set(keys)
+    try:
+        yield keys
+    finally:
+        _read_keys.reset(token)
+
+
+def get_version(key):
+    # Current value of a version counter, created on first use. Nanosecond timestamps never
+    # repeat a version that was evicted earlier.
+    keys = _read_keys.get()
+    if keys is not None:
+        keys.append(key)
+    version = shared_cache().get(key)
+    if version is None:
+        shared_cache().add(key, time.time_ns(), None)
+        version = shared_cache().get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        shared_cache().incr(key)
+    except ValueError:
+        shared_cache().set(key, time.time_ns(), None)
+    if settings.DATABASE_REPLICAS:
+        # Marks the write for as long as the replicas may lag behind it, see bumped_recently()
+        shared_cache().set(f'{key}:bumped', True, settings.READ_YOUR_WRITES_WINDOW)
+
+
+def bumped_recently(keys):
+    # Whether any of these versions changed in the last READ_YOUR_WRITES_WINDOW seconds
+    return bool(keys) and bool(shared_cache().get_many([f'{key}:bumped' for key in keys]))
+
+
+class LocalLRU:
+    # Small per-process tier in front of the shared cache. Entries expire after ttl seconds, which
+    # bounds how long another process's invalidation can go unnoticed here.
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PayloadCache:
+    # Read-through cache of serialized payloads (video or user detail) in two tiers: a local LRU
+    # and the shared Django cache named by DETAIL_CACHE_ALIAS. Shared entries are keyed by a
+    # per-object version, so invalidating is a version bump: a reader that built a payload from
+    # rows read before the write stores it under the old version, where nobody looks anymore.
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.local = LocalLRU(settings.DETAIL_CACHE_LOCAL_SIZE, settings.DETAIL_CACHE_LOCAL_TTL)
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def version(self, pk):
+        return get_version(f'{self.kind}:version:{pk}')
+
+    def get(self, pk, build):
+        # Payload for pk, calling build() on a miss. build may return None (e.g. unknown id),
+        # which is passed through without being cached.
+        payload = self.local.get(pk)
+        if payload is not None:
+            self._count('local_hits')
+            return payload
+
+        key = f'{self.kind}:{pk}:{self.version(pk)}'
+        payload = shared_cache().get(key)
+        if payload is not None:
+            self._count('shared_hits')
+        else:
+            self._count('misses')
+            # Built from the primary: a payload read from a lagging replica would be shared
+            # under the new version until the next write
+            with primary_reads():
+                payload = build()
+            if payload is None:
+                return None
+            shared_cache().set(key, payload, settings.DETAIL_CACHE_TIMEOUT)
+        self.local.set(pk, payload)
+        return payload
+
+    def invalidate(self, *pks):
+        # Drop the payloads once the current transaction commits (immediately outside of one)
+        transaction.on_commit(lambda: self._bump(pks))
+
+    def _bump(self, pks):
+        for pk in pks:
+            self.local.pop(pk)
+            bump_version(f'{self.kind}:version:{pk}')
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            total = hits + self.misses
+            return {
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': hits / total if total else None,
+                'local_hit_ratio': self.local_hits / total if total else None,
+                'local_entries': len(self.local),
+            }
+
+
+video_cache = PayloadCache('video')
+user_cache = PayloadCache('user')
+
+
+def collection_version(name):
+    # Version of a list endpoint's content, e.g. 'videos' or 'comments:<video id>'
+    return get_version(f'collection:version:{name}')
+
+
+def invalidate_collections(*names):
+    # Bump collection versions once the current transaction commits
+    def bump():
+        for name in names:
+            bump_version(f'collection:version:{name}')
+    transaction.on_commit(bump)
+
+
+def invalidate_video(video_id, owner_id):
+    # A video row changed: its detail payload and the lists that show it
+    video_cache.invalidate(video_id)
+    invalidate_collections('videos', f'user_videos:{owner_id}')
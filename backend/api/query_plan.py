@@ -0,0 +1,34 @@
+def plan_queryset(queryset, serializer_class, path=None):
+    # Apply what a serializer declares it reads, as Meta options next to `fields`:
+    #   select_related   relations followed for every row (foreign keys, one-to-ones)
+    #   prefetch_related many-valued relations, fetched with one extra query per relation
+    #   only             the columns actually serialized, the rest stay in the database
+    # path is the relation from the queryset's rows to the serialized objects (e.g. 'following'
+    # when Follower rows are paged and their users serialized). Under a path, only() is skipped
+    # since the rows themselves still need their own columns.
+    meta = getattr(serializer_class, 'Meta', None)
+    prefix = f'{path}__' if path else ''
+    select_related = [prefix + field for field in getattr(meta, 'select_related', ())]
+    prefetch_related = [prefix + field for field in getattr(meta, 'prefetch_related', ())]
+    if path:
+        select_related.insert(0, path)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    only = getattr(meta, 'only', None)
+    if only and not path:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+class QueryPlanMixin:
+    # Paginated list views plan their queryset from the serializer's Meta (see plan_queryset),
+    # so each page costs a fixed number of queries whatever its size
+    query_plan_path = None
+
+    def plan_queryset(self, queryset):
+        return plan_queryset(queryset, self.get_serializer_class(), self.query_plan_path)
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.plan_queryset(queryset))
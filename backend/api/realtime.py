@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import json
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Subscription:
+    # One connected client. Events are queued on the connection's event loop; when the client
+    # cannot keep up the queue is dropped and the connection resyncs from the database instead
+    # of buffering without bound.
+
+    def __init__(self, user_id, loop, max_size):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+
+class InProcessBroker:
+    # Fans events out to the subscriptions of this process. Replace it (NOTIFICATION_BROKER)
+    # with a shared implementation of subscribe/unsubscribe/publish when running several
+    # ASGI processes.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id, max_size=None):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), max_size or settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        # Safe to call from any thread
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.NOTIFICATION_BROKER)()
+    return _broker
+
+
+def stream_cursor(created_at, notification_id=0):
+    # Position in a user's stream: notifications are ordered on (created_at, id), and coalescing
+    # into an aggregate moves it forward by bumping its created_at. Sent along with every event,
+    # so a client resumes from what it actually received rather than from the row's current state.
+    return f'{(created_at - EPOCH) // datetime.timedelta(microseconds=1)}.{notification_id}'
+
+
+def parse_stream_cursor(cursor):
+    try:
+        micros, notification_id = (int(part) for part in cursor.split('.'))
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + datetime.timedelta(microseconds=micros), notification_id
+
+
+def notification_event(notification):
+    from .serializer import NotificationSerializer
+
+    return {
+        'type': 'notification',
+        'notification': NotificationSerializer(notification).data,
+        'cursor': stream_cursor(notification.created_at, notification.id),
+    }
+
+
+def publish_notifications(notifications):
+    broker = get_broker()
+    for notification in notifications:
+        broker.publish(notification.user_id, notification_event(notification))
+
+
+def _authenticate(token):
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+    from .models import User
+
+    try:
+        user_id = AccessToken(token)['user_id']
+    except (TokenError, KeyError):
+        return None
+    return User.objects.filter(id=user_id, is_active=True).values_list('id', flat=True).first()
+
+
+def _notifications_since(user_id, cursor):
+    # The events after cursor, oldest first. Aggregates that were bumped since are included again.
+    from .models import Notification
+    from .query_plan import plan_queryset
+    from .serializer import NotificationSerializer
+
+    created_at, notification_id = cursor
+    notifications = (
+        Notification.objects.filter(user_id=user_id)
+        .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=notification_id))
+        .order_by('created_at', 'id')[:settings.NOTIFICATION_STREAM_RESUME_LIMIT]
+    )
+    notifications = plan_queryset(notifications, NotificationSerializer)
+    return [notification_event(notification) for notification in notifications]
+
+
+def _token_from_scope(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.lower().startswith(b'bearer '):
+            return value[7:].decode()
+    return parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+
+
+async def notification_socket(scope, receive, send):
+    # WebSocket endpoint streaming new notifications to their recipient.
+    # Connect with ?token=<access token> (or an Authorization header) and optionally
+    # ?cursor=<cursor of the last event received> to first receive the missed delta.
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    token = _token_from_scope(scope)
+    user_id = await sync_to_async(_authenticate)(token) if token else None
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def send_json(payload):
+        await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    async def send_delta(since):
+        # Returns the new position and the cursors sent, which may also be queued already
+        sent = set()
+        for event in await sync_to_async(_notifications_since)(user_id, since):
+            await send_json(event)
+            since = parse_stream_cursor(event['cursor'])
+            sent.add(event['cursor'])
+        return since, sent
+
+    broker = get_broker()
+    # Subscribe before reading the backlog so nothing published in between is lost. Without a
+    # cursor the stream starts now, which is also where a resync replays from.
+    subscription = broker.subscribe(user_id)
+    try:
+        cursor = parse_qs(scope.get('query_string', b'').decode()).get('cursor', [None])[0]
+        since = parse_stream_cursor(cursor)
+        since, replayed = await send_delta(since) if since else ((timezone.now(), 0), set())
+
+        receiver = asyncio.ensure_future(receive())
+        while True:
+            getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    return
+                # Client messages (pings) are ignored
+                receiver = asyncio.ensure_future(receive())
+                continue
+
+            event = getter.result()
+            if event['type'] == 'resync':
+                # The client fell behind: tell it, then replay what it missed from the database
+                subscription.overflowed = False
+                await send_json({'type': 'resync', 'cursor': stream_cursor(*since)})
+                since, replayed = await send_delta(since)
+                continue
+            # Published while the delta was read: already sent from the database. The cursor
+            # includes created_at, so a later bump of the same aggregate still goes through, and
+            # so does a notification that committed late with an older position.
+            if event['cursor'] in replayed:
+                continue
+            await send_json(event)
+            since = max(since, parse_stream_cursor(event['cursor']))
+    finally:
+        broker.unsubscribe(subscription)
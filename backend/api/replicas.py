@@ -0,0 +1,85 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+# Replica the current view reads from, None reads from the primary
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+
+class ReplicaRouter:
+    # DATABASE_ROUTERS entry. Writes always go to the primary. Reads go to the replica picked by
+    # ReplicaReadMixin for the current request, and to the primary everywhere else (write views,
+    # management commands, workers), so read-modify-write code never mixes the two.
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(user_id):
+    return f'replicas:pinned:{user_id}'
+
+
+def pin_reads_to_primary(user):
+    # Called by the views a user writes through: their reads stay on the primary for
+    # READ_YOUR_WRITES_WINDOW seconds, so they see their own like, comment, follow or upload
+    # even when the replicas lag
+    from .payload_cache import shared_cache
+
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        shared_cache().set(_pin_key(user.id), True, settings.READ_YOUR_WRITES_WINDOW)
+
+
+def replica_for(user):
+    # A random replica, or None (the primary) when there is none or the user wrote recently
+    from .payload_cache import shared_cache
+
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or (user.is_authenticated and shared_cache().get(_pin_key(user.id))):
+        return None
+    return random.choice(replicas)
+
+
+@contextmanager
+def primary_reads():
+    # Read from the primary inside the block, e.g. to build a payload other readers will reuse
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaReadMixin:
+    # For list and detail views that only read. Once the request is authenticated (on the
+    # primary), safe requests read from a replica, unless the user is pinned to the primary.
+    # Responses with an ETag (see ConditionalGetMixin, listed after this mixin) also stay on the
+    # primary while one of the versions it is made of was bumped in the last
+    # READ_YOUR_WRITES_WINDOW seconds: a page read from a lagging replica would otherwise be
+    # revalidated as fresh under the new version until the next write.
+
+    def dispatch(self, request, *args, **kwargs):
+        with primary_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        from .payload_cache import bumped_recently
+
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS:
+            return
+        if not bumped_recently(getattr(self, 'etag_keys', None)):
+            _read_alias.set(replica_for(request.user))
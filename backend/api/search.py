@@ -0,0 +1,86 @@
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from .models import User, UserSearchPrefix, UserStats
+
+MAX_PREFIX_LENGTH = UserSearchPrefix._meta.get_field('prefix').max_length
+WORD_SEPARATORS = re.compile(r'[._\-\s]+')
+
+
+def normalize(text):
+    return text.strip().lower()
+
+
+def username_prefixes(username):
+    # Prefixes of the whole username and of every word in it, so "john_doe" is found by "jo" and "do"
+    username = normalize(username)
+    words = [username] + [word for word in WORD_SEPARATORS.split(username) if word and word != username]
+    prefixes = set()
+    for word in words:
+        for end in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            prefixes.add(word[:end])
+    return prefixes
+
+
+def _rows_for(user_id, username, popularity):
+    return [UserSearchPrefix(prefix=prefix, user_id=user_id, popularity=popularity) for prefix in username_prefixes(username)]
+
+
+def index_user(user):
+    # (Re)index one user, called on signup and username changes
+    popularity = UserStats.objects.filter(user_id=user.pk).values_list('follower_count', flat=True).first() or 0
+    with transaction.atomic():
+        UserSearchPrefix.objects.filter(user_id=user.pk).delete()
+        UserSearchPrefix.objects.bulk_create(_rows_for(user.pk, user.username, popularity))
+
+
+def rebuild_index(batch_size=1000):
+    # Rebuild the whole index from the users table in one transaction, searches keep seeing the
+    # old index until it commits. Returns the number of users indexed.
+    users = User.objects.order_by('id').values_list('id', 'username', 'stats__follower_count')
+    indexed = 0
+    rows = []
+    with transaction.atomic():
+        UserSearchPrefix.objects.all().delete()
+        for user_id, username, popularity in users.iterator(chunk_size=batch_size):
+            rows.extend(_rows_for(user_id, username, popularity or 0))
+            indexed += 1
+            if len(rows) >= batch_size:
+                UserSearchPrefix.objects.bulk_create(rows, batch_size=batch_size)
+                rows = []
+        UserSearchPrefix.objects.bulk_create(rows, batch_size=batch_size)
+    return indexed
+
+
+def refresh_popularity(batch_size=1000):
+    # Copy the current follower counts into the index, batch_size users per UPDATE so no
+    # statement locks the whole table (run periodically, see `rebuild_user_search --loop`).
+    # Returns the number of index rows updated.
+    users = User.objects.order_by('id').values_list('id', 'stats__follower_count')
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return updated
+        last_id = batch[-1][0]
+        # One CASE branch per distinct count, like the view counter flush
+        by_count = defaultdict(list)
+        for user_id, follower_count in batch:
+            by_count[follower_count or 0].append(user_id)
+        popularity = Case(
+            *[When(user_id__in=ids, then=Value(count)) for count, ids in by_count.items()],
+            output_field=IntegerField(),
+        )
+        updated += UserSearchPrefix.objects.filter(user_id__in=[user_id for user_id, _ in batch]).update(popularity=popularity)
+
+
+def search_queryset(query):
+    # Index rows matching a query, ranked by ('-popularity', 'user_id')
+    query = normalize(query)
+    matches = UserSearchPrefix.objects.filter(prefix=query[:MAX_PREFIX_LENGTH])
+    if len(query) > MAX_PREFIX_LENGTH:
+        matches = matches.filter(user__username__icontains=query)
+    return matches
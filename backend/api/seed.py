@@ -0,0 +1,148 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from .models import Comment, Follower, Like, Notification, User, Video
+from .notifications import notification_content
+from .search import rebuild_index
+from .stats import rebuild_user_stats
+from .timeline import rebuild_timeline
+from .trending import refresh_trending
+
+SEED_PASSWORD = 'password'
+
+
+def _max_id(model):
+    return model.objects.aggregate(high=Max('id'))['high'] or 0
+
+
+def _insert(model, rows, batch_size):
+    # bulk_create does not return primary keys on MySQL, the new ids are read back instead
+    # (this assumes nothing else inserts into the table meanwhile)
+    after_id = _max_id(model)
+    model.objects.bulk_create(rows, batch_size=batch_size)
+    return list(model.objects.filter(id__gt=after_id).order_by('id').values_list('id', flat=True))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _popularity_sampler(rng, ids):
+    # Zipf-like choice: the i-th user is picked with weight 1 / (i + 1), so a few users get most
+    # of the follows and likes the way real accounts do
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(ids))))
+    return lambda k: rng.choices(ids, cum_weights=cum_weights, k=k)
+
+
+def mark_mutual_edges(batch_size=1000):
+    # Flag every edge whose reverse edge exists. The ids are selected first because MySQL cannot
+    # UPDATE a table filtered by a subquery on that same table.
+    reverse = Follower.objects.filter(follower_id=OuterRef('following_id'), following_id=OuterRef('follower_id'))
+    mutual_ids = list(Follower.objects.filter(Exists(reverse), is_mutual=False).values_list('id', flat=True))
+    for ids in _chunks(mutual_ids, batch_size):
+        Follower.objects.filter(id__in=ids).update(is_mutual=True)
+    return len(mutual_ids)
+
+
+def seed_dataset(users=50, follows_per_user=10, videos_per_user=3, likes_per_video=5, comments_per_video=3,
+                 prefix='seed', seed=0, batch_size=1000, timelines=True, log=None):
+    # Generate a deterministic synthetic dataset with bulk inserts, batch_size parent rows at a
+    # time so millions of rows fit in memory, then rebuild the derived state (counters, mutual
+    # flags, search index, trending scores and optionally timelines) the way the maintenance
+    # commands do. Per-row counts are drawn around the given means and notifications follow from
+    # the generated follows, likes and comments. Every user's password is SEED_PASSWORD.
+    # Returns the new ids and row counts.
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    counts = dict.fromkeys(['follows', 'likes', 'comments', 'notifications'], 0)
+
+    password = make_password(SEED_PASSWORD)
+    first_id = _max_id(User)
+    user_ids = []
+    for names in _chunks([f'{prefix}_{first_id + n}' for n in range(users)], batch_size):
+        user_ids += _insert(User, [User(username=name, email=f'{name}@example.com', password=password) for name in names], batch_size)
+    username_of = dict(zip(user_ids, (f'{prefix}_{first_id + n}' for n in range(users))))
+    log(f'{len(user_ids)} users')
+
+    def notification(recipient_id, actor_id, notification_type, video_id=None, actor_count=1):
+        counts['notifications'] += 1
+        return Notification(
+            user_id=recipient_id,
+            triggering_user_id=actor_id,
+            video_id=video_id,
+            notification_type=notification_type,
+            content=notification_content(username_of[actor_id], notification_type, actor_count),
+            actor_count=actor_count,
+            seen=rng.random() < 0.5,
+        )
+
+    popular = _popularity_sampler(rng, user_ids)
+    for followers in _chunks(user_ids, batch_size):
+        edges, notifications = [], []
+        for follower_id in followers:
+            for following_id in set(popular(rng.randint(0, 2 * follows_per_user))) - {follower_id}:
+                edges.append(Follower(follower_id=follower_id, following_id=following_id))
+                notifications.append(notification(following_id, follower_id, 'follow'))
+        with transaction.atomic():
+            Follower.objects.bulk_create(edges, batch_size=batch_size)
+            Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        counts['follows'] += len(edges)
+    log(f"{counts['follows']} follows")
+
+    video_ids = []
+    for owners in _chunks(user_ids, batch_size):
+        # Engagement is decided up front so the video counters are inserted already consistent
+        plans = []
+        for owner_id in owners:
+            for _ in range(rng.randint(0, 2 * videos_per_user)):
+                likers = set(popular(rng.randint(0, 2 * likes_per_video)))
+                commenters = [rng.choice(user_ids) for _ in range(rng.randint(0, 2 * comments_per_video))]
+                plans.append((owner_id, sorted(likers), commenters))
+        videos = [
+            Video(
+                user_id=owner_id,
+                title=f'Video {len(video_ids) + n} by {username_of[owner_id]}',
+                video_file=f'videos/{prefix}-{first_id}-{len(video_ids) + n}.mp4',
+                status='ready',
+                view_count=rng.randint(0, 20 * (len(likers) + 1)),
+                likes_count=len(likers),
+                comment_count=len(commenters),
+            )
+            for n, (owner_id, likers, commenters) in enumerate(plans)
+        ]
+        with transaction.atomic():
+            ids = _insert(Video, videos, batch_size)
+            likes, comments, notifications = [], [], []
+            for video_id, (owner_id, likers, commenters) in zip(ids, plans):
+                likes += [Like(user_id=liker_id, video_id=video_id) for liker_id in likers]
+                comments += [
+                    Comment(user_id=commenter_id, video_id=video_id, text=f'Comment {n} from {username_of[commenter_id]}')
+                    for n, commenter_id in enumerate(commenters)
+                ]
+                # Likes are aggregated into one notification per video, like the outbox does
+                if likers:
+                    notifications.append(notification(owner_id, likers[-1], 'like', video_id, actor_count=len(likers)))
+                notifications += [notification(owner_id, commenter_id, 'comment', video_id) for commenter_id in commenters]
+            Like.objects.bulk_create(likes, batch_size=batch_size)
+            Comment.objects.bulk_create(comments, batch_size=batch_size)
+            Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        video_ids += ids
+        counts['likes'] += len(likes)
+        counts['comments'] += len(comments)
+    log(f"{len(video_ids)} videos, {counts['likes']} likes, {counts['comments']} comments, {counts['notifications']} notifications")
+
+    rebuild_user_stats(user_ids, batch_size=batch_size)
+    mark_mutual_edges(batch_size=batch_size)
+    rebuild_index(batch_size=batch_size)
+    refresh_trending()
+    log('Rebuilt counters, mutual flags, search index and trending scores')
+    if timelines:
+        for user_id in user_ids:
+            rebuild_timeline(user_id)
+        log('Rebuilt timelines')
+
+    return dict(counts, user_ids=user_ids, video_ids=video_ids)
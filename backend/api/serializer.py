@@ -1,29 +1,48 @@
 from rest_framework import serializers
-from .models import User,Video,Like,Comment,Favorite,Follower,Notification
+from django.conf import settings
+from .models import User,Video,Like,Comment,Favorite,Follower,Notification,UserStats,UploadSession
+from .stats import get_user_stats
+from .search import index_user
+from .images import avatar_key
 from django.contrib.auth.hashers import make_password
 
+def avatar_url(user, size):
+    # URL of the profile picture variant fitting a size x size avatar, see images.avatar_key
+    key = avatar_key(user, size) if user else None
+    if key:
+        return f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{key}"
+    return ''
+
 class UserSerializer(serializers.ModelSerializer):
     follower_count = serializers.SerializerMethodField()
     following_count = serializers.SerializerMethodField()
     video_count = serializers.SerializerMethodField()
     heart_count = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
+        # Query plan, see query_plan.plan_queryset
+        select_related = ['stats']
+        prefetch_related = ['groups', 'user_permissions']
 
+    # Counters come from the denormalized UserStats row, list views select_related('stats')
     def get_follower_count(self, obj):
-        return Follower.objects.filter(following=obj).count()
+        return get_user_stats(obj).follower_count
 
     def get_following_count(self, obj):
-        return Follower.objects.filter(follower=obj).count()
+        return get_user_stats(obj).following_count
 
     def get_video_count(self, obj):
-        return Video.objects.filter(user=obj).count()
+        return get_user_stats(obj).video_count
 
     def get_heart_count(self, obj):
-        return Like.objects.filter(user=obj).count()
+        return get_user_stats(obj).heart_count
+
+    def get_profile_picture_variants(self, obj):
+        return {size: f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{key}" for size, key in (obj.profile_picture_variants or {}).items()}
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,13 +65,33 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         password = validated_data['password']
         user.set_password(password)
         user.save()
+        UserStats.objects.create(user=user)
+        index_user(user)
         return user
 
 class VideoSerializer(serializers.ModelSerializer):
+    # Only present when the view put a precomputed 'viewer_state' map in the context
+    viewer_state = serializers.SerializerMethodField()
+    # HLS master playlist once transcoded, the original upload otherwise
+    stream_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Video
-        fields = '__all__'
-        read_only_fields = ['id', 'user', 'created_at']
+        exclude = ['trending_score', 'trending_engagement', 'processing_started_at']
+        read_only_fields = ['id', 'user', 'created_at', 'status', 'duration', 'hls_playlist', 'renditions']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'viewer_state' not in self.context:
+            self.fields.pop('viewer_state')
+
+    def get_viewer_state(self, obj):
+        return self.context['viewer_state'].get(obj.id)
+
+    def get_stream_url(self, obj):
+        if obj.hls_playlist:
+            return obj.video_file.storage.url(obj.hls_playlist)
+        return obj.video_file.url if obj.video_file else None
 
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,14 +105,15 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = '__all__'
+        select_related = ['user']
+        only = ['id', 'user', 'video', 'text', 'created_at', 'user__profile_picture', 'user__profile_picture_variants', 'user__username']
 
     def get_username(self, obj):
         return obj.user.username  # Assuming 'user' is a foreign key in Comment model to the User
 
     def get_profile_picture(self, obj):
-        if obj.user and obj.user.profile_picture:
-            return f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{obj.user.profile_picture}"
-        return ''  # Return default profile picture URL if needed
+        # Small avatar next to each comment, views can ask for another size with 'avatar_size'
+        return avatar_url(obj.user, self.context.get('avatar_size', 128))
 
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -98,11 +138,14 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'content', 'video', 'notification_type', 'created_at', 'profile_picture', 'seen']
+        select_related = ['triggering_user']
+        only = [
+            'id', 'content', 'video', 'notification_type', 'created_at', 'seen',
+            'triggering_user', 'triggering_user__profile_picture', 'triggering_user__profile_picture_variants',
+        ]
 
     def get_profile_picture(self, obj):
-        if obj.triggering_user and obj.triggering_user.profile_picture:
-            return f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{obj.triggering_user.profile_picture}"
-        return ''  # or a default image URL
+        return avatar_url(obj.triggering_user, self.context.get('avatar_size', 128))
 
 from rest_framework import serializers
 from .models import User
@@ -125,4 +168,44 @@ class UsernameUpdateSerializer(serializers.ModelSerializer):
     def validate_username(self, value):
         if User.objects.filter(username=value).exists():
             raise serializers.ValidationError("This username is already taken.")
-        return value
\ No newline at end of file
+        return value
+
+class ViewEventSerializer(serializers.Serializer):
+    # Accepts a single view ({"video_id": 1}) or a batch ({"video_ids": [1, 2, 2]})
+    video_id = serializers.IntegerField(required=False, min_value=1)
+    video_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=settings.VIEW_EVENTS_MAX_BATCH)
+
+    def validate(self, data):
+        video_ids = list(data.get('video_ids', []))
+        if 'video_id' in data:
+            video_ids.append(data['video_id'])
+        if not video_ids:
+            raise serializers.ValidationError("Provide video_id or video_ids.")
+        data['video_ids'] = video_ids
+        return data
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1, max_value=settings.VIDEO_UPLOAD_MAX_SIZE)
+    content_type = serializers.CharField(max_length=100, default='video/mp4')
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    thumbnail_filename = serializers.CharField(max_length=255, required=False)
+
+class UploadPartsSerializer(serializers.Serializer):
+    part_numbers = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=settings.VIDEO_UPLOAD_PRESIGN_BATCH,
+    )
+
+    def validate_part_numbers(self, value):
+        part_count = self.context['session'].part_count
+        if any(number > part_count for number in value):
+            raise serializers.ValidationError(f"This upload has {part_count} parts.")
+        return value
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    part_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'key', 'title', 'size', 'part_size', 'part_count', 'status', 'video', 'created_at']
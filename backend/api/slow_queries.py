@@ -0,0 +1,240 @@
+import atexit
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .metrics import route_name
+
+logger = logging.getLogger(__name__)
+
+# The request being handled, set by SlowQueryMiddleware
+_current_request = contextvars.ContextVar('slow_query_request', default=None)
+# True while the recorder runs its own queries, so they are never recorded
+_recording = contextvars.ContextVar('slow_query_recording', default=False)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Instrumentation frames are never the call site
+_SKIPPED_FILES = {os.path.abspath(__file__), os.path.join(_APP_DIR, 'metrics.py')}
+
+
+def normalize_sql(sql):
+    # The shape of a statement: literals become ?, IN lists of any length become (...)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()
+
+
+def call_site():
+    # The innermost frames of this app that led to the query: the first serializer method met
+    # (a lazy relation read while serializing) and the innermost app frame overall
+    innermost = serializer = None
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if not path.startswith(_APP_DIR) or path in _SKIPPED_FILES:
+            continue
+        location = f'{os.path.relpath(path, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}'
+        innermost = innermost or location
+        if os.path.basename(path) == 'serializer.py':
+            serializer = location
+            break
+    if serializer and serializer != innermost:
+        return f'{serializer} (via {innermost})'
+    return innermost or ''
+
+
+class SlowQueryRecorder:
+    # Execute wrapper installed on every database connection (see ApiConfig.ready). Statements
+    # slower than SLOW_QUERY_THRESHOLD_MS are aggregated in memory by fingerprint and written to
+    # SlowQuery by flush(): from a background thread woken by flush_later() at the end of each
+    # request, and at exit for management commands. The EXPLAIN runs once per fingerprint, when
+    # its row is created. Parameter values are only kept in memory for the EXPLAIN, they are
+    # never stored.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._atexit_registered = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is None or _recording.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            if elapsed >= threshold:
+                self.record(context['connection'].alias, sql, params, many, elapsed)
+
+    def record(self, alias, sql, params, many, elapsed):
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {'normalized': normalized, 'count': 0, 'total': 0.0, 'max': 0.0}
+            request = _current_request.get()
+            view = route_name(request) if request is not None else ''
+            entry.update(alias=alias, sql=sql, params=None if many else params, view=view, call_site=call_site())
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+
+    def pending(self):
+        return bool(self._pending)
+
+    def flush_later(self):
+        # Hand the pending aggregates to the flusher thread, the response does not wait for the
+        # writes and EXPLAINs
+        if not self._pending:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slow-query-flusher', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        # Write the pending aggregates. Returns the number of query shapes written.
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        token = _recording.set(True)
+        try:
+            for key, entry in pending.items():
+                try:
+                    self._write(key, entry)
+                except DatabaseError:
+                    logger.exception('Could not record slow query %s', key)
+        finally:
+            _recording.reset(token)
+        return len(pending)
+
+    def _write(self, key, entry):
+        from .models import SlowQuery
+
+        example = _example(entry)
+        latest = {'example_sql': example, 'view': entry['view'], 'call_site': entry['call_site'][:500]}
+        updates = dict(
+            latest,
+            count=F('count') + entry['count'],
+            total_time=F('total_time') + entry['total'],
+            max_time=Greatest(F('max_time'), entry['max']),
+        )
+        if SlowQuery.objects.filter(fingerprint=key).update(**updates):
+            return
+        try:
+            SlowQuery.objects.create(
+                fingerprint=key,
+                normalized_sql=entry['normalized'],
+                explain=explain(entry['alias'], entry['sql'], entry['params']),
+                count=entry['count'],
+                total_time=entry['total'],
+                max_time=entry['max'],
+                **latest,
+            )
+        except IntegrityError:
+            # Another process created the row in the meantime
+            SlowQuery.objects.filter(fingerprint=key).update(**updates)
+
+
+def _example(entry):
+    # The statement as sent, with its placeholders: parameter values and inlined strings (user
+    # input, password hashes, tokens) are left out
+    return _WHITESPACE.sub(' ', _STRING.sub('?', entry['sql'])).strip()
+
+
+def explain(alias, sql, params):
+    # The plan of a SELECT, run with the captured parameters on the connection it ran on
+    if params is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+    return '\n'.join('\t'.join('' if value is None else str(value) for value in row) for row in rows)
+
+
+recorder = SlowQueryRecorder()
+
+
+def install_recorder(sender, connection, **kwargs):
+    # connection_created receiver: wrap every new connection's queries
+    if recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(recorder)
+
+
+class SlowQueryMiddleware:
+    # Tags recorded queries with the URL name of the view and has them written once the response
+    # is ready
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+            if settings.SLOW_QUERY_FLUSH_INLINE:
+                recorder.flush()
+            else:
+                recorder.flush_later()
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+            if not settings.SLOW_QUERY_FLUSH_INLINE:
+                recorder.flush_later()
+            elif recorder.pending():
+                await sync_to_async(recorder.flush)()
@@ -0,0 +1,72 @@
+from django.db import connection
+from django.db.models import Count, F
+from .models import User, UserStats, Follower, Video, Like, Notification
+
+STAT_FIELDS = ['follower_count', 'following_count', 'video_count', 'heart_count', 'unread_notifications']
+
+
+def bump_user_stats(user_id, **deltas):
+    # Apply counter deltas with a single UPDATE, e.g. bump_user_stats(1, follower_count=1)
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    if not UserStats.objects.filter(user_id=user_id).update(**updates):
+        # No stats row yet (user created outside the signup flow), build it from the base tables
+        rebuild_user_stats([user_id])
+
+
+def get_user_stats(user):
+    # Reads the select_related('stats') cache when present, otherwise costs one query
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        rebuild_user_stats([user.pk])
+        user.stats = UserStats.objects.get(user_id=user.pk)
+        return user.stats
+
+
+def _count_by(queryset, field, user_ids):
+    rows = queryset.filter(**{f'{field}__in': user_ids}).values(field).annotate(n=Count('id'))
+    return {row[field]: row['n'] for row in rows}
+
+
+def rebuild_user_stats(user_ids=None, batch_size=1000):
+    # Recompute the counters from the base tables, batch_size users at a time.
+    # Returns the number of users processed.
+    if user_ids is None:
+        user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+
+    processed = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            processed += _rebuild_batch(batch)
+            batch = []
+    if batch:
+        processed += _rebuild_batch(batch)
+    return processed
+
+
+def _rebuild_batch(user_ids):
+    followers = _count_by(Follower.objects.all(), 'following_id', user_ids)
+    following = _count_by(Follower.objects.all(), 'follower_id', user_ids)
+    videos = _count_by(Video.objects.all(), 'user_id', user_ids)
+    hearts = _count_by(Like.objects.all(), 'user_id', user_ids)
+    unread = _count_by(Notification.objects.filter(seen=False), 'user_id', user_ids)
+
+    rows = [
+        UserStats(
+            user_id=user_id,
+            follower_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+            video_count=videos.get(user_id, 0),
+            heart_count=hearts.get(user_id, 0),
+            unread_notifications=unread.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    # MySQL upserts on any unique key (ON DUPLICATE KEY UPDATE) and rejects an explicit target
+    unique_fields = ['user'] if connection.features.supports_update_conflicts_with_target else None
+    UserStats.objects.bulk_create(rows, update_conflicts=True, unique_fields=unique_fields, update_fields=STAT_FIELDS)
+    return len(rows)
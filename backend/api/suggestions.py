@@ -0,0 +1,133 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from .models import Follower, UserStats
+
+CACHE_KEY = 'suggestions:{}'
+
+
+class FollowGraph:
+    # The follow graph as CSR integer arrays: users are renumbered densely (ids is sorted, so the
+    # dense index of a user id is a bisect away) and the neighbours of node n are
+    # targets[offsets[n]:offsets[n + 1]], once for outgoing edges (who n follows) and once for
+    # incoming ones (who follows n). A million edges take a few megabytes.
+
+    def __init__(self, ids, out_offsets, out_targets, in_offsets, in_targets):
+        self.ids = ids
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        edges = Follower.objects.order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+        sources, destinations = array('q'), array('q')
+        for follower_id, following_id in edges.iterator(chunk_size=chunk_size):
+            sources.append(follower_id)
+            destinations.append(following_id)
+
+        ids = array('q', sorted(set(sources) | set(destinations)))
+        sources = array('l', (bisect_left(ids, user_id) for user_id in sources))
+        destinations = array('l', (bisect_left(ids, user_id) for user_id in destinations))
+        out_offsets, out_targets = cls._csr(len(ids), sources, destinations)
+        in_offsets, in_targets = cls._csr(len(ids), destinations, sources)
+        return cls(ids, out_offsets, out_targets, in_offsets, in_targets)
+
+    @staticmethod
+    def _csr(size, sources, destinations):
+        # Counting sort of the edges by source node
+        offsets = array('l', bytes(array('l').itemsize * (size + 1)))
+        for node in sources:
+            offsets[node + 1] += 1
+        for node in range(size):
+            offsets[node + 1] += offsets[node]
+        targets = array('l', bytes(array('l').itemsize * len(sources)))
+        cursor = array('l', offsets[:size])
+        for node, target in zip(sources, destinations):
+            targets[cursor[node]] = target
+            cursor[node] += 1
+        return offsets, targets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def following(self, node):
+        return self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]]
+
+    def followers(self, node):
+        return self.in_targets[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+
+def score_candidates(graph, node, max_degree):
+    # Candidates for one user: accounts followed by the people they follow (friends of friends),
+    # accounts followed by their own followers (co-follows) and followers they have not followed
+    # back. Hubs with more than max_degree edges are only walked up to max_degree neighbours so a
+    # celebrity in the graph does not make every user's batch quadratic.
+    following = set(graph.following(node))
+    followers = graph.followers(node)
+    scores = defaultdict(float)
+    for friend in following:
+        for candidate in graph.following(friend)[:max_degree]:
+            scores[candidate] += 1.0
+    for follower in followers[:max_degree]:
+        for candidate in graph.following(follower)[:max_degree]:
+            scores[candidate] += 0.5
+    for follower in followers:
+        scores[follower] += 3.0
+    scores.pop(node, None)
+    for followed in following:
+        scores.pop(followed, None)
+    return scores
+
+
+def compute_suggestions(graph, top_k=None, max_degree=None):
+    # Yields (user_id, [suggested user ids, best first]) for every user in the graph
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    max_degree = max_degree or settings.SUGGESTIONS_MAX_DEGREE
+    for node in range(len(graph)):
+        scores = score_candidates(graph, node, max_degree)
+        if not scores:
+            continue
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        yield graph.ids[node], [graph.ids[candidate] for candidate, _ in best]
+
+
+def refresh_suggestions(batch_size=1000):
+    # Rebuild the cached top-K of every user from a fresh load of the follow graph.
+    # Returns the number of users with suggestions.
+    graph = FollowGraph.load()
+    timeout = settings.SUGGESTIONS_CACHE_TIMEOUT
+    refreshed = 0
+    batch = {}
+    for user_id, suggested in compute_suggestions(graph):
+        batch[CACHE_KEY.format(user_id)] = suggested
+        if len(batch) >= batch_size:
+            cache.set_many(batch, timeout)
+            refreshed += len(batch)
+            batch = {}
+    cache.set_many(batch, timeout)
+    return refreshed + len(batch)
+
+
+def suggested_user_ids(user, limit=10):
+    # Cached suggestions minus the accounts followed since the last refresh, topped up with the
+    # most followed users for new accounts and users without enough candidates
+    candidates = cache.get(CACHE_KEY.format(user.pk)) or []
+    followed = set(
+        Follower.objects.filter(follower=user, following_id__in=candidates).values_list('following_id', flat=True)
+    )
+    suggested = [user_id for user_id in candidates if user_id not in followed][:limit]
+    if len(suggested) < limit:
+        popular = (
+            UserStats.objects.exclude(user_id__in=[user.pk, *suggested])
+            .exclude(user__followers__follower=user)
+            .order_by('-follower_count', 'user_id')
+            .values_list('user_id', flat=True)
+        )
+        suggested.extend(popular[:limit - len(suggested)])
+    return suggested
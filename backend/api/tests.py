@@ -1,3 +1,1288 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf, skipUnless
+
+from asgiref.sync import sync_to_async
+from botocore.stub import ANY, Stubber
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections, reset_queries
+from django.db.models import Count, F, Q
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import realtime, urls
+from .async_views import DatabaseThreadPool
+from .checks import replica_pin_check, shared_cache_check
+from .models import User, Video, Like, Comment, Follower, Notification, SlowQuery, TimelineEntry, UploadSession, UserSearchPrefix, UserStats
+from .images import store_avatar_variants
+from .loadtest import ASGITransport, Results, run_load
+from .metrics import registry
+from .payload_cache import collection_version, invalidate_collections, shared_cache, user_cache, video_cache
+from .seed import SEED_PASSWORD, seed_dataset
+from .realtime import get_broker, notification_socket, parse_stream_cursor, publish_notifications, stream_cursor
+from .search import rebuild_index, refresh_popularity, username_prefixes
+from .slow_queries import normalize_sql, recorder
+from .stats import rebuild_user_stats
+from .suggestions import FollowGraph, compute_suggestions, refresh_suggestions, suggested_user_ids
+from .timeline import fan_out_video
+from .trending import LAST_REFRESH_CACHE_KEY, decay_factor, refresh_trending
+from .transcoding import TranscodeError, ladder_for, probe, process_pending, worker_pool as transcode_pool
+from .uploads import s3_client
+from .view_buffer import ViewCountBuffer, view_buffer
+from .views import VideoLikeStatusView
 
 # Create your tests here.
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@override_settings(NOTIFICATION_OUTBOX_MODE='external')
+# SQLite locks the whole database (or table) per writer, so the racing toggles fail with
+# "database is locked" instead of exercising the row locks: these need MySQL
+@skipIf(connection.vendor == 'sqlite', 'needs row-level locking (MySQL)')
+class ToggleConcurrencyTests(TransactionTestCase):
+    # Hammers the toggle endpoints from parallel threads (two per user, so the same pair races
+    # against itself) and checks that the denormalized counters still match the rows
+    threads_per_user = 2
+    toggles_per_thread = 15
+
+    def run_in_parallel(self, users, path):
+        barrier = threading.Barrier(len(users) * self.threads_per_user)
+        errors = []
+
+        def worker(user):
+            try:
+                client = client_for(user)
+                barrier.wait()
+                for _ in range(self.toggles_per_thread):
+                    response = client.post(path)
+                    if response.status_code not in (201, 204):
+                        errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users for _ in range(self.threads_per_user)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_like_counters_match_rows(self):
+        owner = User.objects.create(username='owner')
+        video = Video.objects.create(user=owner, title='video', video_file='videos/video.mp4')
+        users = [User.objects.create(username=f'liker{i}') for i in range(4)]
+
+        self.run_in_parallel(users, f'/api/like/{video.id}/')
+
+        video.refresh_from_db()
+        self.assertEqual(video.likes_count, Like.objects.filter(video=video).count())
+        for user in users:
+            self.assertLessEqual(Like.objects.filter(user=user, video=video).count(), 1)
+            self.assertEqual(UserStats.objects.get(user=user).heart_count, Like.objects.filter(user=user).count())
+
+    def test_follow_counters_match_rows(self):
+        star = User.objects.create(username='star')
+        users = [User.objects.create(username=f'fan{i}') for i in range(4)]
+
+        self.run_in_parallel(users, f'/api/follow/{star.id}/')
+
+        self.assertEqual(UserStats.objects.get(user=star).follower_count, Follower.objects.filter(following=star).count())
+        for user in users:
+            self.assertLessEqual(Follower.objects.filter(follower=user, following=star).count(), 1)
+            self.assertEqual(UserStats.objects.get(user=user).following_count, Follower.objects.filter(follower=user).count())
+
+
+class ToggleTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.user = User.objects.create(username='viewer')
+        self.video = Video.objects.create(user=self.owner, title='video', video_file='videos/video.mp4')
+        self.client = client_for(self.user)
+
+    def test_like_toggle_round_trip(self):
+        self.assertEqual(self.client.post(f'/api/like/{self.video.id}/').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/like/{self.video.id}/').status_code, 204)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.likes_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_unknown_targets_are_404(self):
+        self.assertEqual(self.client.post('/api/like/999999/').status_code, 404)
+        self.assertEqual(self.client.post('/api/favorite/999999/').status_code, 404)
+        self.assertEqual(self.client.post('/api/follow/999999/').status_code, 404)
+
+    def test_follow_back_marks_both_edges_mutual(self):
+        self.assertEqual(self.client.post(f'/api/follow/{self.owner.id}/').status_code, 201)
+        self.assertEqual(client_for(self.owner).post(f'/api/follow/{self.user.id}/').status_code, 201)
+        self.assertEqual(Follower.objects.filter(is_mutual=True).count(), 2)
+        self.assertEqual([user['id'] for user in self.client.get('/api/users/friends/').json()['results']], [self.owner.id])
+
+        self.assertEqual(self.client.post(f'/api/follow/{self.owner.id}/').status_code, 204)
+        self.assertFalse(Follower.objects.filter(is_mutual=True).exists())
+        self.assertEqual(self.client.get('/api/users/friends/').json()['results'], [])
+
+    def test_self_follow_is_rejected(self):
+        self.assertEqual(self.client.post(f'/api/follow/{self.user.id}/').status_code, 400)
+        self.assertFalse(Follower.objects.exists())
+        self.assertEqual(self.client.get('/api/users/friends/').json()['results'], [])
+
+    def test_follow_builds_missing_stats_rows(self):
+        Follower.objects.create(follower=self.owner, following=self.user)
+        UserStats.objects.all().delete()
+
+        self.assertEqual(self.client.post(f'/api/follow/{self.owner.id}/').status_code, 201)
+        stats = {row.user_id: row for row in UserStats.objects.all()}
+        self.assertEqual((stats[self.user.id].follower_count, stats[self.user.id].following_count), (1, 1))
+        self.assertEqual((stats[self.owner.id].follower_count, stats[self.owner.id].following_count), (1, 1))
+
+
+
+@override_settings(NOTIFICATION_OUTBOX_MODE='external', TIMELINE_FANOUT_MAX_FOLLOWERS=3, TIMELINE_MAX_LENGTH=2, TIMELINE_FANOUT_BATCH_SIZE=2)
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create(username='creator')
+        self.readers = [User.objects.create(username=f'reader{n}') for n in range(2)]
+        for reader in self.readers:
+            Follower.objects.create(follower=reader, following=self.creator)
+        rebuild_user_stats([self.creator.id, *(reader.id for reader in self.readers)])
+
+    def upload(self, user, title, minutes_ago):
+        video = Video.objects.create(user=user, title=title, video_file=f'videos/{title}.mp4', status='ready')
+        Video.objects.filter(pk=video.pk).update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+        video.refresh_from_db()
+        return video
+
+    def timeline(self, user):
+        return list(TimelineEntry.objects.filter(user=user).order_by('-created_at').values_list('video__title', flat=True))
+
+    def feed(self, user):
+        return [video['title'] for video in client_for(user).get('/api/videos/following/').data['results']]
+
+    def test_fan_out_trims_timelines_to_the_newest_entries(self):
+        for minutes_ago, title in [(3, 'first'), (2, 'second'), (1, 'third')]:
+            self.assertEqual(fan_out_video(self.upload(self.creator, title, minutes_ago)), 2)
+        for reader in self.readers:
+            self.assertEqual(self.timeline(reader), ['third', 'second'])
+
+    def test_unfollow_removes_the_creators_entries(self):
+        fan_out_video(self.upload(self.creator, 'clip', 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(self.readers[0]).post(f'/api/follow/{self.creator.id}/')
+        self.assertEqual(self.timeline(self.readers[0]), [])
+        self.assertEqual(self.timeline(self.readers[1]), ['clip'])
+
+    def test_feed_merges_pulled_creators_by_date(self):
+        star = User.objects.create(username='star')
+        for n in range(3):
+            Follower.objects.create(follower=User.objects.create(username=f'fan{n}'), following=star)
+        Follower.objects.create(follower=self.readers[0], following=star)
+        rebuild_user_stats([star.id])
+
+        fan_out_video(self.upload(self.creator, 'pushed-old', 3))
+        self.assertEqual(fan_out_video(self.upload(star, 'pulled', 2)), 0)
+        fan_out_video(self.upload(self.creator, 'pushed-new', 1))
+        self.assertEqual(self.feed(self.readers[0]), ['pushed-new', 'pulled', 'pushed-old'])
+        self.assertEqual(self.feed(self.readers[1]), ['pushed-new', 'pushed-old'])
+
+
+@override_settings(TRANSCODE_LADDER=[
+    {'height': 360, 'video_bitrate': 800_000, 'audio_bitrate': 96_000},
+    {'height': 720, 'video_bitrate': 2_800_000, 'audio_bitrate': 128_000},
+])
+class TranscodeProbeTests(TestCase):
+    def probe(self, stream, streams=()):
+        stream = dict({'codec_type': 'video', 'width': 1920, 'height': 1080}, **stream)
+        output = json.dumps({'streams': [stream, *streams], 'format': {'duration': '12.5'}})
+        with mock.patch('api.transcoding._run', return_value=mock.Mock(stdout=output)):
+            return probe('video.mp4')
+
+    def test_rotation_swaps_the_frame_size(self):
+        self.assertEqual(self.probe({})['width'], 1920)
+        self.assertEqual(self.probe({'tags': {'rotate': '90'}})['width'], 1080)
+        display_matrix = {'side_data_type': 'Display Matrix', 'displaymatrix': '...', 'rotation': -90}
+        info = self.probe({'side_data_list': [display_matrix]})
+        self.assertEqual((info['width'], info['height']), (1080, 1920))
+        self.assertEqual(self.probe({'side_data_list': [dict(display_matrix, rotation=180)]})['width'], 1920)
+
+    def test_duration_and_audio(self):
+        self.assertEqual((self.probe({})['duration'], self.probe({})['has_audio']), (12.5, False))
+        self.assertTrue(self.probe({}, [{'codec_type': 'audio'}])['has_audio'])
+        with self.assertRaises(TranscodeError):
+            with mock.patch('api.transcoding._run', return_value=mock.Mock(stdout='{"streams": []}')):
+                probe('audio.mp3')
+
+    def test_ladder_never_upscales(self):
+        self.assertEqual([(rung['width'], rung['height']) for rung in ladder_for(1920, 1080)], [(640, 360), (1280, 720)])
+        # Portrait videos scale on their short side too
+        self.assertEqual([(rung['width'], rung['height']) for rung in ladder_for(1080, 1920)], [(360, 640), (720, 1280)])
+        # Below the lowest rung the source size is kept, at even dimensions
+        self.assertEqual([(rung['width'], rung['height'], rung['video_bitrate']) for rung in ladder_for(321, 241)], [(320, 240, 800_000)])
+
+
+@override_settings(TRANSCODE_MODE='external', TRANSCODE_CLAIM_TIMEOUT=3600)
+class TranscodeQueueTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.client = client_for(self.owner)
+
+    def video(self, title, **fields):
+        return Video.objects.create(user=self.owner, title=title, video_file=f'videos/{title}.mp4', **fields)
+
+    def test_unready_videos_are_only_visible_to_their_owner(self):
+        video = self.video('pending')
+        self.assertEqual(self.client.get(f'/api/videos/{video.id}/').status_code, 200)
+        self.assertEqual(client_for(User.objects.create(username='viewer')).get(f'/api/videos/{video.id}/').status_code, 404)
+
+    def test_stalled_claims_are_requeued(self):
+        now = timezone.now()
+        stalled = self.video('stalled', status='processing', processing_started_at=now - timedelta(hours=2))
+        running = self.video('running', status='processing', processing_started_at=now - timedelta(minutes=5))
+        result = {'duration': 1.0, 'hls_playlist': 'hls/master.m3u8', 'renditions': [], 'poster': 'hls/poster.jpg'}
+
+        with mock.patch('api.transcoding.transcode', return_value=result) as transcode:
+            self.assertEqual(process_pending(), 1)
+        self.assertEqual(transcode.call_args.args[0].id, stalled.id)
+        self.assertEqual(Video.objects.get(pk=stalled.pk).status, 'ready')
+        self.assertEqual(Video.objects.get(pk=running.pk).status, 'processing')
+
+
+@override_settings(
+    AVATAR_VARIANT_MODE='sync',
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class AvatarVariantTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='avatar')
+        self.storage = User._meta.get_field('profile_picture').storage
+
+    def upload(self):
+        # Rendered from the uploaded bytes, never read back from storage
+        with mock.patch('django.core.files.storage.InMemoryStorage.open', side_effect=AssertionError('read back from storage')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client_for(self.user).patch('/api/profile-picture/', {'profile_picture': png_upload()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        return self.user.profile_picture_variants
+
+    def test_variants_are_rendered_after_the_upload(self):
+        variants = self.upload()
+        # No upscaling past the 400px short side of the upload
+        self.assertEqual(sorted(variants, key=int), ['64', '128', '256'])
+        with self.storage.open(variants['64']) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+
+    def test_replacing_the_picture_deletes_the_old_variants(self):
+        old = self.upload()
+        new = self.upload()
+        self.assertTrue(all(self.storage.exists(key) for key in new.values()))
+        self.assertFalse(any(self.storage.exists(key) for key in old.values()))
+
+    def test_variants_of_a_replaced_picture_are_discarded(self):
+        current = self.upload()
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100), 'red').save(buffer, 'PNG')
+        self.assertIsNone(store_avatar_variants(self.user.id, 'profile_pictures/replaced.png', buffer.getvalue()))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_variants, current)
+        self.assertFalse(self.storage.exists('profile_pictures/variants/replaced_64.webp'))
+
+
+class ViewBufferTests(TestCase):
+    def setUp(self):
+        shared_cache().clear()
+        owner = User.objects.create(username='owner')
+        self.videos = [Video.objects.create(user=owner, title=f'video{n}', video_file=f'videos/{n}.mp4') for n in range(2)]
+        self.buffer = ViewCountBuffer(flush_interval=60, flush_threshold=3, max_staleness=60)
+        self.buffer._ensure_flusher = lambda: None
+
+    def view_counts(self):
+        return list(Video.objects.filter(pk__in=[video.pk for video in self.videos]).order_by('pk').values_list('view_count', flat=True))
+
+    def test_views_are_applied_in_bulk_at_the_threshold(self):
+        first, second = self.videos
+        self.buffer.add([first.id, second.id])
+        self.assertEqual((self.view_counts(), self.buffer.stats()['pending_events']), ([0, 0], 2))
+        with self.assertNumQueries(1):
+            self.buffer.add([first.id])
+        self.assertEqual(self.view_counts(), [2, 1])
+        self.assertEqual(self.buffer.stats()['flushed_events'], 3)
+
+    def test_payloads_pick_up_counts_after_max_staleness(self):
+        version = collection_version('videos')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.add([video.id for video in self.videos] * 2)
+        self.assertEqual(collection_version('videos'), version)
+
+        self.buffer.max_staleness = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.flush()
+        self.assertNotEqual(collection_version('videos'), version)
+        self.assertEqual(self.buffer._stale, set())
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create(username='viewer')
+        self.users = {name: User.objects.create(username=name) for name in ['john_doe', 'Johanna', 'doe.jane', 'jo']}
+        rebuild_index()
+
+    def search(self, query):
+        response = client_for(self.viewer).get('/api/users/search/', {'search': query})
+        return [user['username'] for user in response.data['results']]
+
+    def test_prefixes_cover_the_username_and_its_words(self):
+        self.assertEqual(username_prefixes('john_doe'), {'j', 'jo', 'joh', 'john', 'john_', 'john_d', 'john_do', 'john_doe', 'd', 'do', 'doe'})
+
+    def test_search_matches_word_prefixes_case_insensitively(self):
+        self.assertCountEqual(self.search('JO'), ['john_doe', 'Johanna', 'jo'])
+        self.assertCountEqual(self.search('doe'), ['john_doe', 'doe.jane'])
+        self.assertEqual(self.search('jan'), ['doe.jane'])
+        self.assertEqual(self.search('xyz'), [])
+
+    def test_refreshed_popularity_ranks_the_matches(self):
+        for n in range(2):
+            Follower.objects.create(follower=User.objects.create(username=f'fan{n}'), following=self.users['jo'])
+        Follower.objects.create(follower=self.viewer, following=self.users['Johanna'])
+        rebuild_user_stats([user.id for user in self.users.values()])
+        self.assertEqual(refresh_popularity(batch_size=2), UserSearchPrefix.objects.count())
+        self.assertEqual(self.search('jo'), ['jo', 'Johanna', 'john_doe'])
+
+
+@override_settings(
+    TRENDING_VIEW_WEIGHT=1.0, TRENDING_LIKE_WEIGHT=2.0, TRENDING_COMMENT_WEIGHT=3.0,
+    TRENDING_HALF_LIFE_HOURS=1, TRENDING_WINDOW_DAYS=14,
+)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        owner = User.objects.create(username='owner')
+        self.video = Video.objects.create(user=owner, title='fresh', video_file='videos/fresh.mp4', view_count=4, likes_count=3)
+        self.old = Video.objects.create(user=owner, title='old', video_file='videos/old.mp4', likes_count=50)
+        Video.objects.filter(pk=self.old.pk).update(created_at=self.now - timedelta(days=15), trending_score=7)
+
+    def scores(self, video):
+        video.refresh_from_db()
+        return video.trending_score, video.trending_engagement
+
+    def test_decay_halves_the_score_every_half_life(self):
+        self.assertEqual(decay_factor(0), 1)
+        self.assertEqual(decay_factor(-60), 1)
+        self.assertAlmostEqual(decay_factor(3600), 0.5)
+        self.assertAlmostEqual(decay_factor(3 * 3600), 0.125)
+
+    def test_score_decays_and_adds_the_engagement_since_the_snapshot(self):
+        self.assertEqual(refresh_trending(now=self.now, last_refresh=self.now - timedelta(minutes=5)), 1)
+        # 4 views x 1 + 3 likes x 2
+        self.assertEqual(self.scores(self.video), (10, 10))
+
+        Video.objects.filter(pk=self.video.pk).update(likes_count=F('likes_count') + 1, comment_count=1)
+        refresh_trending(now=self.now + timedelta(hours=1), last_refresh=self.now)
+        # Half of the old score plus 1 like x 2 and 1 comment x 3
+        score, engagement = self.scores(self.video)
+        self.assertAlmostEqual(score, 10 * 0.5 + 5)
+        self.assertEqual(engagement, 15)
+
+    def test_videos_outside_the_window_stop_trending(self):
+        refresh_trending(now=self.now, last_refresh=self.now - timedelta(minutes=5))
+        # Not rescored from its 50 likes, and its old score is cleared
+        self.assertEqual(self.scores(self.old), (0, 0))
+        self.assertEqual(cache.get(LAST_REFRESH_CACHE_KEY), self.now)
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_process_local_caches_are_reported(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        database = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'api_cache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([message.id for message in shared_cache_check(None)], ['api.W001'])
+        with override_settings(CACHES=database):
+            self.assertEqual(shared_cache_check(None), [])
+
+    def test_replicas_require_a_shared_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        database = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'api_cache'}}
+        with override_settings(CACHES=locmem, DATABASE_REPLICAS=[]):
+            self.assertEqual(replica_pin_check(None), [])
+        with override_settings(CACHES=locmem, DATABASE_REPLICAS=['replica_0']):
+            self.assertEqual([message.id for message in replica_pin_check(None)], ['api.E001'])
+        with override_settings(CACHES=database, DATABASE_REPLICAS=['replica_0']):
+            self.assertEqual(replica_pin_check(None), [])
+
+
+@override_settings(NOTIFICATION_OUTBOX_MODE='sync')
+class NotificationAggregationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.video = Video.objects.create(user=self.owner, title='video', video_file='videos/video.mp4')
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def like(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(user).post(f'/api/like/{self.video.id}/')
+
+    def unread(self):
+        return UserStats.objects.get(user=self.owner).unread_notifications
+
+    def test_likes_coalesce_into_one_notification(self):
+        self.like(self.alice)
+        self.like(self.bob)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.content, 'bob and 1 other liked your video')
+        self.assertEqual(self.unread(), 1)
+
+    def test_toggle_spam_counts_each_actor_once(self):
+        for _ in range(5):
+            self.like(self.alice)
+            self.like(self.bob)
+            self.like(self.alice)
+            self.like(self.bob)
+        self.like(self.alice)
+
+        notification = Notification.objects.get()
+        self.assertEqual(Like.objects.filter(video=self.video).count(), 1)
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.content, 'alice liked your video')
+
+        # The last actor taking the like back removes the notification
+        self.like(self.alice)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.unread(), 0)
+
+    def test_seen_notifications_are_not_folded_into(self):
+        self.like(self.alice)
+        notification = Notification.objects.get()
+        client_for(self.owner).post('/api/notifications/mark-seen/', {'up_to_id': notification.id})
+
+        self.like(self.bob)
+        self.assertEqual(list(Notification.objects.order_by('id').values_list('actor_count', 'seen')), [(1, True), (1, False)])
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {name: User.objects.create(username=name) for name in 'abcdef'}
+        for follower, following in ['ab', 'bc', 'bd', 'ea', 'ef']:
+            Follower.objects.create(follower=self.users[follower], following=self.users[following])
+
+    def ids(self, names):
+        return [self.users[name].id for name in names]
+
+    def test_graph_is_stored_as_csr_arrays(self):
+        graph = FollowGraph.load()
+        self.assertEqual(list(graph.ids), sorted(self.ids('abcdef')))
+
+        def names(nodes):
+            by_id = {user.id: name for name, user in self.users.items()}
+            return sorted(by_id[graph.ids[node]] for node in nodes)
+
+        node = {name: list(graph.ids).index(user.id) for name, user in self.users.items()}
+        self.assertEqual(names(graph.following(node['b'])), ['c', 'd'])
+        self.assertEqual(names(graph.followers(node['a'])), ['e'])
+        self.assertEqual(names(graph.following(node['c'])), [])
+        self.assertEqual(len(graph.out_targets), 5)
+
+    def test_followers_rank_before_friends_of_friends_and_co_follows(self):
+        suggestions = dict(compute_suggestions(FollowGraph.load(), top_k=10, max_degree=10))
+        # e follows a back (3), b's follows c and d (1 each, lower id first), e's other follow f (0.5)
+        self.assertEqual(suggestions[self.users['a'].id], self.ids('ecdf'))
+
+    def test_refresh_caches_and_skips_accounts_followed_since(self):
+        self.assertEqual(refresh_suggestions(), 6)
+        Follower.objects.create(follower=self.users['a'], following=self.users['e'])
+        self.assertEqual(suggested_user_ids(self.users['a'], limit=3), self.ids('cdf'))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create(username='viewer')
+        self.client = client_for(self.viewer)
+
+    def cursor(self, payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def test_malformed_cursors_are_not_found(self):
+        for position in [[{'a': 1}, 1], ['yesterday', 1], ['2024-01-01T00:00:00+00:00', 'first'], [None, 1]]:
+            response = self.client.get('/api/videos/', {'cursor': self.cursor({'p': position})})
+            self.assertEqual(response.status_code, 404, position)
+        self.assertEqual(self.client.get('/api/videos/', {'cursor': self.cursor([1, 2])}).status_code, 404)
+
+    def test_user_list_pages_through_users_without_stats(self):
+        users = [User.objects.create(username=f'user{n}') for n in range(12)]
+        UserStats.objects.create(user=users[5], follower_count=3)
+        seen = []
+        path = '/api/users/search/'
+        while path:
+            response = self.client.get(path)
+            seen.extend(user['id'] for user in response.data['results'])
+            path = response.data['next']
+        self.assertEqual(seen[0], users[5].id)
+        self.assertCountEqual(seen, [self.viewer.id, *(user.id for user in users)])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        # Versions live in the cache, which outlives the per-test database
+        shared_cache().clear()
+        video_cache.local.clear()
+        user_cache.local.clear()
+        self.owner = User.objects.create(username='owner')
+        self.user = User.objects.create(username='viewer')
+        self.video = Video.objects.create(user=self.owner, title='video', video_file='videos/video.mp4', status='ready')
+        self.client = client_for(self.user)
+
+    def assertNotModified(self, path):
+        etag = self.client.get(path)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_user_detail_is_revalidated_until_a_follow(self):
+        etag = self.assertNotModified(f'/api/user/{self.owner.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/follow/{self.owner.id}/')
+        response = self.client.get(f'/api/user/{self.owner.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['follower_count'], 1)
+
+    def test_comment_list_is_revalidated_until_a_comment(self):
+        path = f'/api/videos/{self.video.id}/comments/'
+        etag = self.assertNotModified(path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/comment/{self.video.id}/', {'text': 'hi'})
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_user_videos_etag_differs_for_the_owner(self):
+        Video.objects.create(user=self.owner, title='processing', video_file='videos/processing.mp4')
+        path = f'/api/videos/user/{self.owner.id}/'
+        etag = self.assertNotModified(path)
+        # Another viewer's validator must not answer the owner, who also sees the pending video
+        response = client_for(self.owner).get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_trending_and_video_detail_skip_the_view(self):
+        self.assertNotModified('/api/videos/trending/')
+        etag = self.assertNotModified(f'/api/video/{self.video.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/like/{self.video.id}/')
+        self.assertEqual(self.client.get(f'/api/video/{self.video.id}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_viewer_state_payloads_have_no_etag(self):
+        response = self.client.get(f'/api/video/{self.video.id}/?include=viewer_state')
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(NOTIFICATION_OUTBOX_MODE='external', VIDEO_UPLOAD_PART_SIZE=5 * 1024 * 1024)
+class MultipartUploadTests(TestCase):
+    # S3 is replaced by botocore's Stubber, point AWS_S3_ENDPOINT_URL at MinIO to run the same
+    # flow against a real S3-compatible server
+    def setUp(self):
+        self.user = User.objects.create(username='uploader')
+        self.client = client_for(self.user)
+        self.stubber = Stubber(s3_client())
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def start_upload(self, size, **fields):
+        self.stubber.add_response('create_multipart_upload', {'UploadId': 'upload-1', 'Key': 'videos/x.mp4'})
+        response = self.client.post('/api/uploads/', {'filename': 'clip.mp4', 'size': size, 'title': 'clip', **fields}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def stub_parts(self, numbers):
+        parts = [{'PartNumber': number, 'ETag': f'"etag-{number}"', 'Size': 1} for number in numbers]
+        self.stubber.add_response('list_parts', {'Parts': parts, 'IsTruncated': False})
+
+    def test_upload_hands_out_one_url_per_part(self):
+        upload = self.start_upload(12 * 1024 * 1024)
+        self.assertEqual(upload['part_count'], 3)
+        self.assertEqual(sorted(upload['part_urls']), ['1', '2', '3'])
+        self.assertIn('uploadId=upload-1', upload['part_urls']['2'])
+
+    def test_complete_creates_the_video_once_every_part_is_there(self):
+        upload = self.start_upload(12 * 1024 * 1024)
+
+        self.stub_parts([1, 3])
+        response = self.client.post(f"/api/uploads/{upload['id']}/complete/")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Video.objects.exists())
+
+        self.stub_parts([1, 2, 3])
+        self.stubber.add_response('complete_multipart_upload', {}, {
+            'Bucket': ANY, 'Key': upload['key'], 'UploadId': 'upload-1',
+            'MultipartUpload': {'Parts': [{'PartNumber': n, 'ETag': f'"etag-{n}"'} for n in (1, 2, 3)]},
+        })
+        response = self.client.post(f"/api/uploads/{upload['id']}/complete/")
+        self.assertEqual(response.status_code, 201)
+        video = Video.objects.get()
+        self.assertEqual(video.video_file.name, upload['key'])
+        self.assertEqual(UserStats.objects.get(user=self.user).video_count, 1)
+        self.assertEqual(self.client.post(f"/api/uploads/{upload['id']}/complete/").status_code, 409)
+        self.stubber.assert_no_pending_responses()
+
+    def record_lock_depth(self, *operations):
+        # Savepoint depth at each S3 call, the baseline when the call is outside any transaction
+        # of complete_session / abort_session's own
+        depths = []
+
+        def record_depth(**kwargs):
+            depths.append(len(connection.savepoint_ids))
+
+        events = s3_client().meta.events
+        for operation in operations:
+            events.register(f'before-parameter-build.s3.{operation}', record_depth)
+            self.addCleanup(events.unregister, f'before-parameter-build.s3.{operation}', record_depth)
+        return depths
+
+    def test_s3_is_called_before_the_session_is_locked(self):
+        upload = self.start_upload(5 * 1024 * 1024, thumbnail_filename='cover.jpg')
+        thumbnail_key = UploadSession.objects.get().thumbnail_key
+        depths = self.record_lock_depth('CompleteMultipartUpload', 'HeadObject')
+        self.stub_parts([1])
+        self.stubber.add_response('complete_multipart_upload', {})
+        self.stubber.add_response('head_object', {}, {'Bucket': ANY, 'Key': thumbnail_key})
+
+        self.assertEqual(self.client.post(f"/api/uploads/{upload['id']}/complete/").status_code, 201)
+        self.assertEqual(depths, [len(connection.savepoint_ids)] * 2)
+        self.assertEqual(Video.objects.get().thumbnail.name, thumbnail_key)
+
+    def test_abort_tells_s3_after_the_commit(self):
+        upload = self.start_upload(5 * 1024 * 1024)
+        depths = self.record_lock_depth('AbortMultipartUpload')
+        self.stubber.add_response('abort_multipart_upload', {}, {'Bucket': ANY, 'Key': upload['key'], 'UploadId': 'upload-1'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/uploads/{upload['id']}/").status_code, 204)
+            self.assertEqual(depths, [])
+        self.assertEqual(depths, [len(connection.savepoint_ids)])
+        self.assertEqual(UploadSession.objects.get().status, 'aborted')
+        self.stubber.assert_no_pending_responses()
+
+    def test_abort_after_a_racing_completion_deletes_the_object(self):
+        upload = self.start_upload(5 * 1024 * 1024)
+        self.stubber.add_client_error('abort_multipart_upload', service_error_code='NoSuchUpload', http_status_code=404)
+        self.stubber.add_response('delete_object', {}, {'Bucket': ANY, 'Key': upload['key']})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/uploads/{upload['id']}/").status_code, 204)
+        self.stubber.assert_no_pending_responses()
+
+    def test_retry_after_s3_completed_creates_the_video(self):
+        # An earlier attempt completed on S3 but its transaction rolled back: S3 no longer knows
+        # the upload id, the object is there
+        upload = self.start_upload(5 * 1024 * 1024)
+        self.stubber.add_client_error('list_parts', service_error_code='NoSuchUpload', http_status_code=404)
+        self.stubber.add_response('head_object', {}, {'Bucket': ANY, 'Key': upload['key']})
+
+        self.assertEqual(self.client.post(f"/api/uploads/{upload['id']}/complete/").status_code, 201)
+        self.assertEqual(Video.objects.get().video_file.name, upload['key'])
+        self.assertEqual(UploadSession.objects.get().status, 'completed')
+        self.stubber.assert_no_pending_responses()
+
+    def test_upload_gone_from_s3_is_a_conflict(self):
+        upload = self.start_upload(5 * 1024 * 1024)
+        self.stub_parts([1])
+        self.stubber.add_client_error('complete_multipart_upload', service_error_code='NoSuchUpload', http_status_code=404)
+        self.stubber.add_client_error('head_object', service_error_code='404', http_status_code=404)
+
+        self.assertEqual(self.client.post(f"/api/uploads/{upload['id']}/complete/").status_code, 409)
+        self.assertFalse(Video.objects.exists())
+        self.assertEqual(UploadSession.objects.get().status, 'uploading')
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.owner = User.objects.create(username='owner')
+        self.video = Video.objects.create(user=self.owner, title='video', video_file='videos/video.mp4')
+        for n in range(3):
+            Comment.objects.create(user=self.owner, video=self.video, text=f'comment {n}')
+        self.client = client_for(self.owner)
+
+    def test_requests_are_recorded_per_url_name(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/videos/{self.video.id}/comments/')
+        query_count = len(queries)
+        body = APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+
+        labels = '{route="video-comments",method="GET"}'
+        self.assertIn('api_responses_total{route="video-comments",method="GET",status="200"} 1', body)
+        self.assertIn(f'api_request_duration_seconds_count{labels} 1', body)
+        self.assertIn(f'api_request_queries_sum{labels} {float(query_count)}', body)
+        serialization = float(body.split(f'api_request_serialization_seconds_sum{labels} ')[1].split()[0])
+        self.assertGreater(serialization, 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_nothing_is_recorded_when_sampling_is_off(self):
+        self.client.get(f'/api/videos/{self.video.id}/comments/')
+        self.assertNotIn('video-comments', registry.render())
+
+    def test_metrics_require_the_token(self):
+        self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        # Not even from localhost, which is every request behind a local reverse proxy
+        self.assertEqual(APIClient().get('/api/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_FLUSH_INLINE=True)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        recorder.flush()
+        SlowQuery.objects.all().delete()
+        self.owner = User.objects.create(username='owner')
+        self.videos = [Video.objects.create(user=self.owner, title=f'video {n}', video_file='videos/video.mp4') for n in range(2)]
+        for video in self.videos:
+            Comment.objects.create(user=self.owner, video=video, text='comment')
+        self.client = client_for(self.owner)
+
+    def test_query_shapes_are_recorded_once_with_a_plan(self):
+        for video in self.videos:
+            self.client.get(f'/api/videos/{video.id}/comments/')
+
+        query = SlowQuery.objects.get(view='video-comments', normalized_sql__contains='FROM "api_comment"')
+        self.assertEqual(query.count, 2)
+        self.assertIn('pagination.py', query.call_site)
+        self.assertIn('comment_video_created_idx', query.explain)
+
+    def test_examples_leave_out_parameter_values(self):
+        User.objects.filter(username='secret-name', password='secret-hash').extra(where=["first_name <> 'inline-secret'"]).count()
+        recorder.flush()
+        query = SlowQuery.objects.get(normalized_sql__contains='"password" = ?')
+        self.assertNotIn('secret', query.example_sql)
+        self.assertIn('"password" = %s', query.example_sql)
+
+    @override_settings(SLOW_QUERY_FLUSH_INLINE=False)
+    def test_requests_hand_the_flush_to_the_background(self):
+        with mock.patch.object(recorder, 'flush') as flush, mock.patch.object(recorder, 'flush_later') as flush_later:
+            self.client.get(f'/api/videos/{self.videos[0].id}/comments/')
+        flush.assert_not_called()
+        flush_later.assert_called_once_with()
+
+    def test_literals_and_list_lengths_do_not_change_the_shape(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'bob' LIMIT 21"),
+            normalize_sql("SELECT *  FROM t WHERE id IN (%s) AND name = 'o''neil' LIMIT 11"),
+        )
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, SLOW_QUERY_THRESHOLD_MS=None)
+class AsyncReadViewTests(TransactionTestCase):
+    # The pool runs on its own threads and connections, so the rows have to be committed
+    def setUp(self):
+        registry.reset()
+        owner = User.objects.create(username='owner')
+        self.viewer = User.objects.create(username='viewer')
+        self.video = Video.objects.create(user=owner, title='video', video_file='videos/video.mp4')
+        Like.objects.create(user=self.viewer, video=self.video)
+        token = RefreshToken.for_user(self.viewer).access_token
+        self.client = AsyncClient(AUTHORIZATION=f'Bearer {token}')
+
+    async def test_hot_reads_run_on_the_database_pool(self):
+        threads = []
+        get = VideoLikeStatusView.get
+
+        def recording_get(view, request, video_id):
+            threads.append(threading.current_thread().name)
+            return get(view, request, video_id)
+
+        with mock.patch.object(VideoLikeStatusView, 'get', recording_get):
+            response = await self.client.get(f'/api/like/{self.video.id}/status/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'liked': True})
+        self.assertTrue(threads[0].startswith('db'))
+        # The metrics sample follows the request onto the pool thread
+        body = registry.render()
+        self.assertIn('api_request_queries_count{route="like-status",method="GET"} 1', body)
+        self.assertGreater(float(body.split('api_request_queries_sum{route="like-status",method="GET"} ')[1].split()[0]), 0)
+
+    async def test_pool_bounds_concurrent_calls(self):
+        pool = DatabaseThreadPool(2)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def call():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.02)
+            count = User.objects.count()
+            with lock:
+                running[0] -= 1
+            return count, threading.current_thread().name
+
+        results = await asyncio.gather(*(pool.run(call) for _ in range(8)))
+
+        self.assertEqual({count for count, _ in results}, {2})
+        self.assertLessEqual(len({name for _, name in results}), 2)
+        self.assertEqual(running[1], 2)
+
+
+class NotificationSocketTests(TransactionTestCase):
+    # Drives the ASGI WebSocket endpoint directly. Sync ORM calls go through sync_to_async, so
+    # the rows have to be committed.
+    def setUp(self):
+        self.recipient = User.objects.create(username='recipient')
+        self.actor = User.objects.create(username='actor')
+        self.token = str(RefreshToken.for_user(self.recipient).access_token)
+
+    def notify(self, content, minutes_ago=0):
+        notification = Notification.objects.create(user=self.recipient, content=content, notification_type='like', triggering_user=self.actor)
+        if minutes_ago:
+            notification.created_at = timezone.now() - timedelta(minutes=minutes_ago)
+            notification.save(update_fields=['created_at'])
+        return notification
+
+    async def connect(self, query=''):
+        self.incoming, self.outgoing = asyncio.Queue(), asyncio.Queue()
+        await self.incoming.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'headers': [], 'query_string': f'token={self.token}{query}'.encode()}
+        self.socket = asyncio.ensure_future(notification_socket(scope, self.incoming.get, self.outgoing.put))
+        self.assertEqual((await asyncio.wait_for(self.outgoing.get(), 5))['type'], 'websocket.accept')
+        # Subscribed once it waits for events
+        while not get_broker().connection_count():
+            await asyncio.sleep(0.01)
+
+    async def receive(self):
+        return json.loads((await asyncio.wait_for(self.outgoing.get(), 5))['text'])
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(self.socket, 5)
+
+    async def test_published_notifications_are_pushed_with_a_cursor(self):
+        await self.connect()
+        notification = await sync_to_async(self.notify)('liked your video')
+        await sync_to_async(publish_notifications)([notification])
+        event = await self.receive()
+        self.assertEqual(event['notification']['id'], notification.id)
+        self.assertEqual(parse_stream_cursor(event['cursor']), (notification.created_at, notification.id))
+        await self.disconnect()
+
+    async def test_resume_includes_aggregates_bumped_since_the_cursor(self):
+        first = await sync_to_async(self.notify)('first', minutes_ago=5)
+        second = await sync_to_async(self.notify)('second', minutes_ago=3)
+        cursor = stream_cursor(first.created_at, first.id)
+        # More likes folded into the first notification after the client saw it
+        await Notification.objects.filter(pk=first.pk).aupdate(created_at=timezone.now(), content='first and 2 others')
+
+        await self.connect(f'&cursor={cursor}')
+        events = [await self.receive(), await self.receive()]
+        self.assertEqual([event['notification']['content'] for event in events], ['second', 'first and 2 others'])
+        await self.disconnect()
+
+    async def test_events_published_during_the_resume_are_sent_once(self):
+        seen = await sync_to_async(self.notify)('seen', minutes_ago=5)
+        missed = await sync_to_async(self.notify)('missed', minutes_ago=1)
+        read_delta = realtime._notifications_since
+
+        def publish_then_read(*args):
+            # Committed and published after the socket subscribed, before it read the delta
+            publish_notifications([missed])
+            return read_delta(*args)
+
+        with mock.patch('api.realtime._notifications_since', publish_then_read):
+            await self.connect(f'&cursor={stream_cursor(seen.created_at, seen.id)}')
+            self.assertEqual((await self.receive())['notification']['id'], missed.id)
+            fresh = await sync_to_async(self.notify)('fresh')
+            await sync_to_async(publish_notifications)([fresh])
+            self.assertEqual((await self.receive())['notification']['id'], fresh.id)
+        await self.disconnect()
+
+    @override_settings(NOTIFICATION_STREAM_QUEUE_SIZE=1)
+    async def test_overflow_resyncs_from_the_database(self):
+        await self.connect()
+        notifications = [await sync_to_async(self.notify)(f'like {n}') for n in range(3)]
+        # Published from the loop itself, all three land before the socket drains its queue of one
+        publish_notifications(notifications)
+        self.assertEqual((await self.receive())['type'], 'resync')
+        replayed = [(await self.receive())['notification']['id'] for _ in notifications]
+        self.assertEqual(replayed, [notification.id for notification in notifications])
+        await self.disconnect()
+
+
+class LoadTestTests(TransactionTestCase):
+    # Runs scenarios through the ASGI handler in-process, as `load_test` does without --url.
+    # Sync ORM calls go through sync_to_async, so the rows have to be committed.
+    def setUp(self):
+        users = [User.objects.create(username=f'viewer{n}') for n in range(2)]
+        videos = [Video.objects.create(user=users[0], title=f'video {n}', video_file=f'videos/{n}.mp4', status='ready') for n in range(3)]
+        self.dataset = {
+            'tokens': [str(RefreshToken.for_user(user).access_token) for user in users],
+            'usernames': [user.username for user in users],
+            'video_ids': [video.id for video in videos],
+        }
+
+    def test_percentiles_are_read_off_the_sorted_timings(self):
+        results = Results()
+        for elapsed_ms in range(100, 0, -1):
+            results.record('GET', '/api/videos/trending/', elapsed_ms, 500 if elapsed_ms <= 3 else 200)
+        results.record('GET', '/api/like/1/status/', 7, None)
+
+        status, trending, total = results.report(elapsed=2)
+        self.assertEqual(trending['route'], 'GET api/videos/trending/')
+        self.assertEqual((trending['requests'], trending['errors'], trending['rps']), (100, 3, 50))
+        self.assertEqual((trending['p50'], trending['p90'], trending['p99'], trending['max']), (51, 91, 100, 100))
+        self.assertEqual((status['route'], status['errors']), ('GET api/like/<int:video_id>/status/', 1))
+        self.assertEqual((total['route'], total['requests'], total['errors']), ('total', 101, 4))
+
+    async def test_swipe_scenario_reports_every_request(self):
+        transport = ASGITransport(get_asgi_application())
+        results, elapsed = await run_load(lambda: transport, self.dataset, mix={'swipe': 1}, concurrency=2, duration=30, max_requests=12)
+
+        *routes, total = results.report(elapsed)
+        self.assertEqual([row['route'] for row in routes], [
+            'GET api/like/<int:video_id>/status/', 'GET api/video/<int:id>/', 'GET api/videos/<int:video_id>/comments/',
+        ])
+        # Each swipe is three requests, the users stop between scenarios once 12 were sent
+        self.assertGreaterEqual(total['requests'], 12)
+        self.assertEqual([row['requests'] for row in routes], [total['requests'] // 3] * 3)
+        self.assertEqual(total['errors'], 0)
+        self.assertTrue(0 < total['p50'] <= total['p99'] <= total['max'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], NOTIFICATION_OUTBOX_MODE='external', SLOW_QUERY_THRESHOLD_MS=None)
+class ReplicaRoutingTests(TransactionTestCase):
+    # A second connection to the test database stands in for a replica. It is added in
+    # setUpClass, '__all__' picks it up there.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = dict(connections['default'].settings_dict)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        # Slow queries left by earlier tests would be written on the primary by the first request
+        recorder.flush()
+        shared_cache().clear()
+        self.owner = User.objects.create(username='owner')
+        self.viewer = User.objects.create(username='viewer')
+        self.video = Video.objects.create(user=self.owner, title='video', video_file='videos/video.mp4')
+        self.client = client_for(self.viewer)
+
+    def get(self, path):
+        # (response, queries on the primary, queries on the replica)
+        # The request resets the query logs when it starts, start both from empty
+        reset_queries()
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(path)
+        return response, len(primary), len(replica)
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        response, primary, replica = self.get(f'/api/like/{self.video.id}/status/')
+        self.assertEqual((response.data, primary, replica), ({'liked': False}, 0, 1))
+
+        self.assertEqual(self.client.post(f'/api/like/{self.video.id}/').status_code, 201)
+        response, primary, replica = self.get(f'/api/like/{self.video.id}/status/')
+        self.assertEqual((response.data, primary, replica), ({'liked': True}, 1, 0))
+
+        # Other users still read from the replica
+        self.client = client_for(self.owner)
+        self.assertEqual(self.get(f'/api/like/{self.video.id}/status/')[1:], (0, 1))
+
+    def test_responses_with_an_etag_read_from_the_primary_after_a_write(self):
+        _, _, replica = self.get(f'/api/videos/user/{self.owner.id}/')
+        self.assertGreater(replica, 0)
+
+        # A new upload bumps the owner's list, everyone reads it from the primary for a while
+        invalidate_collections(f'user_videos:{self.owner.id}')
+        _, primary, replica = self.get(f'/api/videos/user/{self.owner.id}/')
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+        shared_cache().delete(f'collection:version:user_videos:{self.owner.id}:bumped')
+        self.assertGreater(self.get(f'/api/videos/user/{self.owner.id}/')[2], 0)
+
+
+# Dataset size for EndpointBudgetTests, e.g. API_PERF_SCALE=10 for ten times the rows
+PERF_SCALE = int(os.environ.get('API_PERF_SCALE', '1'))
+# Median request times per scale. Wall-clock timings depend on the machine, so they are only
+# measured with API_PERF_TIMINGS=1, or when API_PERF_WRITE_BASELINES names a file to write the
+# new medians to (copy it over perf_baselines.json to accept them). The query budgets always run.
+PERF_BASELINES = os.path.join(os.path.dirname(__file__), 'perf_baselines.json')
+PERF_WRITE_BASELINES = os.environ.get('API_PERF_WRITE_BASELINES')
+PERF_TIMINGS = os.environ.get('API_PERF_TIMINGS') == '1' or bool(PERF_WRITE_BASELINES)
+# A route regresses when its median exceeds tolerance x baseline + slack
+PERF_TOLERANCE = float(os.environ.get('API_PERF_TOLERANCE', '3'))
+PERF_SLACK_MS = 10
+PERF_RUNS = 5
+
+# (method, route, path, payload, query budget, timed). Paths and payloads are formatted with
+# EndpointBudgetTests.ids. Every route in api/urls.py needs an entry, see test_every_route_is_budgeted.
+# Timed entries are repeatable requests, they are also checked against the timing baselines.
+ENDPOINTS = [
+    ('post', 'login/', 'login/', {'username': '{viewer_name}', 'password': SEED_PASSWORD}, 4, True),
+    ('post', 'register/', 'register/', {'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'secret'}, 11, False),
+    ('get', 'videos/', 'videos/', None, 1, True),
+    ('get', 'videos/', 'videos/?include=viewer_state', None, 4, True),
+    ('post', 'videos/', 'videos/', 'upload', 9, False),
+    ('get', 'videos/<int:pk>/', 'videos/{own_video}/', None, 1, True),
+    ('delete', 'videos/<int:pk>/', 'videos/{own_video}/', None, 19, False),
+    ('post', 'like/<int:video_id>/', 'like/{video}/', None, 10, True),
+    ('post', 'comment/<int:video_id>/', 'comment/{video}/', {'text': 'Nice'}, 6, True),
+    ('delete', 'comment/<int:comment_id>/delete/', 'comment/{comment}/delete/', None, 4, False),
+    ('post', 'favorite/<int:video_id>/', 'favorite/{video}/', None, 7, True),
+    ('post', 'follow/<int:user_id>/', 'follow/{star}/', None, 13, True),
+    ('get', 'notifications/', 'notifications/', None, 1, True),
+    ('get', 'videos/trending/', 'videos/trending/', None, 1, True),
+    ('get', 'videos/trending/', 'videos/trending/?include=viewer_state', None, 4, True),
+    ('get', 'videos/<int:video_id>/comments/', 'videos/{video}/comments/', None, 1, True),
+    ('get', 'videos/user/<int:user_id>/', 'videos/user/{star}/', None, 1, True),
+    ('get', 'videos/following/', 'videos/following/', None, 2, True),
+    ('post', 'videos/views/', 'videos/views/', {'video_ids': ['{video}', '{video}', '{own_video}']}, 2, True),
+    ('post', 'uploads/', 'uploads/', {'filename': 'clip.mp4', 'size': 1024, 'title': 'clip'}, 1, False),
+    ('get', 'uploads/<int:upload_id>/', 'uploads/{upload}/', None, 1, False),
+    ('delete', 'uploads/<int:upload_id>/', 'uploads/{upload}/', None, 5, False),
+    ('post', 'uploads/<int:upload_id>/parts/', 'uploads/{upload}/parts/', {'part_numbers': [1]}, 1, True),
+    ('post', 'uploads/<int:upload_id>/complete/', 'uploads/{finished_upload}/complete/', None, 13, False),
+    ('get', 'cache/stats/', 'cache/stats/', None, 0, True),
+    ('get', 'videos/viewer-state/', 'videos/viewer-state/?ids={video},{own_video}', None, 4, True),
+    ('get', 'videos/views/stats/', 'videos/views/stats/', None, 0, True),
+    ('get', 'video/<int:id>/', 'video/{video}/', None, 1, True),
+    ('get', 'video/<int:id>/', 'video/{video}/?include=viewer_state', None, 4, True),
+    ('get', 'users/suggested/', 'users/suggested/', None, 4, True),
+    ('get', 'users/friends/', 'users/friends/', None, 3, True),
+    ('get', 'like/<int:video_id>/status/', 'like/{video}/status/', None, 1, True),
+    ('get', 'users/search/', 'users/search/?search=seed', None, 3, True),
+    ('get', 'users/search/', 'users/search/', None, 3, True),
+    ('get', 'user/<int:user_id>/', 'user/{star}/', None, 3, True),
+    ('get', 'follow/status/<int:user_id>/', 'follow/status/{star}/', None, 1, True),
+    ('get', 'users/<int:user_id>/followers/', 'users/{star}/followers/', None, 3, True),
+    ('get', 'users/<int:user_id>/following/', 'users/{viewer}/following/', None, 3, True),
+    ('patch', 'profile-picture/', 'profile-picture/', 'picture', 5, False),
+    ('patch', 'update-username/', 'update-username/', {'username': 'renamed'}, 10, False),
+    ('post', 'notifications/mark-all-seen/', 'notifications/mark-all-seen/', None, 4, True),
+    ('post', 'notifications/mark-seen/', 'notifications/mark-seen/', {'up_to_id': '{notification}'}, 3, True),
+    ('get', 'notifications/unread-count/', 'notifications/unread-count/', None, 1, True),
+    ('get', 'metrics/', 'metrics/', None, 0, True),
+]
+
+
+def png_upload(name='avatar.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (600, 400), 'teal').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX_MODE='external',
+    TRANSCODE_MODE='off',
+    AVATAR_VARIANT_MODE='sync',
+    METRICS_TOKEN='scrape-token',
+    SLOW_QUERY_THRESHOLD_MS=None,
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class EndpointBudgetTests(TestCase):
+    # Every route against a seeded dataset: the number of SQL queries per request must stay
+    # under its budget and, for paginated routes, must not depend on the page size. Timed routes
+    # are compared with the baselines in perf_baselines.json when PERF_TIMINGS is on.
+    timings = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = PERF_SCALE
+        data = seed_dataset(
+            users=40 * scale, follows_per_user=8, videos_per_user=3, likes_per_video=6,
+            comments_per_video=4,
+        )
+        users = User.objects.filter(id__in=data['user_ids'])
+        # The user with the most friends, so every list route has more than one page
+        cls.viewer = users.annotate(friends=Count('following', filter=Q(following__is_mutual=True))).order_by('-friends', 'id').first()
+        star = users.exclude(pk=cls.viewer.pk).filter(stats__video_count__gt=1).order_by('-stats__follower_count', 'id').first()
+        video = Video.objects.exclude(user=cls.viewer).order_by('-comment_count', 'id').first()
+        own_video = Video.objects.create(user=cls.viewer, title='mine', video_file='videos/mine.mp4', status='ready')
+        comment = Comment.objects.create(user=cls.viewer, video=video, text='first')
+        notification = Notification.objects.filter(user=cls.viewer).order_by('-id').first()
+        upload, finished_upload = (
+            UploadSession.objects.create(
+                user=cls.viewer, key=f'videos/{upload_id}.mp4', upload_id=upload_id, title='clip',
+                content_type='video/mp4', size=1024, part_size=5 * 1024 * 1024,
+            )
+            for upload_id in ('upload-1', 'upload-2')
+        )
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        UserStats.objects.create(user=cls.admin)
+        cls.ids = {
+            'viewer': cls.viewer.id, 'viewer_name': cls.viewer.username, 'star': star.id, 'video': video.id,
+            'own_video': own_video.id, 'comment': comment.id, 'upload': upload.id,
+            'finished_upload': finished_upload.id,
+            'notification': notification.id if notification else 0,
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.save_baselines()
+
+    def setUp(self):
+        shared_cache().clear()
+        video_cache.local.clear()
+        user_cache.local.clear()
+        self.stubber = Stubber(s3_client())
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        # Apply view events inline instead of from the background flusher
+        patcher = mock.patch.object(view_buffer, 'flush_interval', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # And fan out uploads inline instead of on the transcode worker pool
+        patcher = mock.patch.object(transcode_pool, 'run_later', lambda function, *args: function(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def format(self, value):
+        if isinstance(value, str):
+            formatted = value.format(**self.ids)
+            return int(formatted) if formatted.isdigit() and formatted != value else formatted
+        if isinstance(value, list):
+            return [self.format(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.format(item) for key, item in value.items()}
+        return value
+
+    def stub_s3(self, method, route):
+        if route == 'uploads/':
+            self.stubber.add_response('create_multipart_upload', {'UploadId': 'upload-2', 'Key': 'videos/x.mp4'})
+        elif route == 'uploads/<int:upload_id>/' and method == 'get':
+            self.stubber.add_response('list_parts', {'Parts': [], 'IsTruncated': False})
+        elif route == 'uploads/<int:upload_id>/' and method == 'delete':
+            self.stubber.add_response('abort_multipart_upload', {})
+        elif route == 'uploads/<int:upload_id>/complete/':
+            self.stubber.add_response('list_parts', {'Parts': [{'PartNumber': 1, 'ETag': '"etag-1"', 'Size': 1024}], 'IsTruncated': False})
+            self.stubber.add_response('complete_multipart_upload', {})
+
+    def request(self, method, route, path, payload):
+        client = client_for(self.admin if route in ('cache/stats/', 'videos/views/stats/') else self.viewer)
+        if route in ('login/', 'register/'):
+            client = APIClient()
+        elif route == 'metrics/':
+            client = APIClient(HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.stub_s3(method, route)
+        if payload == 'upload':
+            payload, format = {'title': 'clip', 'video_file': SimpleUploadedFile('clip.mp4', b'video', content_type='video/mp4')}, 'multipart'
+        elif payload == 'picture':
+            payload, format = {'profile_picture': png_upload()}, 'multipart'
+        else:
+            payload, format = self.format(payload), 'json'
+        response = getattr(client, method)(f'/api/{self.format(path)}', payload, format=format)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {path}: {response.status_code} {response.content[:200]}')
+        return response
+
+    def count_queries(self, method, route, path, payload):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.request(method, route, path, payload)
+        return response, len(queries)
+
+    def test_every_route_is_budgeted(self):
+        routes = {str(pattern.pattern) for pattern in urls.urlpatterns}
+        self.assertEqual(routes - {route for _, route, *_ in ENDPOINTS}, set())
+
+    def test_query_budgets(self):
+        for method, route, path, payload, budget, _ in ENDPOINTS:
+            with self.subTest(f'{method.upper()} {path}'):
+                _, queries = self.count_queries(method, route, path, payload)
+                self.assertLessEqual(queries, budget)
+
+    def test_page_size_does_not_change_query_count(self):
+        for method, route, path, payload, _, _ in ENDPOINTS:
+            if method != 'get':
+                continue
+            counts = {}
+            for page_size in (1, 100):
+                shared_cache().clear()
+                video_cache.local.clear()
+                user_cache.local.clear()
+                sep = '&' if '?' in path else '?'
+                response, counts[page_size] = self.count_queries(method, route, f'{path}{sep}page_size={page_size}', payload)
+            if not isinstance(getattr(response, 'data', None), dict) or 'results' not in response.data:
+                continue
+            with self.subTest(f'GET {path}'):
+                self.assertGreater(len(response.data['results']), 1, 'not enough seeded rows to compare page sizes')
+                self.assertEqual(counts[1], counts[100])
+
+    @skipUnless(PERF_TIMINGS, 'set API_PERF_TIMINGS=1 to check the timing baselines')
+    def test_timings_against_baselines(self):
+        baselines = self.load_baselines().get(str(PERF_SCALE), {})
+        for method, route, path, payload, _, timed in ENDPOINTS:
+            if not timed:
+                continue
+            key = f'{method.upper()} {path}'
+            self.request(method, route, path, payload)  # Warm up
+            samples = []
+            for _ in range(PERF_RUNS):
+                started = time.perf_counter()
+                self.request(method, route, path, payload)
+                samples.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(samples)
+            type(self).timings[key] = round(median, 2)
+            if PERF_WRITE_BASELINES or key not in baselines:
+                continue
+            with self.subTest(key):
+                limit = baselines[key] * PERF_TOLERANCE + PERF_SLACK_MS
+                self.assertLessEqual(median, limit, f'{key} took {median:.1f}ms, baseline {baselines[key]}ms')
+
+    @staticmethod
+    def load_baselines():
+        try:
+            with open(PERF_BASELINES) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @classmethod
+    def save_baselines(cls):
+        # Only to the file named by API_PERF_WRITE_BASELINES, never into the source tree
+        if not PERF_WRITE_BASELINES or not cls.timings:
+            return
+        baselines = cls.load_baselines()
+        baselines.setdefault(str(PERF_SCALE), {}).update(cls.timings)
+        with open(PERF_WRITE_BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db.models import Count
+from .models import Follower, TimelineEntry, UserStats, Video
+from .stats import get_user_stats
+
+
+def is_pull_creator(user):
+    # Creators with very large audiences are not fanned out, their followers pull their uploads at read time
+    return get_user_stats(user).follower_count >= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_video(video):
+    # Push a new upload into every follower's timeline, trimming the timelines it pushes past
+    # TIMELINE_MAX_LENGTH batch by batch. Returns the number of followers reached.
+    if is_pull_creator(video.user):
+        return 0
+
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    follower_ids = list(Follower.objects.filter(following_id=video.user_id).values_list('follower_id', flat=True))
+    for start in range(0, len(follower_ids), batch_size):
+        batch = follower_ids[start:start + batch_size]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, video=video, author_id=video.user_id, created_at=video.created_at) for follower_id in batch],
+            ignore_conflicts=True,
+        )
+        trim_timelines(batch)
+    return len(follower_ids)
+
+
+def backfill_follow(follower_id, following):
+    # Copy the newest uploads of a freshly followed creator into the follower's timeline
+    if is_pull_creator(following):
+        return
+    videos = Video.objects.filter(user=following, status='ready').order_by('-created_at', '-id').values_list('id', 'created_at')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=follower_id, video_id=video_id, author_id=following.pk, created_at=created_at)
+            for video_id, created_at in videos[:settings.TIMELINE_BACKFILL_SIZE]
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timeline(follower_id)
+
+
+def remove_follow(follower_id, following_id):
+    TimelineEntry.objects.filter(user_id=follower_id, author_id=following_id).delete()
+
+
+def trim_timeline(user_id, max_length=None):
+    # Keep only the newest max_length entries of a timeline
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    entries = TimelineEntry.objects.filter(user_id=user_id).order_by('-created_at', '-video_id')
+    boundary = entries.values_list('created_at', 'video_id')[max_length:max_length + 1]
+    if not boundary:
+        return 0
+    created_at, video_id = boundary[0]
+    deleted, _ = entries.filter(created_at__lte=created_at).exclude(created_at=created_at, video_id__gt=video_id).delete()
+    return deleted
+
+
+def trim_timelines(user_ids):
+    # trim_timeline for the users among user_ids whose timeline is over TIMELINE_MAX_LENGTH,
+    # found with one grouped count
+    overfull = (
+        TimelineEntry.objects.filter(user_id__in=user_ids).values('user_id')
+        .annotate(entries=Count('pk')).filter(entries__gt=settings.TIMELINE_MAX_LENGTH)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in overfull:
+        trim_timeline(user_id)
+
+
+def timeline_sources(user):
+    # Keyset sources for KeysetPagination.paginate_merged: the materialized timeline plus a
+    # pull query over the followed creators that are too large to fan out
+    entries = TimelineEntry.objects.filter(user=user).select_related('video')
+    pull_ids = list(
+        Follower.objects.filter(
+            follower=user,
+            following__stats__follower_count__gte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        ).values_list('following_id', flat=True)
+    )
+    sources = [(entries, ('-created_at', '-video_id'), lambda entry: entry.video)]
+    if pull_ids:
+        sources.append((Video.objects.filter(user_id__in=pull_ids, status='ready'), ('-created_at', '-id'), lambda video: video))
+    return sources
+
+
+def rebuild_timeline(user_id):
+    # Rebuild one timeline from the follow graph (used to backfill existing data)
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    followed = UserStats.objects.filter(
+        user__followers__follower_id=user_id,
+        follower_count__lt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', flat=True)
+    rows = []
+    for author_id in followed:
+        videos = Video.objects.filter(user_id=author_id, status='ready').order_by('-created_at', '-id').values_list('id', 'created_at')
+        rows.extend(
+            TimelineEntry(user_id=user_id, video_id=video_id, author_id=author_id, created_at=created_at)
+            for video_id, created_at in videos[:settings.TIMELINE_BACKFILL_SIZE]
+        )
+    TimelineEntry.objects.bulk_create(rows, batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE, ignore_conflicts=True)
+    trim_timeline(user_id)
+    return len(rows)
@@ -0,0 +1,26 @@
+from django.db import IntegrityError, transaction
+
+
+def toggle(model, on_insert=None, on_delete=None, **lookup):
+    # Flip a row guarded by a unique constraint (like, favorite, follow) in at most two statements:
+    # a DELETE whose row count tells whether the row existed, and otherwise an INSERT that the
+    # unique index arbitrates. The callbacks apply the matching counter updates in the same
+    # transaction and only run when this call actually changed a row, so concurrent toggles can
+    # never drive the counters away from the row counts.
+    # Returns True when the row exists afterwards, False when it was removed.
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(**lookup).delete()
+        if deleted:
+            if on_delete is not None:
+                on_delete()
+            return False
+
+        try:
+            with transaction.atomic():
+                instance = model.objects.create(**lookup)
+        except IntegrityError:
+            # A concurrent toggle inserted the same row first, it is on either way
+            return True
+        if on_insert is not None:
+            on_insert(instance)
+        return True
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Video
+from .payload_cache import invalidate_video
+from .timeline import fan_out_video
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def _run(args):
+    try:
+        return subprocess.run(args, check=True, capture_output=True, timeout=settings.TRANSCODE_TIMEOUT)
+    except subprocess.CalledProcessError as exc:
+        raise TranscodeError(f'{args[0]} failed: {exc.stderr.decode(errors="replace")[-2000:]}') from exc
+    except subprocess.TimeoutExpired as exc:
+        raise TranscodeError(f'{args[0]} timed out after {settings.TRANSCODE_TIMEOUT}s') from exc
+
+
+def probe(path):
+    # Duration, frame size (after rotation) and whether there is an audio track
+    output = _run([settings.TRANSCODE_FFPROBE, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path])
+    info = json.loads(output.stdout)
+    video_stream = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), None)
+    if video_stream is None:
+        raise TranscodeError('No video stream found.')
+    width, height = int(video_stream['width']), int(video_stream['height'])
+    if _rotation(video_stream) % 180 == 90:
+        width, height = height, width
+    return {
+        'duration': float(info.get('format', {}).get('duration') or video_stream.get('duration') or 0),
+        'width': width,
+        'height': height,
+        'has_audio': any(s.get('codec_type') == 'audio' for s in info.get('streams', [])),
+    }
+
+
+def _rotation(video_stream):
+    # Older muxers write a rotate tag, newer ffprobe versions only report the display matrix
+    # side data (e.g. -90 for phone videos shot in portrait)
+    for side_data in video_stream.get('side_data_list', []):
+        if side_data.get('side_data_type') == 'Display Matrix' and 'rotation' in side_data:
+            return round(float(side_data['rotation']))
+    return round(float(video_stream.get('tags', {}).get('rotate', 0)))
+
+
+def ladder_for(width, height):
+    # The rungs of TRANSCODE_LADDER that do not upscale, with their output frame size. A rung's
+    # height is the short side, so portrait videos get the same ladder as landscape ones.
+    short_side = min(width, height)
+    rungs = [rung for rung in settings.TRANSCODE_LADDER if rung['height'] <= short_side]
+    if not rungs:
+        # Smaller than the lowest rung: keep the source size at the lowest bitrate
+        rungs = [dict(settings.TRANSCODE_LADDER[0], height=short_side)]
+    ladder = []
+    for rung in rungs:
+        scale = rung['height'] / short_side
+        # H.264 wants even dimensions
+        size = (round(width * scale / 2) * 2, round(height * scale / 2) * 2)
+        ladder.append(dict(rung, width=size[0], height=size[1]))
+    return ladder
+
+
+def _encode_rendition(source, info, rung, output_dir):
+    segment = settings.TRANSCODE_SEGMENT_SECONDS
+    args = [
+        settings.TRANSCODE_FFMPEG, '-y', '-i', source,
+        '-vf', f"scale={rung['width']}:{rung['height']}",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+        '-b:v', str(rung['video_bitrate']), '-maxrate', str(rung['video_bitrate']), '-bufsize', str(2 * rung['video_bitrate']),
+        # Keyframes on segment boundaries so every rung can be switched at every segment
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment})', '-sc_threshold', '0',
+    ]
+    args += ['-c:a', 'aac', '-b:a', str(rung['audio_bitrate'])] if info['has_audio'] else ['-an']
+    args += [
+        '-f', 'hls', '-hls_time', str(segment), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, '%04d.ts'),
+        os.path.join(output_dir, 'index.m3u8'),
+    ]
+    _run(args)
+
+
+def transcode(video):
+    # Probe the upload, encode the HLS ladder and a poster frame, and store them next to each
+    # other under hls/<video id>/. Returns the fields to record on the video.
+    storage = video.video_file.storage
+    prefix = f'hls/{video.id}/'
+    with tempfile.TemporaryDirectory(prefix='transcode-') as workdir:
+        source = os.path.join(workdir, 'source' + os.path.splitext(video.video_file.name)[1])
+        with video.video_file.open('rb') as src, open(source, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        info = probe(source)
+        output_dir = os.path.join(workdir, 'out')
+        renditions = []
+        for rung in ladder_for(info['width'], info['height']):
+            rung_dir = os.path.join(output_dir, rung['name'])
+            os.makedirs(rung_dir)
+            _encode_rendition(source, info, rung, rung_dir)
+            renditions.append({
+                'name': rung['name'],
+                'width': rung['width'],
+                'height': rung['height'],
+                'bandwidth': rung['video_bitrate'] + (rung['audio_bitrate'] if info['has_audio'] else 0),
+                'playlist': f"{prefix}{rung['name']}/index.m3u8",
+            })
+
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+        for rendition in renditions:
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={rendition['bandwidth']},RESOLUTION={rendition['width']}x{rendition['height']}")
+            lines.append(f"{rendition['name']}/index.m3u8")
+        with open(os.path.join(output_dir, 'master.m3u8'), 'w') as master:
+            master.write('\n'.join(lines) + '\n')
+
+        poster_at = min(1.0, info['duration'] / 2)
+        _run([settings.TRANSCODE_FFMPEG, '-y', '-ss', str(poster_at), '-i', source, '-frames:v', '1', '-q:v', '3', os.path.join(output_dir, 'poster.jpg')])
+
+        for directory, _, files in os.walk(output_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                with open(path, 'rb') as f:
+                    storage.save(prefix + os.path.relpath(path, output_dir).replace(os.sep, '/'), File(f))
+
+    return {
+        'duration': info['duration'],
+        'hls_playlist': f'{prefix}master.m3u8',
+        'renditions': renditions,
+        'poster': f'{prefix}poster.jpg',
+    }
+
+
+def mark_ready(video):
+    # Publish a video: followers' timelines and the cached lists only ever see ready videos
+    Video.objects.filter(pk=video.pk).update(status='ready')
+    video.status = 'ready'
+    # After commit, so the transcode transaction is not held open for the fan-out. Without
+    # transcoding this runs in the upload request, the fan-out goes to the worker pool then.
+    if settings.TRANSCODE_MODE == 'off':
+        transaction.on_commit(lambda: worker_pool.run_later(fan_out_video, video))
+    else:
+        transaction.on_commit(lambda: fan_out_video(video))
+    invalidate_video(video.id, video.user_id)
+
+
+def process_video(video_id):
+    # Transcode one pending video. The pending -> processing UPDATE is the claim, so two workers
+    # never pick up the same video. Returns True when this call processed the video.
+    claimed = Video.objects.filter(pk=video_id, status='pending').update(status='processing', processing_started_at=timezone.now())
+    if not claimed:
+        return False
+    video = Video.objects.select_related('user').get(pk=video_id)
+    try:
+        result = transcode(video)
+    except Exception:
+        logger.exception('Failed to transcode video %s', video_id)
+        Video.objects.filter(pk=video_id).update(status='failed')
+        invalidate_video(video_id, video.user_id)
+        return True
+
+    with transaction.atomic():
+        video.duration = result['duration']
+        video.hls_playlist = result['hls_playlist']
+        video.renditions = result['renditions']
+        update_fields = ['duration', 'hls_playlist', 'renditions']
+        if not video.thumbnail:
+            video.thumbnail = result['poster']
+            update_fields.append('thumbnail')
+        video.save(update_fields=update_fields)
+        mark_ready(video)
+    return True
+
+
+def requeue_stalled():
+    # Put videos whose worker died mid-transcode (claimed more than TRANSCODE_CLAIM_TIMEOUT seconds
+    # ago) back in the queue. Returns the number requeued.
+    cutoff = timezone.now() - timedelta(seconds=settings.TRANSCODE_CLAIM_TIMEOUT)
+    stalled = Video.objects.filter(status='processing').filter(Q(processing_started_at__lt=cutoff) | Q(processing_started_at__isnull=True))
+    return stalled.update(status='pending', processing_started_at=None)
+
+
+def process_pending(limit=None):
+    # Work through pending videos, oldest first, stalled ones included. Returns the number processed.
+    requeue_stalled()
+    processed = 0
+    while limit is None or processed < limit:
+        video_id = Video.objects.filter(status='pending').order_by('id').values_list('id', flat=True).first()
+        if video_id is None:
+            break
+        if process_video(video_id):
+            processed += 1
+    return processed
+
+
+class TranscodeWorkerPool:
+    # Transcodes videos on a few in-process threads, ffmpeg runs in subprocesses so the GIL is
+    # not a bottleneck. Every sweep_interval seconds a submit also sweeps the queue, which picks
+    # up videos left pending by a restart and requeues the claims of crashed workers.
+    sweep_interval = 600
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._last_sweep = None
+
+    def submit(self, video_id):
+        self.run_later(process_video, video_id)
+        with self._lock:
+            due = self._last_sweep is None or time.monotonic() - self._last_sweep >= self.sweep_interval
+            if due:
+                self._last_sweep = time.monotonic()
+        if due:
+            self.run_later(process_pending)
+
+    def run_later(self, function, *args):
+        # Any other work that should not run in the request, e.g. a timeline fan-out
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='transcode')
+        self._executor.submit(self._run, function, *args)
+
+    def _run(self, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            logger.exception('Transcoding worker failed on %s%r', function.__name__, args)
+        finally:
+            close_old_connections()
+
+
+worker_pool = TranscodeWorkerPool(settings.TRANSCODE_WORKERS)
+
+
+def schedule_transcode(video):
+    # TRANSCODE_MODE: 'pool' transcodes on the in-process worker pool after commit, 'sync' inline
+    # after commit, 'external' leaves it to `python manage.py transcode_videos` and 'off' skips
+    # transcoding and serves the original upload
+    mode = settings.TRANSCODE_MODE
+    if mode == 'off':
+        mark_ready(video)
+    elif mode == 'pool':
+        transaction.on_commit(lambda: worker_pool.submit(video.id))
+    elif mode == 'sync':
+        transaction.on_commit(lambda: process_video(video.id))
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, Min
+from django.utils import timezone
+from .models import Video
+from .payload_cache import invalidate_collections
+
+LAST_REFRESH_CACHE_KEY = 'trending:last_refresh'
+
+
+def engagement_expression():
+    return (
+        F('view_count') * settings.TRENDING_VIEW_WEIGHT
+        + F('likes_count') * settings.TRENDING_LIKE_WEIGHT
+        + F('comment_count') * settings.TRENDING_COMMENT_WEIGHT
+    )
+
+
+def decay_factor(elapsed_seconds):
+    # Fraction of a score that survives elapsed_seconds with the configured half-life
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    return 0.5 ** (max(elapsed_seconds, 0) / half_life)
+
+
+def refresh_trending(now=None, last_refresh=None):
+    # The score is an exponentially decayed sum of engagement: every run decays the previous
+    # score by the time since the last run and adds the engagement gained since then
+    # (current weighted counters minus the snapshot kept in trending_engagement).
+    # Each batch is one set-based UPDATE over an id range, so no rows travel to Python.
+    # Returns the number of videos rescored.
+    now = now or timezone.now()
+    if last_refresh is None:
+        last_refresh = cache.get(LAST_REFRESH_CACHE_KEY)
+    if last_refresh is None:
+        last_refresh = now - timedelta(seconds=settings.TRENDING_REFRESH_INTERVAL)
+    factor = decay_factor((now - last_refresh).total_seconds())
+
+    window_start = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    candidates = Video.objects.filter(created_at__gte=window_start)
+    bounds = candidates.aggregate(low=Min('id'), high=Max('id'))
+
+    rescored = 0
+    if bounds['low'] is not None:
+        batch_size = settings.TRENDING_BATCH_SIZE
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            engagement = engagement_expression()
+            # MySQL applies SET clauses left to right, so the score must read the old snapshot first
+            rescored += candidates.filter(id__gte=start, id__lt=start + batch_size).update(
+                trending_score=F('trending_score') * factor + engagement - F('trending_engagement'),
+                trending_engagement=engagement,
+            )
+
+    # Videos that aged out of the window stop trending
+    Video.objects.filter(created_at__lt=window_start, trending_score__gt=0).update(trending_score=0)
+    cache.set(LAST_REFRESH_CACHE_KEY, now, None)
+    invalidate_collections('videos')  # The trending order changed
+    return rescored
@@ -0,0 +1,200 @@
+import os
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import UploadSession, Video
+from .payload_cache import invalidate_collections, user_cache
+from .stats import bump_user_stats
+from .transcoding import schedule_transcode
+
+# S3 multipart limits: parts of at least 5 MiB (except the last one) and at most 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class UploadError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def s3_client():
+    # AWS_S3_ENDPOINT_URL points at an S3-compatible stand-in (MinIO, LocalStack) outside production
+    return boto3.client(
+        's3',
+        region_name=settings.AWS_S3_REGION_NAME,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        config=Config(signature_version='s3v4'),
+    )
+
+
+def _object_key(folder, filename):
+    # Same naming as models.upload_to_video / upload_to_thumbnail
+    ext = filename.split('.')[-1]
+    return os.path.join(folder, f'{uuid.uuid4()}.{ext}')
+
+
+def _presign(method, expires_in=None, **params):
+    return s3_client().generate_presigned_url(
+        method,
+        Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, **params},
+        ExpiresIn=expires_in or settings.VIDEO_UPLOAD_URL_EXPIRY,
+    )
+
+
+def part_size_for(size):
+    # The configured part size, grown when needed to stay under MAX_PARTS
+    return max(settings.VIDEO_UPLOAD_PART_SIZE, MIN_PART_SIZE, -(-size // MAX_PARTS))
+
+
+def create_session(user, filename, size, content_type, title, description=None, thumbnail_filename=None):
+    if size > settings.VIDEO_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Videos are limited to {settings.VIDEO_UPLOAD_MAX_SIZE} bytes.')
+    key = _object_key('videos/', filename)
+    upload = s3_client().create_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, ContentType=content_type,
+    )
+    return UploadSession.objects.create(
+        user=user,
+        key=key,
+        upload_id=upload['UploadId'],
+        thumbnail_key=_object_key('thumbnails/', thumbnail_filename) if thumbnail_filename else '',
+        title=title,
+        description=description,
+        content_type=content_type,
+        size=size,
+        part_size=part_size_for(size),
+    )
+
+
+def part_urls(session, part_numbers):
+    # Presigned PUT URL for each requested part number
+    return {
+        number: _presign('upload_part', Key=session.key, UploadId=session.upload_id, PartNumber=number)
+        for number in part_numbers
+    }
+
+
+def thumbnail_url(session):
+    if not session.thumbnail_key:
+        return None
+    return _presign('put_object', Key=session.thumbnail_key, ContentType='image/jpeg')
+
+
+def uploaded_parts(session):
+    # Parts S3 already has, so an interrupted client only sends the missing ones
+    parts = []
+    paginator = s3_client().get_paginator('list_parts')
+    pages = paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=session.key, UploadId=session.upload_id)
+    for page in pages:
+        parts.extend({'PartNumber': part['PartNumber'], 'ETag': part['ETag'], 'Size': part['Size']} for part in page.get('Parts', []))
+    return parts
+
+
+def complete_session(session):
+    # Stitch the parts together and create the Video row. The part list comes from S3 itself,
+    # the client only says it is done. S3 is called before the session row is locked, so a slow
+    # completion never holds the lock; the step is idempotent, a retry after S3 completed but
+    # the transaction failed finds the object and only creates the row.
+    if session.status != 'uploading':
+        raise UploadError(f'This upload is {session.status}.')
+    _complete_on_s3(session)
+    thumbnail = session.thumbnail_key if session.thumbnail_key and _exists(session.thumbnail_key) else None
+
+    with transaction.atomic():
+        # A concurrent completion waits here and then sees the upload as completed
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'uploading':
+            raise UploadError(f'This upload is {session.status}.')
+        video = Video.objects.create(
+            user_id=session.user_id,
+            title=session.title,
+            description=session.description,
+            video_file=session.key,
+            thumbnail=thumbnail,
+        )
+        record_new_video(video)
+        session.status = 'completed'
+        session.video = video
+        session.save(update_fields=['status', 'video'])
+    return video
+
+
+def _complete_on_s3(session):
+    try:
+        parts = uploaded_parts(session)
+        missing = sorted(set(range(1, session.part_count + 1)) - {part['PartNumber'] for part in parts})
+        if missing:
+            raise UploadError(f'Parts {missing} have not been uploaded.')
+        s3_client().complete_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=session.key,
+            UploadId=session.upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]},
+        )
+    except ClientError as e:
+        # S3 forgets the upload id once it is completed (or aborted): completed if the object is there
+        if e.response['Error']['Code'] != 'NoSuchUpload':
+            raise
+        if not _exists(session.key):
+            raise UploadError('This upload no longer exists on S3.') from e
+
+
+def abort_session(session):
+    # The row is marked aborted under the lock, S3 is told once that has committed. A completion
+    # racing with it then fails on the status, and a failed S3 call only leaves parts behind.
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'uploading':
+            raise UploadError(f'This upload is {session.status}.')
+        session.status = 'aborted'
+        session.save(update_fields=['status'])
+        transaction.on_commit(lambda: _abort_on_s3(session))
+
+
+def _abort_on_s3(session):
+    try:
+        s3_client().abort_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=session.key, UploadId=session.upload_id,
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchUpload':
+            raise
+        # A racing completion got to S3 first, its transaction will find the session aborted
+        s3_client().delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=session.key)
+
+
+def abort_stale_sessions(max_age_hours):
+    # Abort uploads that were never completed, S3 keeps (and bills) their parts until then.
+    # Returns the number of sessions aborted.
+    cutoff = timezone.now() - timedelta(hours=max_age_hours)
+    aborted = 0
+    for session in UploadSession.objects.filter(status='uploading', created_at__lt=cutoff).iterator():
+        abort_session(session)
+        aborted += 1
+    return aborted
+
+
+def _exists(key):
+    try:
+        s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    except ClientError:
+        return False
+    return True
+
+
+def record_new_video(video):
+    # Side effects of a new Video row, shared by direct and multipart uploads. Runs inside the
+    # transaction that created the row. Followers get the video once it is transcoded.
+    bump_user_stats(video.user_id, video_count=1)
+    user_cache.invalidate(video.user_id)
+    invalidate_collections(f'user_videos:{video.user_id}')
+    schedule_transcode(video)
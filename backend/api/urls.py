@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import SignInView,SignUpView,VideoListCreateView, VideoDetailView,LikeCreateDeleteView,CommentCreateDeleteView,FavoriteCreateDeleteView,FollowCreateDeleteView,NotificationListView,TrendingVideosView,VideoCommentsView,UserVideosView,FollowingVideosView,VideoRetrieveView,UserListView,FriendListView,VideoLikeStatusView,UserSearchView,UserRetrieveView,FollowStatusView,UserFollowersListView,UserFollowingListView,ProfilePictureUpdateView,UpdateUsernameView,MarkAllNotificationsAsSeenView
+from .async_views import read_view
+from .metrics import metrics_view
+from .views import SignInView,SignUpView,VideoListCreateView, VideoDetailView,LikeCreateDeleteView,CommentCreateDeleteView,FavoriteCreateDeleteView,FollowCreateDeleteView,NotificationListView,TrendingVideosView,VideoCommentsView,UserVideosView,FollowingVideosView,VideoRetrieveView,UserListView,FriendListView,VideoLikeStatusView,UserSearchView,UserRetrieveView,FollowStatusView,UserFollowersListView,UserFollowingListView,ProfilePictureUpdateView,UpdateUsernameView,MarkAllNotificationsAsSeenView,VideoViewEventsView,VideoViewBufferStatsView,MarkNotificationsSeenView,UnreadNotificationCountView,VideoViewerStateView,DetailCacheStatsView,UploadSessionCreateView,UploadSessionView,UploadPartsView,UploadCompleteView
 
 urlpatterns = [
     path('login/',SignInView.as_view()),
@@ -12,20 +14,31 @@ urlpatterns = [
     path('favorite/<int:video_id>/', FavoriteCreateDeleteView.as_view(), name='favorite-video'),
     path('follow/<int:user_id>/', FollowCreateDeleteView.as_view(), name='follow-user'),
     path('notifications/', NotificationListView.as_view(), name='notifications'),
-    path('videos/trending/', TrendingVideosView.as_view(), name='trending-videos'),
-    path('videos/<int:video_id>/comments/', VideoCommentsView.as_view(), name='video-comments'),
+    path('videos/trending/', read_view(TrendingVideosView), name='trending-videos'),
+    path('videos/<int:video_id>/comments/', read_view(VideoCommentsView), name='video-comments'),
     path('videos/user/<int:user_id>/', UserVideosView.as_view(), name='user-videos'),
     path('videos/following/', FollowingVideosView.as_view(), name='following-videos'),
-    path('video/<int:id>/', VideoRetrieveView.as_view(), name='get_video_by_id'),
+    path('videos/views/', VideoViewEventsView.as_view(), name='video-view-events'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-create'),
+    path('uploads/<int:upload_id>/', UploadSessionView.as_view(), name='upload-detail'),
+    path('uploads/<int:upload_id>/parts/', UploadPartsView.as_view(), name='upload-parts'),
+    path('uploads/<int:upload_id>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+    path('cache/stats/', DetailCacheStatsView.as_view(), name='detail-cache-stats'),
+    path('videos/viewer-state/', VideoViewerStateView.as_view(), name='video-viewer-state'),
+    path('videos/views/stats/', VideoViewBufferStatsView.as_view(), name='video-view-buffer-stats'),
+    path('video/<int:id>/', read_view(VideoRetrieveView), name='get_video_by_id'),
     path('users/suggested/', UserListView.as_view(), name='suggested-users'),
     path('users/friends/', FriendListView.as_view(), name='user-friends'),
-    path('like/<int:video_id>/status/', VideoLikeStatusView.as_view(), name='like-status'),
+    path('like/<int:video_id>/status/', read_view(VideoLikeStatusView), name='like-status'),
     path('users/search/', UserSearchView.as_view(), name='user-search'),
-    path('user/<int:user_id>/', UserRetrieveView.as_view(), name='user-detail'),
-    path('follow/status/<int:user_id>/', FollowStatusView.as_view(), name='follow-status'),
+    path('user/<int:user_id>/', read_view(UserRetrieveView), name='user-detail'),
+    path('follow/status/<int:user_id>/', read_view(FollowStatusView), name='follow-status'),
     path('users/<int:user_id>/followers/', UserFollowersListView.as_view(), name='user-followers'),
     path('users/<int:user_id>/following/', UserFollowingListView.as_view(), name='user-following'),
     path('profile-picture/', ProfilePictureUpdateView.as_view(), name='profile-picture-update'),
     path('update-username/', UpdateUsernameView.as_view(), name='update-username'),
     path('notifications/mark-all-seen/', MarkAllNotificationsAsSeenView.as_view(), name='mark_all_notifications_seen'),
+    path('notifications/mark-seen/', MarkNotificationsSeenView.as_view(), name='mark_notifications_seen'),
+    path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='unread_notification_count'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,165 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+from .models import Video
+from .payload_cache import invalidate_collections, video_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    # Accumulates view events in memory and applies them to Video.view_count in bulk.
+    # A daemon thread flushes every flush_interval seconds and a request flushes inline once
+    # flush_threshold events are pending, so at most one interval (or threshold) of views is
+    # lost if the process dies. flush_interval <= 0 disables buffering.
+    # Cached payloads and ETags only pick the new counts up every max_staleness seconds: bumping
+    # the versions on every flush would make the 'videos' collection change all the time.
+
+    def __init__(self, flush_interval, flush_threshold, max_staleness, statement_size=500):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_staleness = max_staleness
+        self.statement_size = statement_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_events = 0
+        # Videos whose counts changed since the payloads were last invalidated
+        self._stale = set()
+        self._invalidated_at = time.monotonic()
+        self._thread = None
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_events = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def add(self, video_ids):
+        video_ids = list(video_ids)
+        with self._lock:
+            self._pending.update(video_ids)
+            self._pending_events += len(video_ids)
+            due = self.flush_interval <= 0 or self._pending_events >= self.flush_threshold
+        if due:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def flush(self):
+        # Only one flush at a time, concurrent callers just skip
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+                events, self._pending_events = self._pending_events, 0
+            if not pending:
+                self._invalidate_if_due()
+                return 0
+
+            started = time.monotonic()
+            try:
+                self._apply(pending)
+            except Exception:
+                # Put the increments back so the next flush retries them
+                with self._lock:
+                    self._pending.update(pending)
+                    self._pending_events += events
+                self.failed_flushes += 1
+                logger.exception('Failed to flush %s buffered video views', events)
+                return 0
+
+            self._stale.update(pending)
+            self._invalidate_if_due()
+
+            elapsed = time.monotonic() - started
+            self.flushes += 1
+            self.flushed_events += events
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return events
+        finally:
+            self._flush_lock.release()
+
+    def _apply(self, pending):
+        # UPDATE video SET view_count = view_count + CASE WHEN id IN (...) THEN n ... END
+        # with ids grouped by increment so the CASE stays short
+        items = list(pending.items())
+        for start in range(0, len(items), self.statement_size):
+            by_increment = defaultdict(list)
+            for video_id, count in items[start:start + self.statement_size]:
+                by_increment[count].append(video_id)
+            increment = Case(
+                *[When(id__in=ids, then=Value(count)) for count, ids in by_increment.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            ids = [video_id for video_id, _ in items[start:start + self.statement_size]]
+            Video.objects.filter(id__in=ids).update(view_count=F('view_count') + increment)
+
+    def _invalidate_if_due(self, force=False):
+        # Let the cached payloads and lists of the videos counted since last time show the new
+        # counts. Called with the flush lock held.
+        if not self._stale or (not force and time.monotonic() - self._invalidated_at < self.max_staleness):
+            return
+        stale = list(self._stale)
+        try:
+            for start in range(0, len(stale), self.statement_size):
+                ids = stale[start:start + self.statement_size]
+                owner_ids = Video.objects.filter(id__in=ids).values_list('user_id', flat=True).distinct()
+                video_cache.invalidate(*ids)
+                invalidate_collections('videos', *[f'user_videos:{owner_id}' for owner_id in owner_ids])
+        except Exception:
+            logger.exception('Failed to invalidate the payloads of %s counted videos', len(stale))
+            return
+        self._stale.difference_update(stale)
+        self._invalidated_at = time.monotonic()
+
+    def close(self):
+        # Apply the pending views and publish every count, e.g. at exit
+        self.flush()
+        with self._flush_lock:
+            self._invalidate_if_due(force=True)
+
+    def stats(self):
+        with self._lock:
+            depth = self._pending_events
+            videos = len(self._pending)
+        return {
+            'pending_events': depth,
+            'pending_videos': videos,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'flushed_events': self.flushed_events,
+            'last_flush_seconds': self.last_flush_seconds,
+            'max_flush_seconds': self.max_flush_seconds,
+        }
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            close_old_connections()
+
+
+view_buffer = ViewCountBuffer(
+    flush_interval=settings.VIEW_COUNT_FLUSH_INTERVAL,
+    flush_threshold=settings.VIEW_COUNT_FLUSH_THRESHOLD,
+    max_staleness=settings.VIEW_COUNT_MAX_STALENESS,
+)
@@ -0,0 +1,33 @@
+from .models import Favorite, Follower, Like, Video
+
+
+def viewer_state_for_videos(user, videos):
+    # Per-video state of the viewer (liked / favorited / follows the author) for loaded videos,
+    # computed with three set-membership queries whatever the number of videos
+    authors = {video.id: video.user_id for video in videos}
+    return _viewer_state(user, authors)
+
+
+def viewer_state(user, video_ids):
+    # Same as viewer_state_for_videos for bare ids, unknown ids are left out
+    authors = dict(Video.objects.filter(id__in=video_ids).values_list('id', 'user_id'))
+    return _viewer_state(user, authors)
+
+
+def _viewer_state(user, authors):
+    if not authors:
+        return {}
+    video_ids = list(authors)
+    liked = set(Like.objects.filter(user=user, video_id__in=video_ids).values_list('video_id', flat=True))
+    favorited = set(Favorite.objects.filter(user=user, video_id__in=video_ids).values_list('video_id', flat=True))
+    following = set(
+        Follower.objects.filter(follower=user, following_id__in=set(authors.values())).values_list('following_id', flat=True)
+    )
+    return {
+        video_id: {
+            'liked': video_id in liked,
+            'favorited': video_id in favorited,
+            'following_author': author_id in following,
+        }
+        for video_id, author_id in authors.items()
+    }
@@ -1,18 +1,39 @@
 from django.contrib.auth import authenticate
 from django.shortcuts import render
-from rest_framework.permissions import AllowAny,IsAuthenticated,IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny,IsAdminUser,IsAuthenticated,IsAuthenticatedOrReadOnly
 from rest_framework.exceptions import PermissionDenied,ValidationError
-from rest_framework.pagination import PageNumberPagination
 from rest_framework import generics, permissions,status
 from rest_framework.response import Response
-from django.db.models import F , Count , OuterRef, Subquery, BooleanField, Case, When
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from .serializer import UserSerializer,UserRegistrationSerializer,VideoSerializer,LikeSerializer, CommentSerializer, FavoriteSerializer, FollowerSerializer, NotificationSerializer, ProfilePictureSerializer, UsernameUpdateSerializer
-from .models import User,Video,Like,Comment,Favorite,Follower,Notification
+from .serializer import UserSerializer,UserRegistrationSerializer,VideoSerializer,LikeSerializer, CommentSerializer, FavoriteSerializer, FollowerSerializer, NotificationSerializer, ProfilePictureSerializer, UsernameUpdateSerializer, ViewEventSerializer, UploadSessionCreateSerializer, UploadPartsSerializer, UploadSessionSerializer
+from .models import User,Video,Like,Comment,Favorite,Follower,Notification,UserStats,UploadSession
+from .stats import bump_user_stats, get_user_stats, rebuild_user_stats
+from .pagination import KeysetPagination
+from .timeline import backfill_follow, remove_follow, timeline_sources
+from .view_buffer import view_buffer
+from .notifications import enqueue_notification, cancel_notification
+from .toggles import toggle
+from .viewer_state import viewer_state, viewer_state_for_videos
+from .search import index_user, normalize, search_queryset
+from .suggestions import suggested_user_ids
+from .payload_cache import collection_version, invalidate_collections, invalidate_video, user_cache, video_cache
+from .conditional import ConditionalGetMixin
+from .query_plan import QueryPlanMixin, plan_queryset
+from .replicas import ReplicaReadMixin, pin_reads_to_primary
+from .images import schedule_avatar_variants
+from .uploads import UploadError, abort_session, complete_session, create_session, part_urls, record_new_video, thumbnail_url, uploaded_parts
 
 # Create your views here.
 
+def user_queryset():
+	# Everything UserSerializer touches, as declared in its Meta
+	return plan_queryset(User.objects.all(), UserSerializer)
+
 def get_auth_for_user(user):
 	tokens = RefreshToken.for_user(user)
 	return {
@@ -59,13 +80,33 @@ class SignUpView(APIView):
 
 		return Response(user_data)
 	
-class VideoListCreateView(generics.ListCreateAPIView):
-    queryset = Video.objects.all()
+class ViewerStateMixin:
+    # With ?include=viewer_state, feed payloads embed whether the viewer liked/favorited each
+    # video and follows its author, saving the app one status call per rendered short
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.query_params.get('include') == 'viewer_state' and self.request.user.is_authenticated:
+            videos = args[0] if kwargs.get('many') else [args[0]]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            context['viewer_state'] = viewer_state_for_videos(self.request.user, videos)
+        return super().get_serializer(*args, **kwargs)
+
+class VideoListCreateView(ReplicaReadMixin, ConditionalGetMixin, ViewerStateMixin, generics.ListCreateAPIView):
+    queryset = Video.objects.filter(status='ready')
     serializer_class = VideoSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
+    def get_etag_versions(self):
+        if self.request.query_params.get('include') == 'viewer_state':
+            return None
+        return [collection_version('videos')]
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        pin_reads_to_primary(self.request.user)
+        with transaction.atomic():
+            video = serializer.save(user=self.request.user)
+            record_new_video(video)
 
 class VideoDetailView(generics.RetrieveDestroyAPIView):  # No update functionality
     queryset = Video.objects.all()
@@ -78,7 +119,16 @@ class VideoDetailView(generics.RetrieveDestroyAPIView):  # No update functionali
     def perform_destroy(self, instance):
         if instance.user != self.request.user:
             raise PermissionDenied("You do not have permission to delete this video.")
-        instance.delete()
+        pin_reads_to_primary(self.request.user)
+        with transaction.atomic():
+            # Likes on this video cascade away, so the likers' heart counts change too
+            liker_ids = list(Like.objects.filter(video=instance).values_list('user_id', flat=True).distinct())
+            video_id = instance.id
+            instance.delete()
+            rebuild_user_stats([instance.user_id, *liker_ids])
+            invalidate_video(video_id, instance.user_id)
+            invalidate_collections(f'comments:{video_id}')
+            user_cache.invalidate(instance.user_id, *liker_ids)
 
 class LikeCreateDeleteView(generics.CreateAPIView):
     serializer_class = LikeSerializer
@@ -89,28 +139,30 @@ class LikeCreateDeleteView(generics.CreateAPIView):
         video_id = self.kwargs['video_id']
         user = request.user
 
-        like, created = Like.objects.get_or_create(user=user, video_id=video_id)
-        if created:
-            video = like.video
-            video.likes_count = F('likes_count') + 1
-            video.save(update_fields=['likes_count'])
-
-            Notification.objects.create(
-                user=video.user,
-                content=f"{user.username} liked your video",
-                video=video,
-                notification_type='like',
-                triggering_user=user  # Add triggering_user here
-            )
-            return Response(status=status.HTTP_201_CREATED)
+        owner_id = Video.objects.filter(pk=video_id).values_list('user_id', flat=True).first()
+        if owner_id is None:
+            return Response({'error': 'Video not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # The liker reads their own toggle back right away (like status, video detail)
+        pin_reads_to_primary(user)
 
-        else:
-            like.delete()
-            video = Video.objects.get(pk=video_id)
-            video.likes_count = F('likes_count') - 1
-            video.save(update_fields=['likes_count'])
+        def on_insert(like):
+            Video.objects.filter(pk=video_id).update(likes_count=F('likes_count') + 1)
+            bump_user_stats(user.id, heart_count=1)
+            invalidate_video(video_id, owner_id)
+            user_cache.invalidate(user.id)
+            enqueue_notification(owner_id, user, 'like', video_id=video_id)
 
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        def on_delete():
+            Video.objects.filter(pk=video_id).update(likes_count=F('likes_count') - 1)
+            bump_user_stats(user.id, heart_count=-1)
+            invalidate_video(video_id, owner_id)
+            user_cache.invalidate(user.id)
+            cancel_notification(owner_id, user, 'like', video_id=video_id)
+
+        if toggle(Like, on_insert, on_delete, user=user, video_id=video_id):
+            return Response(status=status.HTTP_201_CREATED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class CommentCreateDeleteView(generics.CreateAPIView):
     serializer_class = CommentSerializer
@@ -122,27 +174,28 @@ class CommentCreateDeleteView(generics.CreateAPIView):
         user = request.user
         text = request.data.get('text')
 
-        comment = Comment.objects.create(user=user, video_id=video_id, text=text)
-        video = comment.video
-        video.comment_count = F('comment_count') + 1
-        video.save(update_fields=['comment_count'])
+        pin_reads_to_primary(user)
+        with transaction.atomic():
+            comment = Comment.objects.create(user=user, video_id=video_id, text=text)
+            video = comment.video
+            video.comment_count = F('comment_count') + 1
+            video.save(update_fields=['comment_count'])
+            invalidate_video(video.id, video.user_id)
+            invalidate_collections(f'comments:{video.id}')
 
-        Notification.objects.create(
-            user=video.user,
-            content=f"{user.username} commented on your video",
-            video=video,
-            notification_type='comment',
-            triggering_user=user  # Add triggering_user here
-        )
+            enqueue_notification(video.user_id, user, 'comment', video_id=video.id)
         return Response(status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
         comment_id = self.kwargs['comment_id']
         comment = Comment.objects.get(pk=comment_id)
         video = comment.video
+        pin_reads_to_primary(request.user)
         comment.delete()
         video.comment_count = F('comment_count') - 1
         video.save(update_fields=['comment_count'])
+        invalidate_video(video.id, video.user_id)
+        invalidate_collections(f'comments:{video.id}')
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -155,12 +208,13 @@ class FavoriteCreateDeleteView(generics.CreateAPIView):
         video_id = self.kwargs['video_id']
         user = request.user
 
-        favorite, created = Favorite.objects.get_or_create(user=user, video_id=video_id)
-        if created:
+        if not Video.objects.filter(pk=video_id).exists():
+            return Response({'error': 'Video not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        pin_reads_to_primary(user)
+        if toggle(Favorite, user=user, video_id=video_id):
             return Response(status=status.HTTP_201_CREATED)
-        else:
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class FollowCreateDeleteView(generics.CreateAPIView):
     serializer_class = FollowerSerializer
@@ -169,50 +223,75 @@ class FollowCreateDeleteView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         following_id = self.kwargs['user_id']
         follower = request.user
+        if following_id == follower.id:
+            return Response({'error': 'You cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        following = User.objects.select_related('stats').filter(pk=following_id).first()
+        if following is None:
+            return Response({'error': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        follow, created = Follower.objects.get_or_create(follower=follower, following_id=following_id)
-        if created:
-            Notification.objects.create(
-                user=follow.following,
-                content=f"{follower.username} started following you",
-                notification_type='follow',
-                triggering_user=follower  # Add triggering_user here
-            )
+        # The reverse edge, flagged mutual together with the new edge when it exists
+        reverse_edge = Follower.objects.filter(follower_id=following_id, following=follower)
+        pin_reads_to_primary(follower)
+
+        def on_insert(follow):
+            bump_user_stats(follower.id, following_count=1)
+            bump_user_stats(following_id, follower_count=1)
+            if reverse_edge.update(is_mutual=True):
+                Follower.objects.filter(pk=follow.pk).update(is_mutual=True)
+            backfill_follow(follower.id, following)
+            user_cache.invalidate(follower.id, following_id)
+            enqueue_notification(following_id, follower, 'follow')
+
+        def on_delete():
+            bump_user_stats(follower.id, following_count=-1)
+            bump_user_stats(following_id, follower_count=-1)
+            reverse_edge.update(is_mutual=False)
+            remove_follow(follower.id, following_id)
+            user_cache.invalidate(follower.id, following_id)
+            cancel_notification(following_id, follower, 'follow')
+
+        with transaction.atomic():
+            # Lock both stats rows in a fixed order so that two users following each other at the
+            # same time are serialized: the second one sees the first edge and flags the pair mutual.
+            # A missing row locks nothing, so it is built and then locked.
+            pair = [follower.id, following_id]
+            locked = UserStats.objects.select_for_update().filter(user_id__in=pair).order_by('user_id')
+            if len(locked) < len(pair):
+                rebuild_user_stats(sorted(set(pair) - {stats.user_id for stats in locked}))
+                list(locked.all())
+            followed = toggle(Follower, on_insert, on_delete, follower=follower, following_id=following_id)
+        if followed:
             return Response(status=status.HTTP_201_CREATED)
-        else:
-            follow.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ReplicaReadMixin, QueryPlanMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Return the notifications for the authenticated user, ordered by creation time (newest first)
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-
-        # Serialize all notifications and return them as a list
-        serialized_notifications = NotificationSerializer(queryset, many=True).data
+        # Return the notifications for the authenticated user, newest first (ordering comes from the paginator)
+        return Notification.objects.filter(user=self.request.user)
 
-        return Response(serialized_notifications)
-
-class TrendingVideosPagination(PageNumberPagination):
+class TrendingVideosPagination(KeysetPagination):
     page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+    ordering = ('-trending_score', '-id')
 
-class TrendingVideosView(generics.ListAPIView):
+class TrendingVideosView(ReplicaReadMixin, ConditionalGetMixin, ViewerStateMixin, generics.ListAPIView):
     serializer_class = VideoSerializer
     pagination_class = TrendingVideosPagination
     permission_classes = [IsAuthenticated]
 
+    def get_etag_versions(self):
+        if self.request.query_params.get('include') == 'viewer_state':
+            return None
+        # Bumped by every video write and by each refresh_trending run
+        return [collection_version('videos')]
+
     def get_queryset(self):
-        return Video.objects.annotate(
-            trending_score=F('view_count') + F('likes_count') + F('comment_count')
-        ).order_by('-trending_score', '-created_at')
+        # Pages straight off the precomputed score index, see trending.refresh_trending
+        return Video.objects.filter(status='ready')
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -224,89 +303,128 @@ class TrendingVideosView(generics.ListAPIView):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
-class VideoCommentsView(generics.ListAPIView):
+class VideoCommentsView(ReplicaReadMixin, ConditionalGetMixin, QueryPlanMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly]  # Allow authenticated users to post comments, but everyone can view
 
+    def get_etag_versions(self):
+        return [collection_version(f"comments:{self.kwargs['video_id']}"), collection_version('profiles')]
+
     def get_queryset(self):
         video_id = self.kwargs['video_id']
         
         # Return all comments for the video, no need to restrict to video owner
-        return Comment.objects.filter(video_id=video_id).order_by('-created_at')
+        return Comment.objects.filter(video_id=video_id)
     
-class UserVideosView(generics.ListAPIView):
+class UserVideosView(ReplicaReadMixin, ConditionalGetMixin, ViewerStateMixin, generics.ListAPIView):
     serializer_class = VideoSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
+    def get_etag_versions(self):
+        if self.request.query_params.get('include') == 'viewer_state':
+            return None
+        # The owner gets a different page (videos still processing), so their ETag differs too
+        return [collection_version(f"user_videos:{self.kwargs.get('user_id')}"), 'owner' if self.is_owner() else 'viewer']
+
+    def is_owner(self):
+        return str(self.kwargs.get('user_id')) == str(self.request.user.id)
+
     def get_queryset(self):
         # Get the user_id from the URL parameters
         user_id = self.kwargs.get('user_id')
         
-        # Get videos uploaded by the specified user
-        return Video.objects.filter(user_id=user_id).order_by('-created_at')
+        # Get videos uploaded by the specified user, the owner also sees the ones still processing
+        videos = Video.objects.filter(user_id=user_id)
+        if not self.is_owner():
+            videos = videos.filter(status='ready')
+        return videos
 
-class FollowingVideosView(generics.ListAPIView):
+class FollowingVideosView(ReplicaReadMixin, ViewerStateMixin, generics.ListAPIView):
     serializer_class = VideoSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        following_users = Follower.objects.filter(follower=self.request.user).values_list('following_id', flat=True)
-        return Video.objects.filter(user_id__in=following_users).order_by('-created_at')
+    def list(self, request, *args, **kwargs):
+        # Read the materialized timeline, merged with uploads pulled from very large creators
+        page = self.paginator.paginate_merged(timeline_sources(request.user), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-class VideoRetrieveView(generics.RetrieveAPIView):
-    queryset = Video.objects.all()  # Fetch all videos
-    serializer_class = VideoSerializer
-    permission_classes = [IsAuthenticated]  # Only authenticated users can access the view
+class VideoViewEventsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ViewEventSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Buffered, the counters are written in bulk by view_buffer
+        view_buffer.add(serializer.validated_data['video_ids'])
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+class VideoViewBufferStatsView(APIView):
+    permission_classes = [IsAdminUser]
 
     def get(self, request, *args, **kwargs):
-        video_id = kwargs.get('id')  # Get the video id from the URL
-        try:
-            video = Video.objects.get(id=video_id)
-        except Video.DoesNotExist:
-            return Response({'error': 'Video not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(view_buffer.stats())
 
-        serializer = self.get_serializer(video)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
-class UserListView(generics.ListAPIView):
-    serializer_class = UserSerializer
+class DetailCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        # Hit ratios of this process's detail caches
+        return Response({'video': video_cache.stats(), 'user': user_cache.stats()})
+
+class VideoViewerStateView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
+    max_ids = 100
 
-    def get_queryset(self):
-        current_user = self.request.user
+    def get(self, request, *args, **kwargs):
+        # ?ids=1,2,3 -> {"1": {"liked": ..., "favorited": ..., "following_author": ...}, ...}
+        try:
+            video_ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+        except ValueError:
+            return Response({'error': 'ids must be a comma separated list of video ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(video_ids) > self.max_ids:
+            return Response({'error': f'At most {self.max_ids} ids per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(viewer_state(request.user, video_ids))
+
+class VideoRetrieveView(ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveAPIView):
+    queryset = Video.objects.all()  # Fetch all videos
+    serializer_class = VideoSerializer
+    permission_classes = [IsAuthenticated]  # Only authenticated users can access the view
 
-        # Get the users followed by the current user
-        followed_users = Follower.objects.filter(follower=current_user).values_list('following_id', flat=True)
+    def get_etag_versions(self):
+        if self.request.query_params.get('include') == 'viewer_state':
+            return None
+        return [video_cache.version(self.kwargs.get('id'))]
 
-        # Exclude the current user and the followed users, limit the result to 10 users
-        return User.objects.exclude(id=current_user.id).exclude(id__in=followed_users)[:10]
+    def get(self, request, *args, **kwargs):
+        video_id = kwargs.get('id')  # Get the video id from the URL
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        def build():
+            video = Video.objects.filter(id=video_id).first()
+            return dict(VideoSerializer(video, context=self.get_serializer_context()).data) if video else None
 
-        # Serialize the user data
-        serializer = self.get_serializer(queryset, many=True)
+        # The shared payload never carries viewer_state, it is added per request below
+        payload = video_cache.get(video_id, build)
+        # Until it is transcoded a video is only visible to its owner, as in the lists
+        if payload is None or (payload['status'] != 'ready' and payload['user'] != request.user.id):
+            return Response({'error': 'Video not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(serializer.data)
+        if request.query_params.get('include') == 'viewer_state':
+            payload = dict(payload, viewer_state=viewer_state(request.user, [video_id]).get(video_id))
+        return Response(payload, status=status.HTTP_200_OK)
     
-class FriendListView(generics.ListAPIView):
+class UserListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        current_user = self.request.user
-
-        # Get the users that the current user follows
-        follows = Follower.objects.filter(follower=current_user).values_list('following_id', flat=True)
-
-        # Get the users that follow the current user
-        followers = Follower.objects.filter(following=current_user).values_list('follower_id', flat=True)
-
-        # Get the intersection of follows and followers to find mutual relationships
-        mutual_friends_ids = follows.intersection(followers)
-
-        # Return the users who are mutual friends
-        return User.objects.filter(id__in=mutual_friends_ids)
+        # Served from the precomputed suggestions (see api/suggestions.py), best first
+        suggested = suggested_user_ids(self.request.user, limit=10)
+        users = user_queryset().in_bulk(suggested)
+        return [users[user_id] for user_id in suggested if user_id in users]
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -316,7 +434,7 @@ class FriendListView(generics.ListAPIView):
 
         return Response(serializer.data)
     
-class VideoLikeStatusView(APIView):
+class VideoLikeStatusView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, video_id):
@@ -324,37 +442,63 @@ class VideoLikeStatusView(APIView):
         liked = Like.objects.filter(user=user, video_id=video_id).exists()
         return Response({'liked': liked})
     
-class UserPagination(PageNumberPagination):
+class UserPagination(KeysetPagination):
     page_size = 10  # You can adjust this size as needed
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+    # follower_rank is annotated by UserSearchView, see there
+    ordering = ('-follower_rank', 'id')
 
-class UserSearchView(generics.ListAPIView):
+class UserSearchView(ReplicaReadMixin, QueryPlanMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     pagination_class = UserPagination
 
+    def get_query(self):
+        return normalize(self.request.query_params.get('search', ''))  # Fetch the search query from the request
+
+    @property
+    def query_plan_path(self):
+        return 'user' if self.get_query() else None
+
+    @property
+    def keyset_ordering(self):
+        # Index rows are ranked by their popularity snapshot, the empty query by live follower counts
+        return ('-popularity', 'user_id') if self.get_query() else UserPagination.ordering
+
     def get_queryset(self):
-        query = self.request.query_params.get('search', '')  # Fetch the search query from the request
-        return User.objects.annotate(
-            follower_count=Count('followers')  # Assuming there's a reverse relation 'followers' in the User model
-        ).filter(username__icontains=query).order_by('-follower_count')
+        query = self.get_query()
+        if not query:
+            # Users created outside the signup flow have no stats row yet, rank them as 0 followers
+            # rather than NULL, which the keyset filter of the next pages would never match
+            return User.objects.annotate(follower_rank=Coalesce('stats__follower_count', 0))
+        # Prefix index lookup instead of a username__icontains scan
+        return search_queryset(query)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        users = [row.user for row in page] if self.get_query() else page
+        serializer = self.get_serializer(users, many=True)
+        return self.get_paginated_response(serializer.data)
     
-class UserRetrieveView(generics.RetrieveAPIView):
+class UserRetrieveView(ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_etag_versions(self):
+        return [user_cache.version(self.kwargs.get('user_id'))]
+
     def get(self, request, *args, **kwargs):
         user_id = kwargs.get('user_id')  # Get the user ID from the URL
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return Response({'error': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build():
+            user = user_queryset().filter(id=user_id).first()
+            return dict(self.get_serializer(user).data) if user else None
+
+        payload = user_cache.get(user_id, build)
+        if payload is None:
+            return Response({'error': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payload, status=status.HTTP_200_OK)
     
-class FollowStatusView(APIView):
+class FollowStatusView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, user_id):
@@ -362,41 +506,55 @@ class FollowStatusView(APIView):
         is_following = Follower.objects.filter(follower=follower, following_id=user_id).exists()
         return Response({'is_following': is_following})
 
-class UserFollowingListView(generics.ListAPIView):
+class FollowEdgeListView(ReplicaReadMixin, QueryPlanMixin, generics.ListAPIView):
+    # Pages over Follower rows (newest follow first) and serializes the user on one side of each edge
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
+    user_field = None
+
+    @property
+    def query_plan_path(self):
+        return self.user_field
 
     def get_queryset(self):
-        user_id = self.kwargs['user_id']  # Get the user ID from the URL
-        # Get the users that the current user is following
-        following_ids = Follower.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
-        # Return the User objects for those following users
-        return User.objects.filter(id__in=following_ids)
+        return Follower.objects.filter(**self.get_edge_filter())
 
-class UserFollowersListView(generics.ListAPIView):
-    serializer_class = UserSerializer
-    permission_classes = [IsAuthenticated]
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        users = [getattr(edge, self.user_field) for edge in page]
+        serializer = self.get_serializer(users, many=True)
+        data = [dict(item, **self.get_edge_data(edge)) for item, edge in zip(serializer.data, page)]
+        return self.get_paginated_response(data)
 
-    def get_queryset(self):
-        user_id = self.kwargs['user_id']  # Get the user ID from the URL
-        
-        # Subquery to check if the follower is also following the current user
-        is_following_subquery = Follower.objects.filter(
-            follower_id=OuterRef('pk'),
-            following_id=user_id
-        ).values('id')
-        
-        # Annotate the queryset with isFollowing field
-        queryset = User.objects.filter(
-            id__in=Follower.objects.filter(following_id=user_id).values_list('follower_id', flat=True)
-        ).annotate(
-            isFollowing=Case(
-                When(id__in=Subquery(is_following_subquery), then=True),
-                default=False,
-                output_field=BooleanField(),
-            )
-        )
-        return queryset
+    def get_edge_data(self, edge):
+        # Extra per-user fields read from the edge row itself
+        return {}
+
+class UserFollowingListView(FollowEdgeListView):
+    user_field = 'following'
+
+    def get_edge_filter(self):
+        # Get the users that the given user is following
+        return {'follower_id': self.kwargs['user_id']}
+
+class UserFollowersListView(FollowEdgeListView):
+    user_field = 'follower'
+
+    def get_edge_filter(self):
+        # Get the users following the given user
+        return {'following_id': self.kwargs['user_id']}
+
+    def get_edge_data(self, edge):
+        # Whether the given user follows this follower back
+        return {'isFollowing': edge.is_mutual}
+
+class FriendListView(FollowEdgeListView):
+    user_field = 'following'
+
+    def get_edge_filter(self):
+        # Mutual follows of the current user, a range read on (follower, is_mutual, created_at)
+        return {'follower': self.request.user, 'is_mutual': True}
     
 class ProfilePictureUpdateView(generics.UpdateAPIView):
     queryset = User.objects.all()
@@ -409,6 +567,17 @@ class ProfilePictureUpdateView(generics.UpdateAPIView):
 
     def patch(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        # The variants are rendered from the uploaded bytes, not downloaded back from storage
+        picture = serializer.validated_data.get('profile_picture')
+        data = picture.read() if picture else None
+        if picture:
+            picture.seek(0)
+        user = serializer.save()
+        schedule_avatar_variants(user, data)
+        user_cache.invalidate(self.request.user.id)
+        invalidate_collections('profiles')  # Comment lists show the author's picture
     
 class UpdateUsernameView(generics.UpdateAPIView):
     queryset = User.objects.all()
@@ -422,7 +591,11 @@ class UpdateUsernameView(generics.UpdateAPIView):
     def patch(self, request, *args, **kwargs):
         serializer = self.get_serializer(instance=self.get_object(), data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            user = serializer.save()
+            index_user(user)
+            user_cache.invalidate(user.id)
+            invalidate_collections('profiles')  # Comment lists show the author's username
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 class MarkAllNotificationsAsSeenView(APIView):
@@ -430,5 +603,98 @@ class MarkAllNotificationsAsSeenView(APIView):
 
     def post(self, request, *args, **kwargs):
         # Mark all notifications of the authenticated user as seen
-        Notification.objects.filter(user=request.user, seen=False).update(seen=True)
-        return Response({'message': 'All notifications marked as seen.'}, status=status.HTTP_200_OK)
\ No newline at end of file
+        with transaction.atomic():
+            Notification.objects.filter(user=request.user, seen=False).update(seen=True)
+            UserStats.objects.filter(user=request.user).update(unread_notifications=0)
+        return Response({'message': 'All notifications marked as seen.'}, status=status.HTTP_200_OK)
+
+class MarkNotificationsSeenView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        # Mark the notifications up to (and including) up_to_id as seen, only unseen rows are touched
+        try:
+            up_to_id = int(request.data.get('up_to_id'))
+        except (TypeError, ValueError):
+            return Response({'error': 'up_to_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            marked = Notification.objects.filter(user=request.user, seen=False, id__lte=up_to_id).update(seen=True)
+            bump_user_stats(request.user.id, unread_notifications=-marked)
+        return Response({'marked': marked}, status=status.HTTP_200_OK)
+
+class UnreadNotificationCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        # Always read the counter fresh, request.user may carry an older stats row
+        unread = UserStats.objects.filter(user=request.user).values_list('unread_notifications', flat=True).first()
+        if unread is None:
+            unread = get_user_stats(request.user).unread_notifications
+        return Response({'unread_count': max(unread, 0)})
+
+class UploadSessionCreateView(APIView):
+    # Starts a direct-to-S3 multipart upload, the video bytes never go through Django
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = create_session(request.user, **serializer.validated_data)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # URLs for the first batch of parts, the client asks for the rest as it goes
+        first_parts = range(1, min(session.part_count, settings.VIDEO_UPLOAD_PRESIGN_BATCH) + 1)
+        data = UploadSessionSerializer(session).data
+        data['part_urls'] = part_urls(session, first_parts)
+        data['thumbnail_url'] = thumbnail_url(session)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class UploadSessionBaseView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self):
+        return UploadSession.objects.filter(pk=self.kwargs['upload_id'], user=self.request.user).first()
+
+class UploadSessionView(UploadSessionBaseView):
+    def get(self, request, *args, **kwargs):
+        # Upload status with the parts S3 already has, for resuming after an interruption
+        session = self.get_session()
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        data = UploadSessionSerializer(session).data
+        data['uploaded_parts'] = uploaded_parts(session) if session.status == 'uploading' else []
+        return Response(data)
+
+    def delete(self, request, *args, **kwargs):
+        session = self.get_session()
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            abort_session(session)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadPartsView(UploadSessionBaseView):
+    def post(self, request, *args, **kwargs):
+        session = self.get_session()
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = UploadPartsSerializer(data=request.data, context={'session': session})
+        serializer.is_valid(raise_exception=True)
+        return Response({'part_urls': part_urls(session, serializer.validated_data['part_numbers'])})
+
+class UploadCompleteView(UploadSessionBaseView):
+    def post(self, request, *args, **kwargs):
+        session = self.get_session()
+        if session is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        pin_reads_to_primary(request.user)
+        try:
+            video = complete_session(session)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(VideoSerializer(video, context={'request': request}).data, status=status.HTTP_201_CREATED)
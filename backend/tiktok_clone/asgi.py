@@ -13,4 +13,30 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tiktok_clone.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup so the app registry is ready
+from django.conf import settings  # noqa: E402
+from django.core.signals import request_finished  # noqa: E402
+from django.db import connections  # noqa: E402
+from api.realtime import notification_socket  # noqa: E402
+
+
+def close_request_connections(sender, **kwargs):
+    # Django runs sync views on a new thread per ASGI request, a connection it opened would never
+    # be reused. Persistent connections live on the threads of api.async_views.db_pool.
+    connections.close_all()
+
+
+request_finished.connect(close_request_connections)
+
+
+async def application(scope, receive, send):
+    # HTTP goes to Django, the notification WebSocket is served by api.realtime
+    if scope['type'] == 'websocket':
+        if scope['path'] == settings.NOTIFICATION_SOCKET_PATH:
+            return await notification_socket(scope, receive, send)
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await django_application(scope, receive, send)
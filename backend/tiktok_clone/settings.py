@@ -30,6 +30,8 @@ AWS_SECRET_ACCESS_KEY = env('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = env('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = env('AWS_S3_REGION_NAME')
 AWS_S3_CUSTOM_DOMAIN = 'db5j27yjbbxnb.cloudfront.net'
+# Set to an S3-compatible server (MinIO, LocalStack) to develop and test without AWS
+AWS_S3_ENDPOINT_URL = env('AWS_S3_ENDPOINT_URL', default=None)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -75,7 +77,139 @@ REST_FRAMEWORK = {
     )
 }
 
+# Following feed (see api/timeline.py): uploads are fanned out to follower timelines, except
+# for creators with at least TIMELINE_FANOUT_MAX_FOLLOWERS followers whose videos are pulled at read time
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_SIZE = 50
+
+# Trending (see api/trending.py): engagement decays with a half-life and the score is
+# recomputed every TRENDING_REFRESH_INTERVAL seconds for videos younger than TRENDING_WINDOW_DAYS
+# by `manage.py refresh_trending --loop`, or by one-off runs from cron when the cache is shared
+TRENDING_REFRESH_INTERVAL = 300
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WINDOW_DAYS = 14
+TRENDING_BATCH_SIZE = 5000
+TRENDING_VIEW_WEIGHT = 1.0
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 1.0
+
+# View counting (see api/view_buffer.py): views are buffered in memory and flushed to
+# Video.view_count every VIEW_COUNT_FLUSH_INTERVAL seconds or once VIEW_COUNT_FLUSH_THRESHOLD
+# events are pending, whichever comes first (0 disables buffering). Cached payloads and ETags show
+# counts up to VIEW_COUNT_MAX_STALENESS seconds old.
+VIEW_COUNT_FLUSH_INTERVAL = 5
+VIEW_COUNT_FLUSH_THRESHOLD = 1000
+VIEW_COUNT_MAX_STALENESS = 60
+VIEW_EVENTS_MAX_BATCH = 100
+
+# Notifications (see api/notifications.py) go through an outbox that is drained in batches and
+# coalesced per (recipient, video, type). NOTIFICATION_OUTBOX_MODE is 'pool' (in-process worker
+# threads), 'sync' (inline after commit) or 'external' (`python manage.py drain_notifications`)
+NOTIFICATION_OUTBOX_MODE = env('NOTIFICATION_OUTBOX_MODE', default='pool')
+NOTIFICATION_OUTBOX_WORKERS = 2
+NOTIFICATION_OUTBOX_BATCH_SIZE = 500
+
+# Real-time notification push over WebSocket (see api/realtime.py, mounted in asgi.py)
+NOTIFICATION_SOCKET_PATH = '/ws/notifications/'
+NOTIFICATION_BROKER = 'api.realtime.InProcessBroker'
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+NOTIFICATION_STREAM_RESUME_LIMIT = 200
+
+# Direct-to-S3 multipart video uploads (see api/uploads.py): parts of VIDEO_UPLOAD_PART_SIZE
+# bytes are PUT by the client to presigned URLs valid for VIDEO_UPLOAD_URL_EXPIRY seconds,
+# handed out VIDEO_UPLOAD_PRESIGN_BATCH at a time
+VIDEO_UPLOAD_MAX_SIZE = 2 * 1024 ** 3
+VIDEO_UPLOAD_PART_SIZE = 8 * 1024 ** 2
+VIDEO_UPLOAD_URL_EXPIRY = 3600
+VIDEO_UPLOAD_PRESIGN_BATCH = 100
+VIDEO_UPLOAD_STALE_HOURS = 24
+
+# Transcoding (see api/transcoding.py): uploads are probed and encoded into an HLS ladder plus a
+# poster frame with the local ffmpeg. TRANSCODE_MODE is 'pool' (in-process worker threads),
+# 'sync' (inline after commit), 'external' (`python manage.py transcode_videos`) or 'off'
+# (publish the original upload as is). Rung heights are the short side of the frame.
+TRANSCODE_MODE = env('TRANSCODE_MODE', default='pool')
+TRANSCODE_WORKERS = 2
+TRANSCODE_FFMPEG = env('TRANSCODE_FFMPEG', default='ffmpeg')
+TRANSCODE_FFPROBE = env('TRANSCODE_FFPROBE', default='ffprobe')
+TRANSCODE_TIMEOUT = 1800
+TRANSCODE_SEGMENT_SECONDS = 4
+TRANSCODE_LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': 400_000, 'audio_bitrate': 64_000},
+    {'name': '360p', 'height': 360, 'video_bitrate': 800_000, 'audio_bitrate': 96_000},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1_400_000, 'audio_bitrate': 128_000},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2_800_000, 'audio_bitrate': 128_000},
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5_000_000, 'audio_bitrate': 192_000},
+]
+# A video claimed for transcoding longer ago than this was left behind by a crashed worker and is
+# queued again. Every ffmpeg run (probe, one per rung, poster) may take up to TRANSCODE_TIMEOUT.
+TRANSCODE_CLAIM_TIMEOUT = (len(TRANSCODE_LADDER) + 2) * TRANSCODE_TIMEOUT
+
+# Profile pictures are also stored as square WebP variants of these widths (see api/images.py),
+# rendered in a pool of AVATAR_VARIANT_WORKERS processes after the upload commits.
+# AVATAR_VARIANT_MODE is 'pool' (stored from a background thread) or 'sync' (inline after commit).
+AVATAR_SIZES = [64, 128, 256, 512]
+AVATAR_WEBP_QUALITY = 80
+AVATAR_VARIANT_WORKERS = 2
+AVATAR_VARIANT_MODE = env('AVATAR_VARIANT_MODE', default='pool')
+
+# The cache holds state every web worker and the management command processes (refresh_trending,
+# refresh_suggestions) must agree on: payload and ETag version counters, detail payloads, trending
+# pages, suggestions and read-your-writes pins. Set CACHE_URL to a shared backend whenever more than
+# one process serves the API: redis://host:6379/0 (needs the redis package), pymemcache://host:11211
+# or dbcache://api_cache (run `python manage.py createcachetable` first). The in-process default only
+# suits a single runserver, `manage.py check` warns about it (api.W001).
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+
+# Video and user detail payloads (see api/payload_cache.py) are cached in a per-process LRU of
+# DETAIL_CACHE_LOCAL_SIZE entries, trusted for DETAIL_CACHE_LOCAL_TTL seconds, in front of the
+# shared cache named by DETAIL_CACHE_ALIAS.
+DETAIL_CACHE_ALIAS = 'default'
+DETAIL_CACHE_LOCAL_SIZE = 10000
+DETAIL_CACHE_LOCAL_TTL = 2
+DETAIL_CACHE_TIMEOUT = 300
+
+# Suggested users (see api/suggestions.py) are computed in batch from the follow graph and the
+# top SUGGESTIONS_TOP_K per user cached for SUGGESTIONS_CACHE_TIMEOUT seconds. Refresh them every
+# SUGGESTIONS_REFRESH_INTERVAL seconds with `python manage.py refresh_suggestions --loop`
+SUGGESTIONS_TOP_K = 50
+SUGGESTIONS_MAX_DEGREE = 200
+SUGGESTIONS_REFRESH_INTERVAL = 3600
+SUGGESTIONS_CACHE_TIMEOUT = 3 * SUGGESTIONS_REFRESH_INTERVAL
+
+# User search (see api/search.py) ranks prefix matches by the follower counts copied into its
+# index. `python manage.py rebuild_user_search --popularity-only --loop` copies them again every
+# SEARCH_POPULARITY_REFRESH_INTERVAL seconds
+SEARCH_POPULARITY_REFRESH_INTERVAL = 900
+
+# Request metrics (see api/metrics.py): METRICS_SAMPLE_RATE of the requests record latency, SQL
+# and serialization time per URL name, exposed in Prometheus format at /api/metrics/ to scrapers
+# sending `Authorization: Bearer <METRICS_TOKEN>` (unset: not served). 0 turns the middleware into a
+# pass-through and leaves DRF's serializers and renderer unpatched.
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', default=1.0)
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+METRICS_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Slow queries (see api/slow_queries.py): statements slower than SLOW_QUERY_THRESHOLD_MS are
+# grouped by shape with an EXPLAIN and their call site, list them with
+# `python manage.py slow_queries`. None turns recording off. They are written from a background
+# thread after the response, or at the end of the request with SLOW_QUERY_FLUSH_INLINE.
+SLOW_QUERY_THRESHOLD_MS = env.float('SLOW_QUERY_THRESHOLD_MS', default=200)
+SLOW_QUERY_FLUSH_INLINE = False
+
+# Async read path (see api/async_views.py): under ASGI the hot read endpoints (video and user
+# detail, comments, trending, like/follow status) run on a pool of DB_POOL_SIZE threads that keep
+# their database connections open between requests. False serves them with the plain sync views.
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=True)
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=16)
+
 MIDDLEWARE = [
+    # Writes recorded slow queries after the response, outside of the timed part
+    'api.slow_queries.SlowQueryMiddleware',
+    # Before the rest, so the timing covers the other middleware
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,9 +259,22 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Persistent connections, checked before reuse (ASGI only keeps them on the database pool, see asgi.py)
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=300),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (see api/replicas.py): each host of DB_REPLICA_HOSTS becomes a 'replica_<n>' alias
+# with the primary's credentials. Read-only list and detail views read from a random replica,
+# except for users who liked, commented, followed or uploaded in the last READ_YOUR_WRITES_WINDOW
+# seconds, whose reads stay on the primary.
+for n, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    DATABASES[f'replica_{n}'] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+READ_YOUR_WRITES_WINDOW = env.int('READ_YOUR_WRITES_WINDOW', default=10)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators